@@ -0,0 +1,84 @@
+'''
+Compara o overhead por requisicao da pilha de CORS antiga (BaseHTTPMiddleware + CORSMiddleware
+do Starlette) com o CORSMiddleware ASGI puro de src/utils/cors.py.
+
+As requisicoes sao enviadas direto para o app ASGI (sem servidor/rede), com uma rota vazia,
+entao o tempo medido e basicamente o custo das camadas de middleware.
+
+Uso: python -m benchmarks.cors_overhead [--requests 20000]
+'''
+import argparse, asyncio, time
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware as StarletteCORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from src.utils import cors
+
+class LegacyCustomCORSMiddleware(BaseHTTPMiddleware):
+  async def dispatch(self, request, call_next):
+    response = await call_next(request)
+    response.headers['Access-Control-Allow-Origin'] = 'http://localhost:4200'
+    response.headers['Access-Control-Allow-Methods'] = 'POST, GET, OPTIONS, PUT, DELETE'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+    return response
+
+CORS_OPTIONS = { "allow_origins": ["*"], "allow_credentials": True, "allow_methods": ["*"], "allow_headers": ["*"], "expose_headers": ["*"] }
+
+def build_app(stack: str) -> FastAPI:
+  app = FastAPI()
+
+  @app.get("/")
+  def read_root():
+    return {}
+
+  if stack == "legacy":
+    app.add_middleware(LegacyCustomCORSMiddleware)
+    app.add_middleware(StarletteCORSMiddleware, **CORS_OPTIONS)
+  elif stack == "asgi":
+    app.add_middleware(cors.CORSMiddleware, **CORS_OPTIONS)
+  return app
+
+def build_scope(method: str, headers: list) -> dict:
+  return { "type": "http", "asgi": { "version": "3.0" }, "http_version": "1.1", "method": method, "scheme": "http", "path": "/",
+           "raw_path": b"/", "root_path": "", "query_string": b"", "headers": headers, "client": ("127.0.0.1", 1), "server": ("test", 80) }
+
+# Corpo vazio na primeira leitura e desconexao nas seguintes, como um servidor ASGI apos a resposta
+def build_receive():
+  messages = iter([{ "type": "http.request", "body": b"", "more_body": False }])
+
+  async def receive():
+    return next(messages, { "type": "http.disconnect" })
+  return receive
+
+async def send(message):
+  pass
+
+async def run(app: FastAPI, scope: dict, requests: int) -> float:
+  # Aquecimento (monta a pilha de middlewares e os caches)
+  for _ in range(200):
+    await app(dict(scope), build_receive(), send)
+
+  start = time.perf_counter()
+  for _ in range(requests):
+    await app(dict(scope), build_receive(), send)
+  return (time.perf_counter() - start) / requests * 1_000_000
+
+if __name__ == '__main__': # pragma: no cover
+  parser = argparse.ArgumentParser(description="Benchmark do overhead de CORS por requisicao")
+  parser.add_argument("--requests", type=int, default=20000)
+  args = parser.parse_args()
+
+  origin = (b"origin", b"http://localhost:4200")
+  scenarios = {
+    "GET com Origin": build_scope("GET", [origin]),
+    "Preflight OPTIONS": build_scope("OPTIONS", [origin, (b"access-control-request-method", b"POST"), (b"access-control-request-headers", b"authorization, content-type")]),
+  }
+
+  for name, scope in scenarios.items():
+    baseline = asyncio.run(run(build_app("none"), scope, args.requests)) if scope["method"] == "GET" else None
+    for stack in ["legacy", "asgi"]:
+      elapsed = asyncio.run(run(build_app(stack), scope, args.requests))
+      overhead = f" (overhead {elapsed - baseline:.1f} us)" if baseline is not None else ""
+      print(f"{name:<18} {stack:<7} {elapsed:8.1f} us/req{overhead}")
+    if baseline is not None:
+      print(f"{name:<18} {'nenhum':<7} {baseline:8.1f} us/req")
@@ -0,0 +1,39 @@
+'''
+Compara a montagem dos emails de verificacao/reset no formato antigo (f-string com os.getenv
+a cada envio) com a renderizacao dos templates Jinja2 pre-compilados de src/utils/email_templates,
+incluindo a construcao do MessageSchema, como em um envio em lote pelo outbox.
+
+Uso: python -m benchmarks.email_render [--messages 20000]
+'''
+import argparse, os, time
+from fastapi_mail import MessageSchema, MessageType
+
+from src.utils import send_mail
+
+def legacy_verification_code_message(email: str, code: int, is_unb: bool = False) -> MessageSchema:
+  html = f"<p>Seja bem-vindo ao UnB-TV! Para confirmar a criação da sua conta, utilize o código <strong>{code}</strong></p>"
+  if is_unb:
+    html += f"<p>Como usuário da UnB, você pode configurar uma senha de administrador acessando o seguinte link após ativar sua conta: <a href='{os.getenv('DEPLOY_URL')}/adminActivate?email={email}'>Configurar Senha de Administrador</a></p>"
+  return MessageSchema(subject="Confirme a criação da sua conta", recipients=[email], body=html, subtype=MessageType.html)
+
+def run(build, messages: int) -> float:
+  for i in range(200):
+    build(f"user{i}@unb.edu.br", 123456, i % 2 == 0)
+
+  start = time.perf_counter()
+  for i in range(messages):
+    build(f"user{i}@unb.edu.br", 123456, i % 2 == 0)
+  return messages / (time.perf_counter() - start)
+
+if __name__ == '__main__': # pragma: no cover
+  parser = argparse.ArgumentParser(description="Benchmark da renderizacao de emails em lote")
+  parser.add_argument("--messages", type=int, default=20000)
+  args = parser.parse_args()
+
+  scenarios = {
+    "f-string (html)": legacy_verification_code_message,
+    "template (html + txt)": send_mail.verification_code_message,
+    "template en (html + txt)": lambda email, code, is_unb: send_mail.verification_code_message(email, code, is_unb, "en"),
+  }
+  for name, build in scenarios.items():
+    print(f"{name:<26} {run(build, args.messages):10.0f} msg/s")
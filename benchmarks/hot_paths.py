@@ -0,0 +1,139 @@
+'''
+Micro-benchmarks do custo de CPU por requisicao: tokens e senhas de src/utils/security.py e a
+serializacao de listas de userSchema.User (1, 100 e 1000 usuarios) como na resposta das rotas.
+
+Cada benchmark e calibrado (no estilo do pytest-benchmark): o numero de iteracoes por rodada dobra
+ate a rodada durar --min-time segundos, e entao sao feitas --rounds rodadas. O resultado por
+benchmark e o tempo por chamada (min/mediana/media/desvio, em microssegundos) e ops/s.
+
+Baselines ficam em JSON (padrao benchmarks/baselines/hot_paths.json). --save grava o resultado
+como baseline; --compare compara a mediana com a baseline e sai com 1 se algum benchmark ficar
+mais lento que --threshold (fracao, 0.2 = 20%). Baselines so sao comparaveis na mesma maquina.
+
+Usa as variaveis do .env como a aplicacao (SECRET, ALGORITHM, PASSWORD_HASH_*, POSTGRES_URL).
+
+Uso: python -m benchmarks.hot_paths [--filter token] [--save | --compare] [--baseline arquivo.json] [--threshold 0.2]
+'''
+import argparse, json, os, platform, statistics, sys, time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from fastapi.utils import create_response_field
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+from src.domain import userSchema
+from src.model import userModel
+from src.utils import security
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "hot_paths.json")
+USER_COUNTS = [1, 100, 1000]
+
+def build_users(total: int) -> list:
+  return [userModel.User(id=n, name=f"Usuario {n}", connection="ESTUDANTE", email=f"usuario{n}@unb.br", role="USER", is_active=True)
+          for n in range(total)]
+
+# Mesmo caminho do FastAPI para response_model=list[userSchema.User]: validacao, serializacao e JSONResponse
+response_field = create_response_field(name="Response", type_=list[userSchema.User])
+
+def fastapi_response(users: list) -> bytes:
+  value, _ = response_field.validate(users, {}, loc=("response",))
+  return JSONResponse(response_field.serialize(value, mode="json")).body
+
+users_adapter = TypeAdapter(list[userSchema.User])
+
+def pydantic_dump_json(users: list) -> bytes:
+  return users_adapter.dump_json(users_adapter.validate_python(users))
+
+def build_benchmarks() -> dict:
+  payload = { "id": 1, "email": "usuario@unb.br", "role": "USER", "ver": 0 }
+  token = security.create_access_token(payload)
+  password_hash = security.get_password_hash("123456")
+
+  # Sem cache: limpa o token_cache antes de cada chamada (o clear de um dict e desprezivel perto do decode)
+  def verify_token_uncached():
+    security.token_cache.clear()
+    return security.verify_token(token)
+
+  benchmarks = {
+    "create_access_token": lambda: security.create_access_token(payload),
+    "verify_token (sem cache)": verify_token_uncached,
+    "verify_token (cache)": lambda: security.verify_token(token),
+    "verify_password": lambda: security.verify_password("123456", password_hash),
+    "get_password_hash": lambda: security.get_password_hash("123456"),
+  }
+  for total in USER_COUNTS:
+    users = build_users(total)
+    benchmarks[f"serialize_users[{total}] (fastapi)"] = lambda users=users: fastapi_response(users)
+    benchmarks[f"serialize_users[{total}] (pydantic dump_json)"] = lambda users=users: pydantic_dump_json(users)
+  return benchmarks
+
+def _timed(fn, iterations: int) -> float:
+  start = time.perf_counter()
+  for _ in range(iterations):
+    fn()
+  return time.perf_counter() - start
+
+def measure(fn, rounds: int, min_time: float) -> dict:
+  iterations = 1
+  while _timed(fn, iterations) < min_time:
+    iterations *= 2
+
+  samples = [_timed(fn, iterations) / iterations * 1_000_000 for _ in range(rounds)]
+  median = statistics.median(samples)
+  return {
+    "iterations": iterations,
+    "rounds": rounds,
+    "min_us": round(min(samples), 3),
+    "median_us": round(median, 3),
+    "mean_us": round(statistics.mean(samples), 3),
+    "stddev_us": round(statistics.stdev(samples), 3) if rounds > 1 else 0.0,
+    "ops": round(1_000_000 / median, 1),
+  }
+
+# Benchmarks com mediana acima de (1 + threshold) vezes a baseline
+def compare(baseline: dict, results: dict, threshold: float) -> list:
+  regressions = []
+  for name, result in results.items():
+    previous = baseline["benchmarks"].get(name)
+    if previous is None:
+      continue
+    change = result["median_us"] / previous["median_us"] - 1
+    print(f"{name:<42} {previous['median_us']:12.2f} -> {result['median_us']:12.2f} us  {change:+7.1%}")
+    if change > threshold:
+      regressions.append(f"{name}: {change:+.1%}")
+  return regressions
+
+if __name__ == '__main__': # pragma: no cover
+  parser = argparse.ArgumentParser(description="Micro-benchmarks de seguranca e serializacao")
+  parser.add_argument("--filter", help="executa apenas benchmarks cujo nome contem o texto")
+  parser.add_argument("--rounds", type=int, default=5)
+  parser.add_argument("--min-time", type=float, default=0.1, help="duracao minima (s) de cada rodada")
+  parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+  parser.add_argument("--save", action="store_true", help="grava o resultado como baseline")
+  parser.add_argument("--compare", action="store_true", help="compara com a baseline")
+  parser.add_argument("--threshold", type=float, default=0.2)
+  args = parser.parse_args()
+
+  results = {}
+  for name, fn in build_benchmarks().items():
+    if args.filter and args.filter not in name:
+      continue
+    results[name] = measure(fn, args.rounds, args.min_time)
+    result = results[name]
+    print(f"{name:<42} {result['median_us']:12.2f} us  (min {result['min_us']:.2f}, stddev {result['stddev_us']:.2f})  {result['ops']:12.1f} ops/s")
+
+  if args.save:
+    os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+    meta = { "python": platform.python_version(), "machine": platform.machine(), "password_hash_scheme": security.PASSWORD_HASH_SCHEME }
+    with open(args.baseline, "w") as file:
+      json.dump({ "meta": meta, "benchmarks": results }, file, indent=2)
+      file.write("\n")
+
+  if args.compare:
+    with open(args.baseline) as file:
+      regressions = compare(json.load(file), results, args.threshold)
+    for regression in regressions:
+      print(f"REGRESSAO {regression}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,232 @@
+'''
+Teste de carga das APIs de auth e usuarios: vazao e latencia (p50/p95/p99) por cenario, com
+concorrencia controlada, e resultado em JSON para comparar entre commits.
+
+O banco e o do POSTGRES_URL (use um Postgres local descartavel, nunca o de producao). Antes dos
+cenarios sao cadastrados --users usuarios ativos "loadtest-<n>@bench.unb.br" (o primeiro ADMIN),
+todos com a senha 123456 e um unico hash para o cadastro ser rapido; ao final eles sao removidos
+(--keep-users mantem). Por padrao as requisicoes vao direto para o app ASGI (sem rede, com o rate
+limit desligado); com --url elas vao para um servidor ja rodando, que deve ter RATE_LIMIT_ENABLED=false
+e o mesmo POSTGRES_URL.
+
+Cenarios: login, refresh, GET /api/users sem filtro e com cada filtro (name, email, name_or_email,
+connection) e PATCH /api/users/{id}. Cada cenario executa --requests requisicoes (--login-requests
+no login, que e limitado pelo bcrypt) divididas entre --concurrency workers, apos um aquecimento.
+
+Uso:
+  python -m benchmarks.load_bench [--users 1000] [--concurrency 20] [--requests 2000] [--output resultado.json]
+  python -m benchmarks.load_bench --compare base.json [--max-regression 0.15]   (sai com 1 se houver regressao)
+'''
+import argparse, asyncio, json, math, os, platform, subprocess, sys, time
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import select
+
+PASSWORD = "123456"
+EMAIL_PATTERN = "loadtest-{}@bench.unb.br"
+CONNECTIONS = ["ESTUDANTE", "PROFESSOR", "SERVIDOR"]
+
+def seed_users(total: int) -> list:
+  from src.database import SessionLocal
+  from src.model import userModel
+  from src.repository import userRepository
+  from src.utils import security
+
+  remove_users()
+  password = security.get_password_hash(PASSWORD)
+  users = [{
+    "name": f"Load Test {n}",
+    "email": EMAIL_PATTERN.format(n),
+    "connection": CONNECTIONS[n % len(CONNECTIONS)],
+    "role": "ADMIN" if n == 0 else "USER",
+    "password": password,
+    "is_active": True,
+    "activation_code": None,
+  } for n in range(total)]
+
+  db = SessionLocal()
+  try:
+    for start in range(0, total, 1000):
+      userRepository.create_users_bulk(db, users[start:start + 1000])
+    return list(db.scalars(select(userModel.User.id).where(userModel.User.email.like(EMAIL_PATTERN.format("%"))).order_by(userModel.User.id)))
+  finally:
+    db.close()
+
+def remove_users():
+  from src.database import SessionLocal
+  from src.model import userModel
+  from src.repository import userRepository
+
+  db = SessionLocal()
+  try:
+    ids = list(db.scalars(select(userModel.User.id).where(userModel.User.email.like(EMAIL_PATTERN.format("%")))))
+    userRepository.delete_users_bulk(db, ids)
+  finally:
+    db.close()
+
+def build_client(url: str | None) -> httpx.AsyncClient:
+  if url:
+    return httpx.AsyncClient(base_url=url, timeout=60)
+
+  from src.main import app
+  return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60)
+
+# Cada cenario e uma funcao (client, n, tokens, ids) -> Response; n e o numero da requisicao
+def build_scenarios(total_users: int) -> dict:
+  def auth(tokens, n):
+    return { "Authorization": f"Bearer {tokens[n % len(tokens)]['access_token']}" }
+
+  def list_users(query):
+    return lambda client, n, tokens, ids: client.get(f"/api/users/{query}", headers=auth(tokens, n))
+
+  sample = total_users // 2
+  return {
+    "login": lambda client, n, tokens, ids: client.post("/api/auth/login", json={ "email": EMAIL_PATTERN.format(n % total_users), "password": PASSWORD }),
+    "refresh": lambda client, n, tokens, ids: client.post("/api/auth/refresh", headers={ "Authorization": f"Bearer {tokens[n % len(tokens)]['refresh_token']}" }),
+    "list_users": list_users(""),
+    "list_users_name": list_users(f"?name=Load Test {sample}"),
+    "list_users_email": list_users(f"?email={EMAIL_PATTERN.format(sample)}"),
+    "list_users_name_or_email": list_users("?name_or_email=loadtest-1"),
+    "list_users_connection": list_users("?connection=PROFESSOR"),
+    "patch_user": lambda client, n, tokens, ids: client.patch(f"/api/users/{ids[n % len(ids)]}", json={ "name": f"Load Test {n % len(ids)}" }, headers=auth(tokens, n)),
+  }
+
+# Percentil pelo metodo nearest-rank (latencies ja ordenadas)
+def percentile(latencies: list, fraction: float) -> float:
+  return latencies[max(0, math.ceil(fraction * len(latencies)) - 1)]
+
+async def run_scenario(client: httpx.AsyncClient, request, requests: int, concurrency: int, warmup: int, tokens: list, ids: list) -> dict:
+  for n in range(warmup):
+    await request(client, n, tokens, ids)
+
+  latencies = []
+  statuses = {}
+  counter = iter(range(requests))
+
+  async def worker():
+    for n in counter:
+      start = time.perf_counter()
+      response = await request(client, n, tokens, ids)
+      latencies.append(time.perf_counter() - start)
+      statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+  start = time.perf_counter()
+  await asyncio.gather(*[worker() for _ in range(concurrency)])
+  elapsed = time.perf_counter() - start
+
+  latencies.sort()
+  return {
+    "requests": requests,
+    "concurrency": concurrency,
+    "seconds": round(elapsed, 3),
+    "throughput_rps": round(requests / elapsed, 2),
+    "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+    "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+    "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    "max_ms": round(latencies[-1] * 1000, 3),
+    "errors": sum(count for status, count in statuses.items() if status >= 400),
+    "status": { str(status): count for status, count in sorted(statuses.items()) },
+  }
+
+async def run(args) -> dict:
+  # O client vem antes do cadastro: importar o app em processo cria as tabelas
+  client = build_client(args.url)
+  ids = seed_users(args.users)
+  scenarios = build_scenarios(args.users)
+  selected = args.scenarios or list(scenarios)
+
+  try:
+    async with client:
+      # Tokens de usuarios diferentes (o primeiro e o ADMIN) para os cenarios autenticados
+      tokens = []
+      for n in range(min(args.concurrency, args.users)):
+        response = await client.post("/api/auth/login", json={ "email": EMAIL_PATTERN.format(n), "password": PASSWORD })
+        response.raise_for_status()
+        tokens.append(response.json())
+
+      results = {}
+      for name in selected:
+        requests = args.login_requests if name == "login" else args.requests
+        results[name] = await run_scenario(client, scenarios[name], requests, args.concurrency, args.warmup, tokens, ids)
+        print_result(name, results[name])
+  finally:
+    if not args.keep_users:
+      remove_users()
+
+  return { "meta": build_meta(args), "scenarios": results }
+
+def git_commit() -> str | None:
+  try:
+    return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def build_meta(args) -> dict:
+  return {
+    "commit": git_commit(),
+    "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    "target": args.url or "asgi",
+    "users": args.users,
+    "concurrency": args.concurrency,
+    "python": platform.python_version(),
+  }
+
+def print_result(name: str, result: dict):
+  print(f"{name:<26} {result['throughput_rps']:9.1f} req/s  p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+        f"p99 {result['p99_ms']:8.2f} ms  erros {result['errors']}")
+
+'''
+Compara dois resultados: regressao e p99 maior ou vazao menor que a base por mais de max_regression
+(fracao, 0.15 = 15%), ou erros em um cenario que nao tinha. Retorna a lista de regressoes.
+'''
+def compare(base: dict, current: dict, max_regression: float) -> list:
+  regressions = []
+  for name, result in current["scenarios"].items():
+    previous = base["scenarios"].get(name)
+    if previous is None:
+      continue
+
+    p99_change = result["p99_ms"] / previous["p99_ms"] - 1 if previous["p99_ms"] else 0
+    throughput_change = result["throughput_rps"] / previous["throughput_rps"] - 1 if previous["throughput_rps"] else 0
+    print(f"{name:<26} p99 {p99_change:+7.1%}  vazao {throughput_change:+7.1%}")
+
+    if p99_change > max_regression:
+      regressions.append(f"{name}: p99 {previous['p99_ms']} -> {result['p99_ms']} ms")
+    if throughput_change < -max_regression:
+      regressions.append(f"{name}: vazao {previous['throughput_rps']} -> {result['throughput_rps']} req/s")
+    if result["errors"] and not previous["errors"]:
+      regressions.append(f"{name}: {result['errors']} erros")
+  return regressions
+
+if __name__ == '__main__': # pragma: no cover
+  parser = argparse.ArgumentParser(description="Teste de carga das rotas de auth e usuarios")
+  parser.add_argument("--users", type=int, default=1000, help="usuarios cadastrados antes dos cenarios")
+  parser.add_argument("--concurrency", type=int, default=20)
+  parser.add_argument("--requests", type=int, default=2000, help="requisicoes por cenario")
+  parser.add_argument("--login-requests", type=int, default=200, help="requisicoes do cenario de login (bcrypt)")
+  parser.add_argument("--warmup", type=int, default=20)
+  parser.add_argument("--scenarios", nargs="*", choices=list(build_scenarios(1)), help="cenarios a executar (padrao: todos)")
+  parser.add_argument("--url", help="servidor ja rodando (padrao: app ASGI em processo)")
+  parser.add_argument("--output", help="arquivo JSON com o resultado")
+  parser.add_argument("--compare", help="resultado base (JSON) para comparar")
+  parser.add_argument("--max-regression", type=float, default=0.15)
+  parser.add_argument("--keep-users", action="store_true")
+  args = parser.parse_args()
+
+  # O rate limit do login bloquearia o teste no app em processo. Definido aqui (antes de importar o app
+  # em build_client) para que importar este modulo nao altere o ambiente
+  os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+  result = asyncio.run(run(args))
+
+  if args.output:
+    with open(args.output, "w") as file:
+      json.dump(result, file, indent=2)
+
+  if args.compare:
+    with open(args.compare) as file:
+      regressions = compare(json.load(file), result, args.max_regression)
+    for regression in regressions:
+      print(f"REGRESSAO {regression}")
+    sys.exit(1 if regressions else 0)
@@ -13,4 +13,18 @@ ERROR_SENDING_EMAIL = "Ocorreu um erro ao enviar o email."
 NO_RESET_PASSWORD_CODE = "Código de reinicialização de senha não foi informado."
 INVALID_RESET_PASSWORD_CODE = "Código de reinicialização de senha está inválido."
 INVALID_REQUEST = "Requisição inválida."
-NO_PERMISSION = "NO PERMISSION"
\ No newline at end of file
+NO_PERMISSION = "NO PERMISSION"
+INVALID_CURSOR = "Cursor de paginação inválido."
+INVALID_COUNT_STRATEGY = "Estratégia de contagem inválida."
+INVALID_ENV_VALUES = "SOME ENVIRONMENT VALUES ARE INVALID"
+SERVICE_BUSY = "Serviço sobrecarregado, tente novamente em instantes."
+TOO_MANY_ATTEMPTS = "Muitas tentativas, aguarde antes de tentar novamente."
+UNSUPPORTED_IMPORT_FORMAT = "Formato de importação não suportado, use text/csv ou application/x-ndjson."
+INVALID_IMPORT_ROW = "Linha inválida."
+DUPLICATED_IMPORT_EMAIL = "Email repetido no arquivo."
+IMPORT_ROW_LIMIT = "Limite de linhas da importação excedido."
+INVALID_EXPORT_FORMAT = "Formato de exportação inválido, use csv ou ndjson."
+INVALID_BULK_SELECTION = "Informe uma lista de ids ou um filtro (name, email, name_or_email ou connection)."
+BULK_SELECTION_TOO_LARGE = "A seleção excede o limite de usuários por operação em lote."
+INVALID_ROLE = "Role inválida."
+ROLE_REQUIRES_UNB_EMAIL = "Usuários com roles ADMIN ou COADMIN devem ter um email contendo 'unb'."
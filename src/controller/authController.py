@@ -1,16 +1,17 @@
 import os
 import re 
 from typing import List
-from fastapi import APIRouter, HTTPException, Response, status, Depends
-from src.utils import security, enumeration, send_mail
-from src.database import get_db
+from fastapi import APIRouter, HTTPException, Header, Response, status, Depends
+from src.utils import security, enumeration, email_outbox, email_templates, rate_limit
+from src.database import get_db_for
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from src.constants import errorMessages
 from starlette.responses import JSONResponse
 
 from src.domain import userSchema, authSchema
-from src.repository import userRepository
+from src.repository import emailOutboxRepository, userRepositoryAsync
 import secrets
 
 auth = APIRouter(
@@ -24,7 +25,7 @@ def get_connection():
     return JSONResponse(status_code=200, content=connections)
 
 @auth.post('/register')
-async def register(data: authSchema.UserCreate, db: Session = Depends(get_db)):
+async def register(data: authSchema.UserCreate, db: Session | AsyncSession = Depends(get_db_for("register")), accept_language: str | None = Header(default=None)):
   # Verifica se connection é valido
   if (not enumeration.UserConnection.has_value(data.connection)):
     raise HTTPException(status_code=400, detail=errorMessages.INVALID_CONNECTION)
@@ -35,56 +36,67 @@ async def register(data: authSchema.UserCreate, db: Session = Depends(get_db)):
     raise HTTPException(status_code=400, detail=errorMessages.INVALID_PASSWORD)
 
   # Verifica se já existe um usuário com o email informado
-  user = userRepository.get_user_by_email(db, data.email)
+  user = await userRepositoryAsync.get_user_by_email(db, data.email)
   if user:
     raise HTTPException(status_code=400, detail=errorMessages.EMAIL_ALREADY_REGISTERED)
   
-  hashed_password = security.get_password_hash(data.password)
+  hashed_password = await security.get_password_hash_async(data.password)
   
   activation_code = security.generate_six_digit_number_code()
 
-  userRepository.create_user(db, name=data.name, connection=data.connection, email=data.email, password=hashed_password, activation_code=activation_code)
-  
-  if re.search(r"unb", data.email):
-    await send_mail.send_verification_code(email=data.email, code=activation_code, is_unb=True)
-  else:
-    await send_mail.send_verification_code(email=data.email, code=activation_code)
+  # O email de verificacao vai para o outbox e e gravado na mesma transacao do usuario; a entrega e feita pelos workers
+  # no idioma do Accept-Language (None usa o idioma padrao)
+  locale = email_templates.templates.negotiate(accept_language)
+  emailOutboxRepository.add_message(db, enumeration.EmailKind.VERIFICATION_CODE, data.email, { "code": activation_code, "is_unb": bool(re.search(r"unb", data.email)), "locale": locale })
+  await userRepositoryAsync.create_user(db, name=data.name, connection=data.connection, email=data.email, password=hashed_password, activation_code=activation_code)
+  email_outbox.notify()
 
   return JSONResponse(status_code=201, content={ "status": "success" })
 
   # Recebe os dados de login
-@auth.post("/login", response_model=authSchema.Token)
-async def login(data: authSchema.UserLogin, db: Session = Depends(get_db)):
-  user = userRepository.get_user_by_email(db, data.email)
+@auth.post("/login", response_model=authSchema.Token, dependencies=[Depends(rate_limit.limit("login"))])
+async def login(data: authSchema.UserLogin, db: Session | AsyncSession = Depends(get_db_for("login"))):
+  # Sem cache: o hash da senha e sempre o atual (ex: logo apos um reset em outro worker)
+  user = await userRepositoryAsync.get_user_credentials(db, data.email)
   if not user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
   
-  password_match = security.verify_password(data.password, user.password)
+  password_match = await security.verify_password_async(data.password, user.password)
   if not password_match:
     raise HTTPException(status_code=404, detail=errorMessages.PASSWORD_NO_MATCH)
 
   if not user.is_active:
     raise HTTPException(status_code=401, detail=errorMessages.ACCOUNT_IS_NOT_ACTIVE)
+
+  # Refaz o hash com a politica atual (esquema/custo) aproveitando a senha em texto puro do login.
+  # Com o pool de hash saturado o rehash fica para o proximo login, sem falhar o login atual
+  if security.password_needs_update(user.password):
+    try:
+      hashed_password = await security.get_password_hash_async(data.password)
+      await userRepositoryAsync.rehash_password(db, user, hashed_password)
+    except HTTPException:
+      pass
   
-  access_token = security.create_access_token(data={ "id": user.id, "email": user.email, "role": user.role })
+  access_token = security.create_access_token(data={ "id": user.id, "email": user.email, "role": user.role, "ver": user.token_version })
   refresh_token = security.create_refresh_token(data={ "id": user.id })
 
   return JSONResponse(status_code=200, content={ "access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer" })
 
   # Recebe os dados do usuário provenientes de uma autenticação social
 @auth.post("/login/social")
-async def login_social(user: authSchema.UserSocial, db: Session = Depends(get_db)):
-  existing_user = userRepository.get_user_by_email(db, user.email)
+async def login_social(user: authSchema.UserSocial, db: Session | AsyncSession = Depends(get_db_for("login_social"))):
+  existing_user = await userRepositoryAsync.get_user_by_email(db, user.email)
   
   if existing_user is None:
-    new_user = userRepository.create_user_social(db, user.name, user.email)
-    user_id = new_user.id
+    db_user = await userRepositoryAsync.create_user_social(db, user.name, user.email)
     is_new_user = True
   else:
-    user_id = existing_user.id
+    db_user = existing_user
     is_new_user = False
+  user_id = db_user.id
 
-  access_token = security.create_access_token(data={"id": user_id, "email": user.email, "role": "user"})
+  # A role e a versao reais do usuario vao no token, pois as rotas de admin confiam na claim
+  access_token = security.create_access_token(data={"id": user_id, "email": user.email, "role": db_user.role, "ver": db_user.token_version})
   refresh_token = security.create_refresh_token(data={"id": user_id})
 
   return JSONResponse(status_code=200, content={
@@ -102,8 +114,8 @@ def refresh_token(token: dict = Depends(security.verify_token)):
   return JSONResponse(status_code=200, content={ "access_token": access_token, "token_type": "bearer" })
 
 @auth.post('/resend-code')
-async def send_new_code(data: authSchema.SendNewCode, db: Session = Depends(get_db)):
-  user = userRepository.get_user_by_email(db, data.email)
+async def send_new_code(data: authSchema.SendNewCode, db: Session | AsyncSession = Depends(get_db_for("send_new_code"))):
+  user = await userRepositoryAsync.get_user_by_email(db, data.email)
   if not user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
 
@@ -114,25 +126,25 @@ async def send_new_code(data: authSchema.SendNewCode, db: Session = Depends(get_
   return JSONResponse(status_code=201, content={ "status": "success" })
 
   # Recebe dados de validação de conta
-@auth.patch('/activate-account')
-async def validate_account(data: authSchema.AccountValidation, db: Session = Depends(get_db)):
-  user = userRepository.get_user_by_email(db, data.email)
+@auth.patch('/activate-account', dependencies=[Depends(rate_limit.limit("activate_account"))])
+async def validate_account(data: authSchema.AccountValidation, db: Session | AsyncSession = Depends(get_db_for("validate_account"))):
+  # Confere o codigo e ativa no mesmo UPDATE; a leitura do usuario so acontece para explicar a falha
+  if await userRepositoryAsync.activate_account_with_code(db, data.email, data.code):
+    return JSONResponse(status_code=200, content={ "status": "success" })
+
+  user = await userRepositoryAsync.get_user_credentials(db, data.email)
   if not user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
 
   if user.is_active:
     return JSONResponse(status_code=200, content={ "status": "error", "message": errorMessages.ACCOUNT_ALREADY_ACTIVE })
-  
-  if user.activation_code != data.code:
-    raise HTTPException(status_code=404, detail=errorMessages.INVALID_CODE)
 
-  userRepository.activate_account(db, user)
-  return JSONResponse(status_code=200, content={ "status": "success" })
+  raise HTTPException(status_code=404, detail=errorMessages.INVALID_CODE)
 
  # cadastro da senha de admin / role do admin
 @auth.post('/admin-setup')
-async def admin_setup(data: authSchema.AdminSetup, db: Session = Depends(get_db)):
-  user = userRepository.get_user_by_email(db, data.email)
+async def admin_setup(data: authSchema.AdminSetup, db: Session | AsyncSession = Depends(get_db_for("admin_setup"))):
+  user = await userRepositoryAsync.get_user_by_email(db, data.email)
   if not user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
 
@@ -142,13 +154,13 @@ async def admin_setup(data: authSchema.AdminSetup, db: Session = Depends(get_db)
   if not re.search(r"unb", data.email):
     raise HTTPException(status_code=400, detail="Account is not @unb")
   
-  userRepository.update_user_role(db, user, "COADMIN")
+  await userRepositoryAsync.update_user_role(db, user, "COADMIN")
 
   return JSONResponse(status_code=200, content={"status": "success"})
 
 @auth.post('/super-admin-setup')
-async def super_admin_setup(data: authSchema.AdminSetup, db: Session = Depends(get_db)):
-  user = userRepository.get_user_by_email(db, data.email)
+async def super_admin_setup(data: authSchema.AdminSetup, db: Session | AsyncSession = Depends(get_db_for("super_admin_setup"))):
+  user = await userRepositoryAsync.get_user_by_email(db, data.email)
   if not user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
 
@@ -158,13 +170,13 @@ async def super_admin_setup(data: authSchema.AdminSetup, db: Session = Depends(g
   if not re.search(r"unb", data.email):
     raise HTTPException(status_code=400, detail="Account is not @unb")
 
-  userRepository.update_user_role(db, user, "ADMIN")
+  await userRepositoryAsync.update_user_role(db, user, "ADMIN")
 
   return JSONResponse(status_code=200, content={"status": "success"})
 
 @auth.post('/reset-password/request')
-async def request_password_(data: authSchema.ResetPasswordRequest, db: Session = Depends(get_db)):
-  user = userRepository.get_user_by_email(db, data.email)
+async def request_password_(data: authSchema.ResetPasswordRequest, db: Session | AsyncSession = Depends(get_db_for("request_password_")), accept_language: str | None = Header(default=None)):
+  user = await userRepositoryAsync.get_user_by_email(db, data.email)
   if not user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
 
@@ -173,13 +185,15 @@ async def request_password_(data: authSchema.ResetPasswordRequest, db: Session =
   
   code = security.generate_six_digit_number_code()
 
-  userRepository.set_user_reset_pass_code(db, user, code)
-  await send_mail.send_reset_password_code(data.email, code)
+  locale = email_templates.templates.negotiate(accept_language)
+  emailOutboxRepository.add_message(db, enumeration.EmailKind.RESET_PASSWORD_CODE, data.email, { "code": code, "locale": locale })
+  await userRepositoryAsync.set_user_reset_pass_code(db, user, code)
+  email_outbox.notify()
   return JSONResponse(status_code=200, content={ "status": "success" })
 
-@auth.post('/reset-password/verify')
-async def verify_reset_code(data: authSchema.ResetPasswordVerify, db: Session = Depends(get_db)):
-  user = userRepository.get_user_by_email(db, data.email)
+@auth.post('/reset-password/verify', dependencies=[Depends(rate_limit.limit("reset_password_verify"))])
+async def verify_reset_code(data: authSchema.ResetPasswordVerify, db: Session | AsyncSession = Depends(get_db_for("verify_reset_code"))):
+  user = await userRepositoryAsync.get_user_credentials(db, data.email)
   if not user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
   
@@ -192,26 +206,28 @@ async def verify_reset_code(data: authSchema.ResetPasswordVerify, db: Session =
   return JSONResponse(status_code=200, content={ "status": "success" })
 
   # Atualizar senha de um usuário após uma solicitação de redefinição
-@auth.patch('/reset-password/change', response_model=userSchema.User)
-async def update_user_password(data: authSchema.ResetPasswordUpdate, db: Session = Depends(get_db)):
-  user = userRepository.get_user_by_email(db, data.email)
-  if not user:
-    raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
-  
-  # Valida a senha informada
-  if data.password and not security.validate_password(data.password):
+@auth.patch('/reset-password/change', response_model=userSchema.User, dependencies=[Depends(rate_limit.limit("reset_password_change"))])
+async def update_user_password(data: authSchema.ResetPasswordUpdate, db: Session | AsyncSession = Depends(get_db_for("update_user_password"))):
+  # Valida a senha informada (obrigatoria)
+  if not data.password or not security.validate_password(data.password):
     raise HTTPException(status_code=400, detail=errorMessages.INVALID_PASSWORD)
 
-  # Verifica se o usuario possui um reset code. Se não possuir, a solicitação é invalida e deve ser bloqueada
-  if not user.password_reset_code:
+  # Confere email e codigo com uma leitura simples antes do hash, para requisicoes invalidas nao ocuparem o pool de bcrypt
+  reset = await userRepositoryAsync.get_password_reset_code(db, data.email)
+  if reset is None:
+    raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
+
+  # Sem reset code a solicitação é invalida e deve ser bloqueada
+  if not reset.password_reset_code:
     raise HTTPException(status_code=401, detail=errorMessages.INVALID_REQUEST)
-  
-  # Verifica se o código corresponde
-  if data.code != user.password_reset_code:
+
+  if reset.password_reset_code != data.code:
     raise HTTPException(status_code=400, detail=errorMessages.INVALID_RESET_PASSWORD_CODE)
-    
-  # Faz procedimento de hash da senha e atualiza usuario
-  hashed_password = security.get_password_hash(data.password)
-  updated_user = userRepository.update_password(db, user, hashed_password)
 
+  # Troca a senha no mesmo UPDATE que confere e consome o reset code. Se outra requisicao consumiu o codigo
+  # entre a leitura e o UPDATE, nada e alterado
+  hashed_password = await security.get_password_hash_async(data.password)
+  updated_user = await userRepositoryAsync.update_password_with_code(db, data.email, data.code, hashed_password)
+  if not updated_user:
+    raise HTTPException(status_code=401, detail=errorMessages.INVALID_REQUEST)
   return updated_user
@@ -1,19 +1,25 @@
-from fastapi import APIRouter, HTTPException, Response, status, Depends, Header
-from src.database import get_db
+import os
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status, Depends, Header
+from src.database import get_db, get_db_for
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.constants import errorMessages
 from src.domain import userSchema
-from src.repository import userRepository
-from src.utils import security, enumeration
+from src.repository import userRepository, userRepositoryAsync
+from src.utils import bulk_import, security, enumeration, user_export
 from src.domain.userSchema import RoleUpdate
 
 from fastapi_filter import FilterDepends
+from starlette.responses import JSONResponse, StreamingResponse
 
 user = APIRouter(
   prefix="/users"
 )
 
+# Maximo de usuarios afetados por uma operacao em lote (/users/bulk)
+BULK_OPERATION_MAX_USERS = int(os.getenv("BULK_OPERATION_MAX_USERS") or 5000)
+
 @user.get("/", response_model=list[userSchema.User])
 def read_users(
   response: Response,
@@ -21,63 +27,98 @@ def read_users(
   db: Session = Depends(get_db), 
   _: dict = Depends(security.verify_token),
 ):
-  result = userRepository.get_users(db, users_filter)
+  if users_filter.count and not enumeration.CountStrategy.has_value(users_filter.count):
+    raise HTTPException(status_code=400, detail=errorMessages.INVALID_COUNT_STRATEGY)
+
+  try:
+    result = userRepository.get_users(db, users_filter)
+  except ValueError:
+    raise HTTPException(status_code=400, detail=errorMessages.INVALID_CURSOR)
 
   users = result['users']
   total = result['total']
 
-  response.headers['X-Total-Count'] = str(total)
+  # X-Total-Count-Type informa como o total foi obtido (exact, estimated, cached ou none)
+  if total is not None:
+    response.headers['X-Total-Count'] = str(total)
+  response.headers['X-Total-Count-Type'] = result['count_strategy']
+  # Cursores para navegar por keyset (?after= / ?before=) a partir desta pagina
+  if result['next_cursor']:
+    response.headers['X-Next-Cursor'] = result['next_cursor']
+  if result['prev_cursor']:
+    response.headers['X-Prev-Cursor'] = result['prev_cursor']
   return users
 
+# Exportacao em streaming (CSV ou NDJSON) de todos os usuarios dos filtros da listagem, sem paginacao
+@user.get("/export")
+def export_users(
+  export_format: str = Query("csv", alias="format"),
+  users_filter: userSchema.UserListFilter = FilterDepends(userSchema.UserListFilter),
+  _: dict = Depends(security.require_roles(enumeration.UserRole.ADMIN.value)),
+):
+  if export_format not in user_export.MEDIA_TYPES:
+    raise HTTPException(status_code=400, detail=errorMessages.INVALID_EXPORT_FORMAT)
+
+  return StreamingResponse(
+    user_export.export_users(users_filter, export_format),
+    media_type=user_export.MEDIA_TYPES[export_format],
+    headers={ "Content-Disposition": f'attachment; filename="users.{export_format}"' },
+  )
+
+# Importacao em lote (CSV ou NDJSON no corpo, ver utils/bulk_import). Retorna o resultado de cada linha
+@user.post("/import")
+async def import_users(request: Request, db: Session = Depends(get_db), token: dict = Depends(security.require_roles(enumeration.UserRole.ADMIN.value))):
+  import_format = bulk_import.detect_format(request.headers.get("content-type"))
+  if import_format is None:
+    raise HTTPException(status_code=415, detail=errorMessages.UNSUPPORTED_IMPORT_FORMAT)
+
+  report = await bulk_import.import_users(db, request.stream(), import_format)
+  return JSONResponse(status_code=200, content=report)
+
 @user.get("/{user_id}", response_model=userSchema.User)
-async def read_user(user_id: int, db: Session = Depends(get_db), token: dict = Depends(security.verify_token)):
-  user = userRepository.get_user(db, user_id)
+async def read_user(user_id: int, db: Session | AsyncSession = Depends(get_db_for("read_user")), token: dict = Depends(security.verify_token)):
+  user = await userRepositoryAsync.get_user(db, user_id)
   if not user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
   return user
 
 @user.get("/email/{user_email}", response_model=userSchema.User)
-async def read_user_by_email(user_email: str, db: Session = Depends(get_db), token: dict = Depends(security.verify_token)):
-  user = userRepository.get_user_by_email(db, user_email)
+async def read_user_by_email(user_email: str, db: Session | AsyncSession = Depends(get_db_for("read_user_by_email")), token: dict = Depends(security.verify_token)):
+  user = await userRepositoryAsync.get_user_by_email(db, user_email)
   if not user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
   return user
 
 @user.patch("/{user_id}", response_model=userSchema.User)
-async def partial_update_user(user_id: int, data: userSchema.UserUpdate, db: Session = Depends(get_db), token: dict = Depends(security.verify_token)):
+async def partial_update_user(user_id: int, data: userSchema.UserUpdate, db: Session | AsyncSession = Depends(get_db_for("partial_update_user")), token: dict = Depends(security.verify_token)):
   # Validação do valor de connection
   if data.connection and not enumeration.UserConnection.has_value(data.connection):
     raise HTTPException(status_code=400, detail=errorMessages.INVALID_CONNECTION)
     
-  db_user = userRepository.get_user(db, user_id)
+  db_user = await userRepositoryAsync.get_user(db, user_id)
   if not db_user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
 
   if data.email and data.email != db_user.email:
-    user = userRepository.get_user_by_email(db, data.email)
+    user = await userRepositoryAsync.get_user_by_email(db, data.email)
     if user: 
       raise HTTPException(status_code=404, detail=errorMessages.EMAIL_ALREADY_REGISTERED)
 
-  updated_user = userRepository.update_user(db, db_user, data)
+  updated_user = await userRepositoryAsync.update_user(db, db_user, data)
   return updated_user
 
 @user.delete("/{user_id}", response_model=userSchema.User)
-async def delete_user(user_id: int, db: Session = Depends(get_db), token: dict = Depends(security.verify_token)):
-  db_user = userRepository.get_user(db, user_id)
+async def delete_user(user_id: int, db: Session | AsyncSession = Depends(get_db_for("delete_user")), token: dict = Depends(security.verify_token)):
+  db_user = await userRepositoryAsync.get_user(db, user_id)
   if not db_user:
     raise HTTPException(status_code=404, detail=errorMessages.USER_NOT_FOUND)
 
-  userRepository.delete_user(db, db_user)
+  await userRepositoryAsync.delete_user(db, db_user)
   return db_user
 
 @user.patch("/role/{user_id}", response_model=userSchema.User)
-def update_role(user_id: int, db: Session = Depends(get_db), token: dict = Depends(security.verify_token)):
-  # Obtem email do usuario a partir de token.
-  # Verifica se o usuário é ADMIN
-  user = userRepository.get_user_by_email(db, email=token['email'])
-  if user.role != enumeration.UserRole.ADMIN.value:
-    raise HTTPException(status_code=401, detail=errorMessages.NO_PERMISSION)
-
+def update_role(user_id: int, db: Session = Depends(get_db), token: dict = Depends(security.require_roles(enumeration.UserRole.ADMIN.value))):
+  # A role ADMIN do usuario vem da claim do token (ver security.require_roles)
   # Verificar se o usuario existe
   user = userRepository.get_user(db, user_id)
 
@@ -91,13 +132,8 @@ def update_role(user_id: int, db: Session = Depends(get_db), token: dict = Depen
   return user
 
 @user.patch("/role/superAdmin/{user_id}", response_model=userSchema.User)
-def update_role_superAdmin(user_id: int, role_update: RoleUpdate, db: Session = Depends(get_db), token: dict = Depends(security.verify_token)):
-    # Obtem email do usuario a partir do token.
-    # Verifica se o usuário é ADMIN
-    requesting_user = userRepository.get_user_by_email(db, email=token['email'])
-    if requesting_user.role != enumeration.UserRole.ADMIN.value:
-        raise HTTPException(status_code=401, detail=errorMessages.NO_PERMISSION)
-
+def update_role_superAdmin(user_id: int, role_update: RoleUpdate, db: Session = Depends(get_db), token: dict = Depends(security.require_roles(enumeration.UserRole.ADMIN.value))):
+    # A role ADMIN do usuario vem da claim do token (ver security.require_roles)
     # Verificar se o usuario a ser modificado existe
     user = userRepository.get_user(db, user_id)
     if not user:
@@ -107,9 +143,65 @@ def update_role_superAdmin(user_id: int, role_update: RoleUpdate, db: Session =
     # Verifica se a nova role é ADMIN ou COADMIN e se o email contém "unb"
     if new_role in [enumeration.UserRole.ADMIN.value, enumeration.UserRole.COADMIN.value]:
         if "unb" not in user.email:
-            raise HTTPException(status_code=400, detail="Usuários com roles ADMIN ou COADMIN devem ter um email contendo 'unb'.")
+            raise HTTPException(status_code=400, detail=errorMessages.ROLE_REQUIRES_UNB_EMAIL)
 
     # Atualiza a role do usuário
     user = userRepository.update_user_role(db, db_user=user, role=new_role)
 
     return user
+
+# Resolve a selecao (ids ou filtro, nunca os dois) em uma consulta. Retorna [(id, email)] dos usuarios existentes
+def _select_bulk_users(db: Session, selection: userSchema.BulkUserSelection) -> list:
+  has_filter = selection.filter is not None and any(selection.filter.model_dump().values())
+  if (selection.ids is None) == (not has_filter):
+    raise HTTPException(status_code=400, detail=errorMessages.INVALID_BULK_SELECTION)
+  if selection.ids is not None and len(set(selection.ids)) > BULK_OPERATION_MAX_USERS:
+    raise HTTPException(status_code=400, detail=errorMessages.BULK_SELECTION_TOO_LARGE)
+
+  users = userRepository.select_users_for_bulk(db, selection.ids, selection.filter, BULK_OPERATION_MAX_USERS + 1)
+  if len(users) > BULK_OPERATION_MAX_USERS:
+    raise HTTPException(status_code=400, detail=errorMessages.BULK_SELECTION_TOO_LARGE)
+  return users
+
+# Resultado por id: status de sucesso, erro da validacao ou not_found (id inexistente ou removido no meio da operacao)
+def _bulk_report(selection: userSchema.BulkUserSelection, users: list, affected: list, errors: dict, status: str):
+  ids = list(dict.fromkeys(selection.ids)) if selection.ids is not None else [user_id for user_id, _ in users]
+  affected = set(affected)
+  results = []
+  for user_id in ids:
+    if user_id in errors:
+      results.append({ "id": user_id, "status": "error", "error": errors[user_id] })
+    elif user_id in affected:
+      results.append({ "id": user_id, "status": status })
+    else:
+      results.append({ "id": user_id, "status": "not_found", "error": errorMessages.USER_NOT_FOUND })
+  return JSONResponse(status_code=200, content={ "affected": len(affected), "results": results })
+
+# Operacoes em lote: selecao + um unico UPDATE/DELETE por conjunto, na mesma transacao
+@user.patch("/bulk/role")
+def bulk_update_role(data: userSchema.BulkRoleUpdate, db: Session = Depends(get_db), token: dict = Depends(security.require_roles(enumeration.UserRole.ADMIN.value))):
+  if data.role not in [role.value for role in enumeration.UserRole]:
+    raise HTTPException(status_code=400, detail=errorMessages.INVALID_ROLE)
+
+  users = _select_bulk_users(db, data)
+
+  # Mesma regra do update_role_superAdmin
+  errors = {}
+  if data.role in [enumeration.UserRole.ADMIN.value, enumeration.UserRole.COADMIN.value]:
+    errors = { user_id: errorMessages.ROLE_REQUIRES_UNB_EMAIL for user_id, email in users if "unb" not in email }
+
+  updated = userRepository.update_users_role_bulk(db, [user_id for user_id, _ in users if user_id not in errors], data.role)
+  return _bulk_report(data, users, updated, errors, "updated")
+
+@user.patch("/bulk/activate")
+def bulk_activate(data: userSchema.BulkUserSelection, db: Session = Depends(get_db), token: dict = Depends(security.require_roles(enumeration.UserRole.ADMIN.value))):
+  users = _select_bulk_users(db, data)
+  activated = userRepository.activate_users_bulk(db, [user_id for user_id, _ in users])
+  return _bulk_report(data, users, activated, {}, "activated")
+
+@user.post("/bulk/delete")
+def bulk_delete(data: userSchema.BulkUserSelection, db: Session = Depends(get_db), token: dict = Depends(security.require_roles(enumeration.UserRole.ADMIN.value))):
+  users = _select_bulk_users(db, data)
+  deleted = userRepository.delete_users_bulk(db, [user_id for user_id, _ in users])
+  return _bulk_report(data, users, deleted, {}, "deleted")
+
@@ -28,10 +28,29 @@ class UserListFilter(Filter):
   name_or_email: Optional[str] = None
   offset: Optional[int] = 0
   limit: Optional[int] = 100
+  # Paginacao por cursor (keyset). Valores vem dos headers X-Next-Cursor / X-Prev-Cursor
+  after: Optional[str] = None
+  before: Optional[str] = None
+  # Estrategia do total (X-Total-Count): exact, estimated, cached ou none
+  count: Optional[str] = "exact"
 
 class Constants(Filter.Constants):
   model = userModel.User
   search_model_fields = ["name", "email"]
 
 class RoleUpdate(BaseModel):
-  role: str  
+  role: str
+
+# Selecao de usuarios das operacoes em lote: lista de ids ou filtro com os mesmos campos da listagem
+class UserSelectionFilter(BaseModel):
+  name: str | None = None
+  email: str | None = None
+  name_or_email: str | None = None
+  connection: str | None = None
+
+class BulkUserSelection(BaseModel):
+  ids: list[int] | None = None
+  filter: UserSelectionFilter | None = None
+
+class BulkRoleUpdate(BulkUserSelection):
+  role: str
@@ -1,8 +1,7 @@
-import uvicorn, sys
+import uvicorn, sys, os
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
 from dotenv import load_dotenv
-from starlette.middleware.base import BaseHTTPMiddleware
 
 from src.utils import dotenv
 
@@ -10,42 +9,104 @@ load_dotenv()
 dotenv.validate_dotenv()
 
 from src.controller import userController, authController
-from src.database import engine 
-from src.model import userModel
+from src.utils import bulk_import, cors, email_outbox, metrics, query_log, rate_limit, security
+from src.database import engine, get_pool_metrics
+from src.model import emailOutboxModel, userModel
+from src.repository import userCache
+from src import migrations
 
 userModel.Base.metadata.create_all(bind=engine)
+migrations.run_migrations(engine)
 
 app = FastAPI()
 
-class CustomCORSMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        response.headers['Access-Control-Allow-Origin'] = 'http://localhost:4200'
-        response.headers['Access-Control-Allow-Methods'] = 'POST, GET, OPTIONS, PUT, DELETE'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        return response
+# Workers que entregam os emails gravados no outbox pelas rotas
+@app.on_event("startup")
+async def start_email_outbox():
+    email_outbox.start()
 
-app.add_middleware(CustomCORSMiddleware)  
-  
-origins = ["*"]
+@app.on_event("shutdown")
+async def stop_email_outbox():
+    await email_outbox.stop()
+
+# CORS em ASGI puro. CORS_ALLOWED_ORIGINS: origens separadas por virgula, "*" (padrao) libera todas
+allowed_origins = [origin.strip() for origin in (os.getenv("CORS_ALLOWED_ORIGINS") or "*").split(",") if origin.strip()]
 
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
+    cors.CORSMiddleware,
+    allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"]
+    expose_headers=["*"],
+    max_age=int(os.getenv("CORS_MAX_AGE") or 600)
 )
 
+# Latencia, status e requisicoes em andamento por rota (adicionado por ultimo para medir tambem o CORS)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Consultas por requisicao: headers de debug, limite de consultas e deteccao de N+1
+app.add_middleware(query_log.QueryStatsMiddleware)
+
 # Routers
 app.include_router(prefix="/api", router=authController.auth)
 app.include_router(prefix="/api", router=userController.user)
 
+# Chaves publicas dos JWTs para verificacao local por outros servicos
+@app.get("/.well-known/jwks.json")
+def read_jwks():
+    return JSONResponse(content=security.get_jwks(), headers={ "Cache-Control": f"public, max-age={security.JWKS_MAX_AGE}" })
+
 @app.get("/")
 def read_root():
     return {"message": "UnB-TV!"}
 
+# Metricas no formato do Prometheus: latencia por rota, bcrypt, JWT, SMTP e tempo das consultas
+@app.get("/metrics")
+def read_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# Estado de pools, caches, outbox e rate limit copiado para as metricas a cada leitura de /metrics
+@metrics.register_collector
+def collect_runtime_metrics():
+    for name, status in get_pool_metrics().items():
+        for state in ["size", "checked_out", "checked_in", "overflow"]:
+            if state in status:
+                metrics.db_pool_connections.set(name, state, value=status[state])
+        if "checkout_wait" in status:
+            metrics.db_pool_checkouts_total.set(name, value=status["checkout_wait"]["count"])
+            metrics.db_pool_checkout_wait_seconds_total.set(name, value=status["checkout_wait"]["total_seconds"])
+            metrics.db_pool_checkout_timeouts_total.set(name, value=status["checkout_wait"]["timeouts"])
+
+    for pool in [security.password_hash_pool, bulk_import.hash_pool]:
+        status = pool.status()
+        metrics.worker_pool_workers.set(pool.name, value=status["workers"])
+        metrics.worker_pool_tasks.set(pool.name, "in_progress", value=status["in_progress"])
+        metrics.worker_pool_tasks.set(pool.name, "queued", value=status["queue_depth"])
+        metrics.worker_pool_rejected_total.set(pool.name, value=status["rejected"])
+
+    metrics.cache_entries.set("token", value=len(security.token_cache))
+    metrics.cache_lookups_total.set("token", "hit", value=security.token_cache.hits)
+    metrics.cache_lookups_total.set("token", "miss", value=security.token_cache.misses)
+
+    user_cache = userCache.status()
+    if user_cache["size"] is not None:
+        metrics.cache_entries.set("user", value=user_cache["size"])
+    metrics.cache_lookups_total.set("user", "hit", value=user_cache["hits"])
+    metrics.cache_lookups_total.set("user", "miss", value=user_cache["misses"])
+
+    outbox = email_outbox.status()
+    metrics.email_outbox_workers.set(value=outbox["workers"])
+    for status, count in outbox["messages"].items():
+        metrics.email_outbox_messages.set(status, value=count)
+    metrics.smtp_pool_connections.set("in_use", value=outbox["smtp_pool"]["in_use"])
+    metrics.smtp_pool_connections.set("idle", value=outbox["smtp_pool"]["idle"])
+    metrics.smtp_pool_opened_total.set(value=outbox["smtp_pool"]["opened"])
+
+    for route, rejected in rate_limit.limiter.rejected.items():
+        metrics.rate_limit_rejected_total.set(route, value=rejected)
+
 if __name__ == '__main__': # pragma: no cover
   port = 8000
   if (len(sys.argv) == 2):
@@ -0,0 +1,50 @@
+'''
+Migracoes idempotentes executadas logo apos o Base.metadata.create_all.
+
+O create_all apenas cria tabelas que ainda nao existem, entao indices e colunas
+adicionados em tabelas ja existentes (banco de producao) precisam ser aplicados aqui.
+Cada migracao deve poder ser executada repetidas vezes sem efeito colateral.
+'''
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+# Indice composto (name, id) usado pela paginacao por cursor em userRepository.get_users
+def create_users_name_id_index(connection: Connection):
+  connection.execute(text("CREATE INDEX IF NOT EXISTS ix_users_name_id ON users (name, id)"))
+
+# Indices GIN pg_trgm para a busca por substring do filtro name_or_email (apenas Postgres).
+# Se a extensao nao puder ser criada (sem permissao), a busca continua funcionando sem os indices
+def create_users_trigram_indexes(connection: Connection):
+  if connection.dialect.name != 'postgresql':
+    return
+
+  try:
+    with connection.begin_nested():
+      connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+  except DBAPIError as error:
+    logger.warning("pg_trgm indisponivel, busca por nome/email sem indice: %s", error)
+    return
+
+  connection.execute(text("CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING gin (name gin_trgm_ops)"))
+  connection.execute(text("CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (email gin_trgm_ops)"))
+
+# Versao dos tokens por usuario, comparada com a claim "ver" em security.require_roles
+def add_users_token_version_column(connection: Connection):
+  columns = [column["name"] for column in inspect(connection).get_columns("users")]
+  if "token_version" not in columns:
+    connection.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+
+MIGRATIONS = [
+  create_users_name_id_index,
+  create_users_trigram_indexes,
+  add_users_token_version_column,
+]
+
+def run_migrations(engine: Engine):
+  with engine.begin() as connection:
+    for migration in MIGRATIONS:
+      migration(connection)
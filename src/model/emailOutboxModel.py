@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String
+
+from src.database import Base
+
+def _now():
+  return datetime.now(timezone.utc)
+
+'''
+Outbox transacional de emails: a linha e gravada na mesma transacao da alteracao do usuario
+e entregue depois pelos workers de utils/email_outbox (com retentativas e dead-letter).
+'''
+class EmailOutbox(Base):
+  __tablename__ = "email_outbox"
+  __table_args__ = (
+    # Busca das mensagens pendentes vencidas pelos workers
+    Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    {'extend_existing': True},
+  )
+
+  id = Column(Integer, primary_key=True, index=True)
+  kind = Column(String, nullable=False)
+  email = Column(String, nullable=False)
+  payload = Column(JSON, nullable=False, default=dict)
+  status = Column(String, nullable=False, default="PENDING")
+  attempts = Column(Integer, nullable=False, default=0)
+  next_attempt_at = Column(DateTime(timezone=True), nullable=False, default=_now)
+  last_error = Column(String, nullable=True)
+  created_at = Column(DateTime(timezone=True), nullable=False, default=_now)
+  sent_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,13 +1,17 @@
 # Referencia: https://fastapi.tiangolo.com/tutorial/sql-databases/#create-the-database-models
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from src.database import Base
 
 class User(Base):
   __tablename__ = "users"
-  __table_args__ = {'extend_existing': True}
+  __table_args__ = (
+    # Indice composto usado pela paginacao por cursor (keyset) ordenada por nome
+    Index('ix_users_name_id', 'name', 'id'),
+    {'extend_existing': True},
+  )
 
   id = Column(Integer, primary_key=True, index=True)
   name = Column(String, nullable=False)
@@ -18,5 +22,7 @@ class User(Base):
   is_active = Column(Boolean, default=False)
   activation_code = Column(Integer, nullable=True)
   password_reset_code = Column(Integer, nullable=True)
+  # Versao dos tokens do usuario (claim "ver"): incrementada na troca de role, revoga os tokens anteriores
+  token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
 
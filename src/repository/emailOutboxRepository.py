@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from src.model import emailOutboxModel
+from src.utils import enumeration
+
+'''
+Adiciona uma mensagem ao outbox SEM commit: ela e gravada no commit da escrita de usuario
+feita em seguida na mesma sessao (ex: userRepository.create_user), na mesma transacao.
+Funciona tanto com Session quanto com AsyncSession (add e sincrono nas duas).
+'''
+def add_message(db, kind: enumeration.EmailKind, email: str, payload: dict):
+  message = emailOutboxModel.EmailOutbox(kind=kind.value, email=email, payload=payload, status=enumeration.EmailStatus.PENDING.value)
+  db.add(message)
+  return message
+
+# Versao em lote do add_message (um INSERT executemany), tambem sem commit. messages: lista de (email, payload)
+def add_messages(db, kind: enumeration.EmailKind, messages: list):
+  if messages:
+    db.execute(insert(emailOutboxModel.EmailOutbox), [
+      { "kind": kind.value, "email": email, "payload": payload, "status": enumeration.EmailStatus.PENDING.value } for email, payload in messages
+    ])
+
+'''
+Reserva ate `limit` mensagens pendentes vencidas para um worker. A reserva empurra o
+next_attempt_at para daqui a `lease_seconds`, entao se o worker morrer a mensagem volta a
+ser entregue depois disso. No Postgres usa FOR UPDATE SKIP LOCKED para workers concorrentes.
+'''
+def claim_due_messages(db: Session, limit: int, lease_seconds: float):
+  now = datetime.now(timezone.utc)
+  messages = db.query(emailOutboxModel.EmailOutbox) \
+    .filter(emailOutboxModel.EmailOutbox.status == enumeration.EmailStatus.PENDING.value) \
+    .filter(emailOutboxModel.EmailOutbox.next_attempt_at <= now) \
+    .order_by(emailOutboxModel.EmailOutbox.next_attempt_at.asc()) \
+    .limit(limit) \
+    .with_for_update(skip_locked=True) \
+    .all()
+
+  for message in messages:
+    message.attempts += 1
+    message.next_attempt_at = now + timedelta(seconds=lease_seconds)
+
+  db.commit()
+  return [{ "id": message.id, "kind": message.kind, "email": message.email, "payload": message.payload, "attempts": message.attempts } for message in messages]
+
+# O payload (com o codigo de ativacao/reset em texto puro) e apagado assim que a mensagem e entregue
+def mark_sent(db: Session, message_id: int):
+  db.query(emailOutboxModel.EmailOutbox).filter(emailOutboxModel.EmailOutbox.id == message_id).update({
+    "status": enumeration.EmailStatus.SENT.value,
+    "sent_at": datetime.now(timezone.utc),
+    "payload": {},
+    "last_error": None,
+  })
+  db.commit()
+
+# Agenda nova tentativa em retry_in_seconds, ou move para dead-letter (DEAD) quando retry_in_seconds e None
+def mark_failed(db: Session, message_id: int, error: str, retry_in_seconds: float | None):
+  values = { "last_error": error[:1000] }
+  if retry_in_seconds is None:
+    values["status"] = enumeration.EmailStatus.DEAD.value
+  else:
+    values["next_attempt_at"] = datetime.now(timezone.utc) + timedelta(seconds=retry_in_seconds)
+
+  db.query(emailOutboxModel.EmailOutbox).filter(emailOutboxModel.EmailOutbox.id == message_id).update(values)
+  db.commit()
+
+def count_by_status(db: Session):
+  rows = db.query(emailOutboxModel.EmailOutbox.status, func.count()).group_by(emailOutboxModel.EmailOutbox.status).all()
+  return { status: count for status, count in rows }
+
+# Remove mensagens enviadas (SENT) e em dead-letter (DEAD) criadas ha mais de older_than_seconds. Retorna quantas
+def purge_messages(db: Session, older_than_seconds: float) -> int:
+  cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than_seconds)
+  deleted = db.query(emailOutboxModel.EmailOutbox) \
+    .filter(emailOutboxModel.EmailOutbox.status.in_([enumeration.EmailStatus.SENT.value, enumeration.EmailStatus.DEAD.value])) \
+    .filter(emailOutboxModel.EmailOutbox.created_at < cutoff) \
+    .delete(synchronize_session=False)
+  db.commit()
+  return deleted
@@ -0,0 +1,91 @@
+'''
+Cache read-through das buscas de usuario por id e por email (userRepository.get_user / get_user_by_email).
+
+Guarda as colunas do usuario (nao a instancia do ORM, que pertence a uma sessao) em "user:id:<id>"
+e um indice "user:email:<email>" -> id. No hit o usuario e reconstruido e anexado a sessao atual
+sem consulta (merge com load=False), entao as escritas seguintes funcionam como se ele tivesse sido
+lido do banco. Como o email aponta para o id, trocar o email invalida as duas buscas ao apagar so o id.
+As escritas do userRepository chamam invalidate apos o commit.
+As credenciais (hash da senha e codigos de ativacao/reset) nao entram no cache: nao vao para o
+Redis e nao sao conferidas com uma copia desatualizada. No usuario vindo do cache elas ficam
+expiradas; login, ativacao e reset leem o usuario direto do banco (userRepository.get_user_credentials).
+
+Por padrao o cache e por processo (LRU com TTL). Com varias instancias/workers use
+USER_CACHE_BACKEND=redis, senao um worker pode ver o usuario desatualizado ate o TTL expirar.
+USER_CACHE_TTL=0 desliga o cache.
+'''
+import os
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from src.model import userModel
+from src.utils import cache
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE") or 10000)
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL") or 30)
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND") or "memory"
+USER_CACHE_REDIS_URL = os.getenv("USER_CACHE_REDIS_URL") or "redis://localhost:6379/0"
+
+CREDENTIAL_COLUMNS = ["password", "activation_code", "password_reset_code"]
+_columns = [column.key for column in userModel.User.__table__.columns if column.key not in CREDENTIAL_COLUMNS]
+
+def build_cache(backend: str):
+  if backend == "redis":
+    return cache.RedisCache(USER_CACHE_REDIS_URL, ttl=USER_CACHE_TTL, prefix="user-cache:")
+  return cache.TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+user_cache = build_cache(USER_CACHE_BACKEND)
+
+# Buscas por id/email atendidas pelo cache (hits) ou pelo banco (misses)
+stats = { "hits": 0, "misses": 0 }
+
+def _id_key(user_id) -> str:
+  return f"user:id:{user_id}"
+
+def _email_key(email: str) -> str:
+  return f"user:email:{email}"
+
+def _attach(db: Session, data: dict) -> userModel.User:
+  db_user = userModel.User(**data)
+  make_transient_to_detached(db_user)
+  return db.merge(db_user, load=False)
+
+def _result(db: Session, data: dict | None) -> userModel.User | None:
+  stats["misses" if data is None else "hits"] += 1
+  return _attach(db, data) if data is not None else None
+
+def get_by_id(db: Session, user_id: int) -> userModel.User | None:
+  return _result(db, user_cache.get(_id_key(user_id)))
+
+def get_by_email(db: Session, email: str) -> userModel.User | None:
+  user_id = user_cache.get(_email_key(email))
+  data = user_cache.get(_id_key(user_id)) if user_id is not None else None
+  # O email do usuario pode ter mudado depois do indice ser gravado
+  if data is not None and data["email"] != email:
+    data = None
+  return _result(db, data)
+
+def store(db_user: userModel.User | None):
+  if db_user is None:
+    return
+  data = { column: getattr(db_user, column) for column in _columns }
+  user_cache.set(_id_key(data["id"]), data)
+  user_cache.set(_email_key(data["email"]), data["id"])
+
+def invalidate(user_id: int, email: str | None = None):
+  user_cache.delete(_id_key(user_id))
+  if email is not None:
+    user_cache.delete(_email_key(email))
+
+def clear():
+  user_cache.clear()
+  stats.update(hits=0, misses=0)
+
+def status() -> dict:
+  lookups = stats["hits"] + stats["misses"]
+  return {
+    "backend": USER_CACHE_BACKEND,
+    "ttl": user_cache.ttl,
+    "size": len(user_cache) if isinstance(user_cache, cache.TTLCache) else None,
+    **stats,
+    "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else None,
+  }
@@ -1,16 +1,38 @@
 # Referencia: https://fastapi.tiangolo.com/tutorial/sql-databases/#crud-utils
-from sqlalchemy import or_
+import json, os
+from sqlalchemy import and_, delete, insert, or_, select, text, tuple_, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
+from src.constants import errorMessages
 from src.domain import userSchema
 from src.model import userModel
+from src.repository import userCache, userSearch
+from src.utils import cache, enumeration, pagination
 
-# Obtem usuario a partir do seu ID
+USER_COUNT_CACHE_TTL = float(os.getenv("USER_COUNT_CACHE_TTL", default=30))
+
+# Totais da listagem de usuarios por filtro, usado pela estrategia de contagem "cached"
+count_cache = cache.TTLCache(maxsize=1024, ttl=USER_COUNT_CACHE_TTL)
+
+# Obtem usuario a partir do seu ID (read-through no userCache)
 def get_user(db: Session, user_id: int):
-  return db.query(userModel.User).filter(userModel.User.id == user_id).first()
+  db_user = userCache.get_by_id(db, user_id)
+  if db_user is None:
+    db_user = db.query(userModel.User).filter(userModel.User.id == user_id).first()
+    userCache.store(db_user)
+  return db_user
 
-# Obtem usuario a partir do Email
+# Obtem usuario a partir do Email (read-through no userCache)
 def get_user_by_email(db: Session, email: str):
+  db_user = userCache.get_by_email(db, email)
+  if db_user is None:
+    db_user = db.query(userModel.User).filter(userModel.User.email == email).first()
+    userCache.store(db_user)
+  return db_user
+
+# Usuario lido direto do banco, sem o userCache, para conferir senha e codigos (que nao ficam no cache)
+def get_user_credentials(db: Session, email: str):
   return db.query(userModel.User).filter(userModel.User.email == email).first()
 
 '''
@@ -18,48 +40,273 @@ Obtem lista de usuarios. Possui filtragem:
 Filtros:
 name: filtrar por nome do usuario
 email: filtrar por email do usuario
-name_or_email: filtragem que aceita tanto nome quanto email (OR)
+name_or_email: filtragem que aceita tanto nome quanto email (OR). Ver userSearch (indice trigram,
+  ranqueamento por similaridade no modo offset e prefixo para termos curtos)
 connection: filtragem pelo vinculo do usuario
 
-Também aceita offset e limit. Para offset pula a quantidade informada, 
-para o limit, controla a quantidade de usuarios retornada 
+Paginacao:
+- offset/limit (modo original): para offset pula a quantidade informada,
+para o limit, controla a quantidade de usuarios retornada
+- after/before (modo cursor/keyset): cursores opacos com a chave (name, id). A pagina
+e buscada com WHERE (name, id) > cursor usando o indice ix_users_name_id, sem
+varrer as linhas anteriores, entao o custo nao cresce com a profundidade da pagina.
+Quando um cursor e informado, o offset e ignorado.
+
+Em ambos os modos sao retornados next_cursor e prev_cursor (ou None) para navegar a partir da pagina atual.
+Lanca ValueError se o cursor for invalido.
 '''
 def get_users(db: Session, users_filter: userSchema.UserListFilter):
-  query = db.query(userModel.User)
+  query, search_rank = _filter_users(db, db.query(userModel.User), users_filter)
+
+  if (users_filter.after and users_filter.before):
+    raise ValueError(errorMessages.INVALID_CURSOR)
+
+  # Realiza o count para retornar para o front para realizar paginação, conforme a estrategia pedida
+  total_count, count_strategy = count_users(db, query, users_filter)
+
+  if (users_filter.after or users_filter.before):
+    page = _get_users_page_by_cursor(query, users_filter, search_rank)
+  else:
+    page = _get_users_page_by_offset(query, users_filter, search_rank)
+
+  # Retorna todos os usuarios filtrados, dentro de eventuais limitações (offset ou limit) e o total (geral)
+  return { **page, "total": total_count, "count_strategy": count_strategy }
+
+# Aplica os filtros da listagem (name, email, name_or_email e connection). Retorna (query, rank da busca ou None)
+def _filter_users(db: Session, query, users_filter: userSchema.UserListFilter):
+  search_rank = None
 
   if (users_filter.name):
     query = query.filter(userModel.User.name == users_filter.name)
   elif (users_filter.email):
     query = query.filter(userModel.User.email == users_filter.email)
   elif (users_filter.name_or_email):
-    query = query.filter(or_(userModel.User.name.ilike(f'%{users_filter.name_or_email}%'), userModel.User.email.ilike(f'%{users_filter.name_or_email}%')))
+    query, search_rank = userSearch.filter_name_or_email(db, query, users_filter.name_or_email)
 
   if (users_filter.connection):
     query = query.filter(userModel.User.connection == users_filter.connection)
 
-  # Realiza o count para retornar para o front para realizar paginação
-  total_count = query.count()
-  # Ordena a lista de usuarios por ordem alfabetica pelo nome
-  query = query.order_by(userModel.User.name.asc())
+  return query, search_rank
+
+# Colunas publicas do usuario (userSchema.User), usadas pela exportacao
+EXPORT_COLUMNS = ["id", "name", "email", "connection", "role", "is_active"]
+
+'''
+Percorre todos os usuarios do filtro ordenados por (name, id), sem paginacao (offset, limit e
+cursores nao se aplicam). Le apenas as colunas exportadas e usa yield_per: com o Postgres o
+resultado vem de um cursor no servidor em blocos de batch_size linhas, entao a memoria nao
+depende do tamanho da tabela. Gera tuplas na ordem de EXPORT_COLUMNS.
+'''
+def iter_users(db: Session, users_filter: userSchema.UserListFilter, batch_size: int = 1000):
+  query = db.query(*[getattr(userModel.User, column) for column in EXPORT_COLUMNS])
+  query, _ = _filter_users(db, query, users_filter)
+  query = query.order_by(userModel.User.name.asc(), userModel.User.id.asc()).yield_per(batch_size)
+  for row in query:
+    yield tuple(row)
+
+def _get_users_page_by_offset(query, users_filter: userSchema.UserListFilter, search_rank=None):
+  # Buscas textuais ranqueadas vem primeiro por similaridade. O rank e lido junto para montar os cursores
+  if search_rank is not None:
+    query = query.add_columns(search_rank).order_by(search_rank.desc())
+
+  # Ordena a lista de usuarios por ordem alfabetica pelo nome (id desempata nomes iguais)
+  query = query.order_by(userModel.User.name.asc(), userModel.User.id.asc())
 
   # Realiza a delimitação por offset
   if (users_filter.offset):
     query = query.offset(users_filter.offset)
 
-  # Realiza a limitação por quantidade retornada
+  # Realiza a limitação por quantidade retornada. Busca um registro a mais para saber se existe proxima pagina sem depender do total
   if (users_filter.limit):
-    query = query.limit(users_filter.limit)
+    query = query.limit(users_filter.limit + 1)
 
-  # Retorna todos os usuarios filtrados, dentro de eventuais limitações (offset ou limit) e o total (geral)
-  return { "users": query.all(), "total": total_count }
+  users, ranks = _split_ranks(query.all(), search_rank)
+  has_next = bool(users_filter.limit) and len(users) > users_filter.limit
+  if has_next:
+    users, ranks = users[:users_filter.limit], ranks[:users_filter.limit]
+  has_prev = bool(users) and bool(users_filter.offset)
+
+  return {
+    "users": users,
+    "next_cursor": _user_cursor(users[-1], ranks[-1]) if has_next else None,
+    "prev_cursor": _user_cursor(users[0], ranks[0]) if has_prev else None,
+  }
+
+# Separa as linhas (usuario, rank) das buscas ranqueadas. Sem ranqueamento os ranks sao None
+def _split_ranks(rows: list, search_rank) -> tuple:
+  if search_rank is None:
+    return rows, [None] * len(rows)
+  return [row[0] for row in rows], [row[1] for row in rows]
+
+def _user_cursor(db_user: userModel.User, rank: float | None = None) -> str:
+  return pagination.encode_cursor(db_user.name, db_user.id, rank)
+
+'''
+Pagina por keyset a partir do cursor. Sem ranqueamento a chave e (name, id); nas buscas ranqueadas e
+(rank desc, name, id), a mesma ordem da primeira pagina, entao seguir os cursores nao pula nem repete
+usuarios. Um cursor de outro tipo de listagem (com/sem rank) e invalido.
+'''
+def _get_users_page_by_cursor(query, users_filter: userSchema.UserListFilter, search_rank=None):
+  backwards = bool(users_filter.before)
+  name, user_id, rank = pagination.decode_cursor(users_filter.before if backwards else users_filter.after)
+  if (rank is None) != (search_rank is None):
+    raise ValueError(errorMessages.INVALID_CURSOR)
+
+  sort_key = tuple_(userModel.User.name, userModel.User.id)
+  after_key = sort_key < tuple_(name, user_id) if backwards else sort_key > tuple_(name, user_id)
+  name_order = [userModel.User.name.desc(), userModel.User.id.desc()] if backwards else [userModel.User.name.asc(), userModel.User.id.asc()]
+
+  if search_rank is None:
+    query = query.filter(after_key).order_by(*name_order)
+  else:
+    # Rank decrescente: depois do cursor vem rank menor (ou o mesmo rank com (name, id) maior)
+    rank_after = search_rank > rank if backwards else search_rank < rank
+    query = (query.add_columns(search_rank)
+      .filter(or_(rank_after, and_(search_rank == rank, after_key)))
+      .order_by(search_rank.asc() if backwards else search_rank.desc(), *name_order))
+
+  # Busca um registro a mais para saber se existe pagina seguinte (na direcao percorrida)
+  if (users_filter.limit):
+    query = query.limit(users_filter.limit + 1)
+
+  users, ranks = _split_ranks(query.all(), search_rank)
+  has_more = bool(users_filter.limit) and len(users) > users_filter.limit
+  if has_more:
+    users, ranks = users[:users_filter.limit], ranks[:users_filter.limit]
+
+  if backwards:
+    users.reverse()
+    ranks.reverse()
+
+  # Na direcao de onde o cursor veio sempre existe ao menos o registro do proprio cursor
+  has_next = bool(users) and (backwards or has_more)
+  has_prev = bool(users) and (has_more if backwards else True)
+
+  return {
+    "users": users,
+    "next_cursor": _user_cursor(users[-1], ranks[-1]) if has_next else None,
+    "prev_cursor": _user_cursor(users[0], ranks[0]) if has_prev else None,
+  }
+
+'''
+Calcula o total da listagem conforme users_filter.count. Retorna (total, estrategia usada):
+exact: SELECT count(*) sobre o conjunto filtrado (comportamento original)
+estimated: estimativa do planner do Postgres. Sem filtros usa pg_class.reltuples, com filtros
+  usa a estimativa de linhas do EXPLAIN. Em outros bancos (ex: SQLite nos testes) cai para exact
+cached: count exato memorizado por filtro por USER_COUNT_CACHE_TTL segundos, invalidado nas escritas de usuarios
+none: nao calcula o total (total = None)
+'''
+def count_users(db: Session, query, users_filter: userSchema.UserListFilter):
+  strategy = users_filter.count or enumeration.CountStrategy.EXACT.value
+
+  if strategy == enumeration.CountStrategy.NONE.value:
+    return None, strategy
+
+  if strategy == enumeration.CountStrategy.ESTIMATED.value:
+    estimate = _estimate_count(db, query, users_filter)
+    if estimate is not None:
+      return estimate, strategy
+    return query.count(), enumeration.CountStrategy.EXACT.value
+
+  if strategy == enumeration.CountStrategy.CACHED.value:
+    key = _filter_key(users_filter)
+    total_count = count_cache.get(key)
+    if total_count is None:
+      total_count = query.count()
+      count_cache.set(key, total_count)
+    return total_count, strategy
+
+  return query.count(), enumeration.CountStrategy.EXACT.value
+
+def _filter_key(users_filter: userSchema.UserListFilter):
+  return (users_filter.name, users_filter.email, users_filter.name_or_email, users_filter.connection)
+
+def _estimate_count(db: Session, query, users_filter: userSchema.UserListFilter):
+  if db.get_bind().dialect.name != 'postgresql':
+    return None
+
+  if not any(_filter_key(users_filter)):
+    reltuples = db.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass")).scalar()
+    # reltuples = -1 indica tabela ainda nao analisada (sem estatisticas)
+    return reltuples if reltuples is not None and reltuples >= 0 else None
+
+  compiled = query.statement.compile(dialect=db.get_bind().dialect)
+  plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+  if isinstance(plan, str):
+    plan = json.loads(plan)
+  return int(plan[0]['Plan']['Plan Rows'])
+
+# Invalida os totais memorizados (count=cached) apos escritas que alteram a listagem
+def _invalidate_user_list_caches():
+  count_cache.clear()
 
 def create_user(db: Session, name, connection, email, password, activation_code):
   db_user = userModel.User(name=name, connection=connection, email=email, password=password, activation_code=activation_code,)
   db.add(db_user)
   db.commit()
-  db.refresh(db_user)
+  _invalidate_user_list_caches()
   return db_user
 
+# Emails da lista que ja estao cadastrados (uma consulta com IN)
+def get_existing_emails(db: Session, emails: list) -> set:
+  if not emails:
+    return set()
+  return set(db.scalars(select(userModel.User.email).where(userModel.User.email.in_(emails))))
+
+'''
+Cadastra varios usuarios em um unico INSERT em lote (executemany / multi-values do SQLAlchemy).
+users e uma lista de dicts com name, connection, email, password (hash) e activation_code.
+Faz o commit junto com o que ja estiver pendente na sessao (ex: emails do outbox do mesmo lote).
+'''
+def create_users_bulk(db: Session, users: list):
+  if users:
+    db.execute(insert(userModel.User), users)
+  db.commit()
+  _invalidate_user_list_caches()
+
+'''
+Operacoes em lote (rotas /users/bulk). select_users_for_bulk resolve a selecao (ids ou filtro) em uma
+consulta e as escritas sao um unico UPDATE/DELETE ... WHERE id IN (...) RETURNING, com o commit ao final,
+entao a selecao e a escrita ficam na mesma transacao.
+'''
+def select_users_for_bulk(db: Session, ids: list | None, users_filter, limit: int):
+  query = db.query(userModel.User.id, userModel.User.email)
+  if ids is not None:
+    query = query.filter(userModel.User.id.in_(ids))
+  else:
+    query, _ = _filter_users(db, query, users_filter)
+  return [tuple(row) for row in query.order_by(userModel.User.id.asc()).limit(limit).all()]
+
+# A troca de role em lote tambem incrementa token_version (ver update_user_role)
+def update_users_role_bulk(db: Session, ids: list, role: str) -> list:
+  return _bulk_write(db, ids, update(userModel.User)
+    .where(userModel.User.id.in_(ids))
+    .values(role=role, token_version=userModel.User.token_version + 1)
+    .returning(userModel.User.id))
+
+def activate_users_bulk(db: Session, ids: list) -> list:
+  return _bulk_write(db, ids, update(userModel.User)
+    .where(userModel.User.id.in_(ids))
+    .values(is_active=True, activation_code=None)
+    .returning(userModel.User.id))
+
+def delete_users_bulk(db: Session, ids: list) -> list:
+  deleted = _bulk_write(db, ids, delete(userModel.User)
+    .where(userModel.User.id.in_(ids))
+    .returning(userModel.User.id))
+  _invalidate_user_list_caches()
+  return deleted
+
+# Executa a escrita em lote, faz o commit e invalida o cache dos usuarios afetados. Retorna os ids afetados
+def _bulk_write(db: Session, ids: list, statement) -> list:
+  if not ids:
+    return []
+  affected = list(db.scalars(statement, execution_options={ "synchronize_session": "fetch" }))
+  db.commit()
+  for user_id in affected:
+    userCache.invalidate(user_id)
+  return affected
+
 # Cria um usuario por login social. Essa criação é especial pois o usuario criado por rede social não possui SENHA
 def create_user_social(db: Session, name, email):
   db_user = userModel.User(
@@ -71,7 +318,7 @@ def create_user_social(db: Session, name, email):
 
   db.add(db_user)
   db.commit()
-  db.refresh(db_user)
+  _invalidate_user_list_caches()
   return db_user
 
 def update_user(db: Session, db_user: userSchema.User, user: userSchema.UserUpdate):
@@ -81,41 +328,90 @@ def update_user(db: Session, db_user: userSchema.User, user: userSchema.UserUpda
 
   db.add(db_user)
   db.commit()
-  db.refresh(db_user)
+  _invalidate_user_list_caches()
+  userCache.invalidate(db_user.id)
   return db_user
 
+# A troca de role incrementa token_version, revogando os tokens emitidos com a role antiga.
+# O incremento e feito no banco (atomico) e a nova versao volta no proprio UPDATE ... RETURNING
 def update_user_role(db: Session, db_user: userSchema.User, role: str):
-  db_user.role = role
-
-  db.add(db_user)
+  token_version = db.execute(
+    update(userModel.User)
+      .where(userModel.User.id == db_user.id)
+      .values(role=role, token_version=userModel.User.token_version + 1)
+      .returning(userModel.User.token_version),
+    execution_options={ "synchronize_session": False },
+  ).scalar_one()
   db.commit()
-  db.refresh(db_user)
+
+  set_committed_value(db_user, "role", role)
+  set_committed_value(db_user, "token_version", token_version)
+  userCache.invalidate(db_user.id)
   return db_user
 
-def update_password(db: Session, db_user: userSchema.User, new_password: str):
+# Versao atual dos tokens do usuario (None se ele nao existe). Normalmente atendida pelo userCache
+def get_token_version(db: Session, user_id: int):
+  db_user = get_user(db, user_id)
+  return db_user.token_version if db_user else None
+
+# Troca apenas o hash da senha (rehash no login apos mudanca da politica de hash), sem mexer no reset code
+def rehash_password(db: Session, db_user: userSchema.User, new_password: str):
   db_user.password = new_password
-  db_user.password_reset_code = None
 
   db.add(db_user)
   db.commit()
-  db.refresh(db_user)
+  userCache.invalidate(db_user.id)
   return db_user
 
-def activate_account(db: Session, db_user: userSchema.User):
-  db_user.is_active = True
-  db_user.activation_code = None
-  db.add(db_user)
+'''
+Ativa a conta com o codigo em um unico UPDATE condicional (email + codigo + conta inativa).
+A comparacao do codigo e a escrita acontecem no mesmo comando, entao requisicoes concorrentes
+nao conseguem usar o mesmo codigo duas vezes. Retorna True se a conta foi ativada.
+'''
+def activate_account_with_code(db: Session, email: str, code: int) -> bool:
+  user_id = db.execute(
+    update(userModel.User)
+      .where(userModel.User.email == email, userModel.User.activation_code == code, userModel.User.is_active == False)
+      .values(is_active=True, activation_code=None)
+      .returning(userModel.User.id)
+  ).scalar_one_or_none()
   db.commit()
-  db.refresh(db_user)
+
+  if user_id is not None:
+    userCache.invalidate(user_id)
+  return user_id is not None
+
+# Le o reset code direto do banco (sem o userCache, que pode estar desatualizado). None se o email nao existe
+def get_password_reset_code(db: Session, email: str):
+  return db.execute(select(userModel.User.password_reset_code).where(userModel.User.email == email)).one_or_none()
+
+'''
+Troca a senha com o codigo de reset em um unico UPDATE condicional (email + codigo), consumindo o
+codigo no mesmo comando. Retorna o usuario atualizado ou None se o email/codigo nao conferem.
+'''
+def update_password_with_code(db: Session, email: str, code: int, new_password: str):
+  db_user = db.execute(
+    update(userModel.User)
+      .where(userModel.User.email == email, userModel.User.password_reset_code == code)
+      .values(password=new_password, password_reset_code=None)
+      .returning(userModel.User)
+  ).scalar_one_or_none()
+  db.commit()
+
+  if db_user is not None:
+    userCache.invalidate(db_user.id)
   return db_user
 
 def set_user_reset_pass_code(db: Session, db_user: userSchema.User, code: int):
   db_user.password_reset_code = code
   db.add(db_user)
   db.commit()
-  db.refresh(db_user)
+  userCache.invalidate(db_user.id)
   return db_user
 
 def delete_user(db: Session, db_user: userSchema.User):
+  user_id, email = db_user.id, db_user.email
   db.delete(db_user)
-  db.commit()
\ No newline at end of file
+  db.commit()
+  _invalidate_user_list_caches()
+  userCache.invalidate(user_id, email)
@@ -0,0 +1,63 @@
+'''
+Variantes assincronas das funcoes de userRepository.
+
+Com uma AsyncSession (get_async_db) a implementacao de userRepository e executada via
+AsyncSession.run_sync, ou seja, o mesmo codigo e as mesmas consultas, mas sobre o driver
+assincrono (asyncpg), sem bloquear o event loop enquanto o banco responde.
+Com uma Session sincrona (rota ainda nao migrada em ASYNC_DB_ROUTES) a chamada e
+repassada diretamente, entao as rotas podem usar este modulo independente da configuracao.
+'''
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.domain import userSchema
+from src.repository import userRepository
+
+async def _run(db, fn, *args, **kwargs):
+  if isinstance(db, AsyncSession):
+    return await db.run_sync(fn, *args, **kwargs)
+  return fn(db, *args, **kwargs)
+
+async def get_user(db, user_id: int):
+  return await _run(db, userRepository.get_user, user_id)
+
+async def get_user_by_email(db, email: str):
+  return await _run(db, userRepository.get_user_by_email, email)
+
+async def get_user_credentials(db, email: str):
+  return await _run(db, userRepository.get_user_credentials, email)
+
+async def get_users(db, users_filter: userSchema.UserListFilter):
+  return await _run(db, userRepository.get_users, users_filter)
+
+async def create_user(db, name, connection, email, password, activation_code):
+  return await _run(db, userRepository.create_user, name, connection, email, password, activation_code)
+
+async def create_user_social(db, name, email):
+  return await _run(db, userRepository.create_user_social, name, email)
+
+async def update_user(db, db_user: userSchema.User, user: userSchema.UserUpdate):
+  return await _run(db, userRepository.update_user, db_user, user)
+
+async def update_user_role(db, db_user: userSchema.User, role: str):
+  return await _run(db, userRepository.update_user_role, db_user, role)
+
+async def get_token_version(db, user_id: int):
+  return await _run(db, userRepository.get_token_version, user_id)
+
+async def rehash_password(db, db_user: userSchema.User, new_password: str):
+  return await _run(db, userRepository.rehash_password, db_user, new_password)
+
+async def activate_account_with_code(db, email: str, code: int) -> bool:
+  return await _run(db, userRepository.activate_account_with_code, email, code)
+
+async def get_password_reset_code(db, email: str):
+  return await _run(db, userRepository.get_password_reset_code, email)
+
+async def update_password_with_code(db, email: str, code: int, new_password: str):
+  return await _run(db, userRepository.update_password_with_code, email, code, new_password)
+
+async def set_user_reset_pass_code(db, db_user: userSchema.User, code: int):
+  return await _run(db, userRepository.set_user_reset_pass_code, db_user, code)
+
+async def delete_user(db, db_user: userSchema.User):
+  return await _run(db, userRepository.delete_user, db_user)
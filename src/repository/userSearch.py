@@ -0,0 +1,58 @@
+'''
+Busca textual de usuarios por nome ou email (filtro name_or_email da listagem).
+
+No Postgres a busca por substring (ILIKE '%termo%') e atendida pelos indices GIN
+pg_trgm criados em src/migrations.py, e os resultados sao ranqueados por similaridade.
+Termos menores que SEARCH_MIN_TERM_LENGTH nao formam trigramas suficientes para usar
+o indice, entao sao buscados apenas como prefixo.
+Em outros bancos (ex: SQLite nos testes) o mesmo filtro e aplicado sem ranqueamento.
+'''
+import os
+from sqlalchemy import Double, cast, func, or_, text
+from sqlalchemy.orm import Session
+
+from src.model import userModel
+
+SEARCH_MIN_TERM_LENGTH = int(os.getenv("SEARCH_MIN_TERM_LENGTH", default=3))
+
+LIKE_ESCAPE = '!'
+
+_has_pg_trgm = None
+
+# Verifica (uma unica vez) se a extensao pg_trgm esta instalada no banco
+def has_trigram_support(db: Session) -> bool:
+  global _has_pg_trgm
+  if db.get_bind().dialect.name != 'postgresql':
+    return False
+
+  if _has_pg_trgm is None:
+    _has_pg_trgm = bool(db.execute(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")).scalar())
+  return _has_pg_trgm
+
+# Escapa os curingas do LIKE (% e _) informados pelo usuario
+def escape_like(term: str) -> str:
+  return term.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace('%', LIKE_ESCAPE + '%').replace('_', LIKE_ESCAPE + '_')
+
+'''
+Aplica o filtro name_or_email na query. Retorna (query, rank), onde rank e a expressao
+de similaridade para ordenacao (ou None quando nao ha ranqueamento).
+'''
+def filter_name_or_email(db: Session, query, term: str):
+  term = term.strip()
+
+  if len(term) < SEARCH_MIN_TERM_LENGTH:
+    pattern = f'{escape_like(term)}%'
+  else:
+    pattern = f'%{escape_like(term)}%'
+
+  query = query.filter(or_(
+    userModel.User.name.ilike(pattern, escape=LIKE_ESCAPE),
+    userModel.User.email.ilike(pattern, escape=LIKE_ESCAPE),
+  ))
+
+  if len(term) < SEARCH_MIN_TERM_LENGTH or not has_trigram_support(db):
+    return query, None
+
+  # similarity() e real; em double precision o valor volta no cursor (JSON) sem perder precisao
+  rank = cast(func.greatest(func.similarity(userModel.User.name, term), func.similarity(userModel.User.email, term)), Double)
+  return query, rank
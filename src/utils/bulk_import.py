@@ -0,0 +1,189 @@
+'''
+Importacao em lote de usuarios (POST /users/import) a partir de um upload CSV ou NDJSON.
+
+O corpo e lido em streaming (linha a linha, sem carregar o arquivo inteiro) e processado em lotes
+de BULK_IMPORT_BATCH_SIZE linhas. Cada linha passa pelas mesmas regras do /auth/register
+(authSchema.UserCreate, vinculo valido e senha de 6 digitos). Por lote:
+- uma consulta com IN para os emails ja cadastrados
+- hash das senhas em paralelo no pool proprio da importacao (BULK_IMPORT_HASH_WORKERS), separado
+  do pool das rotas de login para um lote grande nao causar 503 nelas
+- um INSERT em lote dos usuarios e um dos emails de ativacao no outbox, na mesma transacao.
+  Se um email for cadastrado por outra requisicao no meio do lote, o lote e refeito linha a linha
+Linhas que falham (inclusive por pool de hash saturado) entram no relatorio e a importacao continua.
+
+CSV: primeira linha com o cabecalho (name,connection,email,password). NDJSON: um objeto JSON por linha.
+Retorna um relatorio com o resultado de cada linha (numero da linha no arquivo).
+'''
+import asyncio, codecs, csv, json, os, re
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.constants import errorMessages
+from src.domain import authSchema
+from src.repository import emailOutboxRepository, userRepository
+from src.utils import email_outbox, enumeration, security, worker_pool
+
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE") or 500)
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS") or 20000)
+BULK_IMPORT_HASH_WORKERS = int(os.getenv("BULK_IMPORT_HASH_WORKERS") or 2)
+
+CSV = "csv"
+NDJSON = "ndjson"
+CONTENT_TYPES = {
+  "text/csv": CSV,
+  "application/csv": CSV,
+  "application/x-ndjson": NDJSON,
+  "application/ndjson": NDJSON,
+  "application/jsonl": NDJSON,
+}
+FIELDS = ["name", "connection", "email", "password"]
+
+hash_pool = worker_pool.BoundedExecutor(BULK_IMPORT_HASH_WORKERS, BULK_IMPORT_BATCH_SIZE, name="bulk-import-hash")
+
+def detect_format(content_type: str | None) -> str | None:
+  return CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+
+async def iter_lines(chunks):
+  decoder = codecs.getincrementaldecoder("utf-8-sig")()
+  buffer = ""
+  async for chunk in chunks:
+    buffer += decoder.decode(chunk)
+    *lines, buffer = buffer.split("\n")
+    for line in lines:
+      yield line.rstrip("\r")
+  buffer += decoder.decode(b"", final=True)
+  if buffer:
+    yield buffer.rstrip("\r")
+
+# Gera (numero da linha, registro, erro) para cada linha nao vazia. Campos com quebra de linha nao sao suportados no CSV
+async def iter_records(chunks, import_format: str):
+  header = None
+  line_number = 0
+  async for line in iter_lines(chunks):
+    line_number += 1
+    if not line.strip():
+      continue
+
+    if import_format == NDJSON:
+      try:
+        record = json.loads(line)
+      except ValueError:
+        record = None
+      if isinstance(record, dict):
+        yield line_number, record, None
+      else:
+        yield line_number, None, errorMessages.INVALID_IMPORT_ROW
+      continue
+
+    values = next(csv.reader([line]))
+    if header is None:
+      header = [value.strip().lower() for value in values]
+    elif len(values) != len(header):
+      yield line_number, None, errorMessages.INVALID_IMPORT_ROW
+    else:
+      yield line_number, dict(zip(header, values)), None
+
+# Mesmas regras do /auth/register. Retorna (UserCreate, None) ou (None, erro)
+def validate_record(record: dict):
+  try:
+    user = authSchema.UserCreate(**{ field: record.get(field) for field in FIELDS })
+  except ValidationError as error:
+    return None, "; ".join(f"{'.'.join(map(str, detail['loc']))}: {detail['msg']}" for detail in error.errors())
+
+  user.email = user.email.strip()
+  if not enumeration.UserConnection.has_value(user.connection):
+    return None, errorMessages.INVALID_CONNECTION
+  if not security.validate_password(user.password.strip()):
+    return None, errorMessages.INVALID_PASSWORD
+  return user, None
+
+def _row(line_number: int, email: str | None, error: str | None = None) -> dict:
+  return { "row": line_number, "email": email, "status": "error" if error else "created", "error": error }
+
+def _insert_batch(db: Session, users: list):
+  emailOutboxRepository.add_messages(db, enumeration.EmailKind.VERIFICATION_CODE, [
+    (user["email"], { "code": user["activation_code"], "is_unb": bool(re.search(r"unb", user["email"])) }) for user in users
+  ])
+  userRepository.create_users_bulk(db, users)
+
+# Insere um usuario por vez (com o email do outbox), isolando os que violam o email unico. Retorna os emails recusados
+def _insert_rows(db: Session, users: list) -> set:
+  rejected = set()
+  for user in users:
+    try:
+      _insert_batch(db, [user])
+    except IntegrityError:
+      db.rollback()
+      rejected.add(user["email"])
+  return rejected
+
+# Hash das senhas no pool da importacao. Com outra importacao ocupando o pool as tarefas excedentes sao
+# recusadas (PoolSaturatedError): o hash dessas linhas vem None, elas falham e o lote segue
+async def _hash_passwords(pending: list) -> list:
+  results = await asyncio.gather(*[hash_pool.run(security.get_password_hash, user.password) for _, user in pending], return_exceptions=True)
+  for result in results:
+    if isinstance(result, BaseException) and not isinstance(result, worker_pool.PoolSaturatedError):
+      raise result
+  return [None if isinstance(result, worker_pool.PoolSaturatedError) else result for result in results]
+
+async def _import_batch(db: Session, batch: list) -> list:
+  # A sessao e sincrona: as operacoes no banco rodam no threadpool, uma de cada vez
+  existing = await asyncio.to_thread(userRepository.get_existing_emails, db, [user.email for _, user in batch])
+  report = [_row(line_number, user.email, errorMessages.EMAIL_ALREADY_REGISTERED) for line_number, user in batch if user.email in existing]
+  pending = [(line_number, user) for line_number, user in batch if user.email not in existing]
+
+  hashed = list(zip(pending, await _hash_passwords(pending)))
+  report += [_row(line_number, user.email, errorMessages.SERVICE_BUSY) for (line_number, user), hashed_password in hashed if hashed_password is None]
+  hashed = [(row, hashed_password) for row, hashed_password in hashed if hashed_password is not None]
+  pending = [row for row, _ in hashed]
+  users = [
+    { "name": user.name, "connection": user.connection, "email": user.email, "password": hashed_password, "activation_code": security.generate_six_digit_number_code() }
+    for (_, user), hashed_password in hashed
+  ]
+
+  try:
+    await asyncio.to_thread(_insert_batch, db, users)
+  except IntegrityError:
+    # Cadastro concorrente de algum email do lote: refaz o lote linha a linha e recusa apenas os emails que passaram a existir
+    db.rollback()
+    rejected = await asyncio.to_thread(_insert_rows, db, users)
+    report += [_row(line_number, user.email, errorMessages.EMAIL_ALREADY_REGISTERED) for line_number, user in pending if user.email in rejected]
+    pending = [(line_number, user) for line_number, user in pending if user.email not in rejected]
+
+  email_outbox.notify()
+  return report + [_row(line_number, user.email) for line_number, user in pending]
+
+async def import_users(db: Session, chunks, import_format: str) -> dict:
+  report = []
+  batch = []
+  seen = set()
+  rows = 0
+
+  async for line_number, record, error in iter_records(chunks, import_format):
+    rows += 1
+    if rows > BULK_IMPORT_MAX_ROWS:
+      report.append(_row(line_number, None, errorMessages.IMPORT_ROW_LIMIT))
+      break
+
+    user = None
+    if error is None:
+      user, error = validate_record(record)
+    if error is None and user.email in seen:
+      error = errorMessages.DUPLICATED_IMPORT_EMAIL
+    if error is not None:
+      report.append(_row(line_number, record.get("email") if isinstance(record, dict) else None, error))
+      continue
+
+    seen.add(user.email)
+    batch.append((line_number, user))
+    if len(batch) >= BULK_IMPORT_BATCH_SIZE:
+      report += await _import_batch(db, batch)
+      batch = []
+
+  if batch:
+    report += await _import_batch(db, batch)
+
+  report.sort(key=lambda row: row["row"])
+  created = sum(1 for row in report if row["status"] == "created")
+  return { "created": created, "failed": len(report) - created, "rows": report }
@@ -0,0 +1,96 @@
+import json, threading, time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+'''
+Cache LRU em memoria com expiracao (TTL) por entrada.
+Thread-safe, pois as rotas sincronas do FastAPI rodam no threadpool.
+Um ttl <= 0 desabilita o cache (set nao armazena nada).
+'''
+class TTLCache:
+  def __init__(self, maxsize: int = 1024, ttl: float = 60):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.hits = 0
+    self.misses = 0
+    self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key: Hashable, default: Any = None) -> Any:
+    with self._lock:
+      entry = self._data.get(key)
+      if entry is not None:
+        expires_at, value = entry
+        if expires_at > time.monotonic():
+          self._data.move_to_end(key)
+          self.hits += 1
+          return value
+        del self._data[key]
+      self.misses += 1
+      return default
+
+  def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+    ttl = self.ttl if ttl is None else ttl
+    if ttl <= 0 or self.maxsize <= 0:
+      return
+
+    with self._lock:
+      self._data[key] = (time.monotonic() + ttl, value)
+      self._data.move_to_end(key)
+      while len(self._data) > self.maxsize:
+        self._data.popitem(last=False)
+
+  def delete(self, key: Hashable):
+    with self._lock:
+      self._data.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._data.clear()
+
+  def __len__(self) -> int:
+    return len(self._data)
+
+'''
+Cache compartilhado no Redis com a mesma interface do TTLCache, para varias instancias/workers
+enxergarem as mesmas entradas e invalidacoes. Valores sao serializados em JSON.
+Depende do pacote opcional redis. Erros do Redis contam como miss (get) ou sao ignorados (set/delete).
+'''
+class RedisCache:
+  def __init__(self, url: str, ttl: float = 60, prefix: str = "cache:"):
+    import redis
+    self.ttl = ttl
+    self.prefix = prefix
+    self.hits = 0
+    self.misses = 0
+    self._client = redis.Redis.from_url(url)
+
+  def get(self, key: Hashable, default: Any = None) -> Any:
+    try:
+      value = self._client.get(f"{self.prefix}{key}")
+    except Exception:
+      value = None
+    if value is None:
+      self.misses += 1
+      return default
+    self.hits += 1
+    return json.loads(value)
+
+  def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+    ttl = self.ttl if ttl is None else ttl
+    if ttl <= 0:
+      return
+    try:
+      self._client.set(f"{self.prefix}{key}", json.dumps(value), px=int(ttl * 1000))
+    except Exception:
+      pass
+
+  def delete(self, key: Hashable):
+    try:
+      self._client.delete(f"{self.prefix}{key}")
+    except Exception:
+      pass
+
+  def clear(self):
+    for key in self._client.scan_iter(f"{self.prefix}*"):
+      self._client.delete(key)
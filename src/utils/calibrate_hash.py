@@ -0,0 +1,53 @@
+'''
+Calibra o custo do hash de senhas para esta maquina.
+
+Mede o tempo de um hash com custos crescentes e sugere o maior custo cujo tempo fica dentro
+do alvo, para ser usado em PASSWORD_HASH_ROUNDS. Logins com hashes de custo diferente sao
+refeitos automaticamente (ver security.password_needs_update).
+
+Uso: python -m src.utils.calibrate_hash [--target-ms 250] [--scheme bcrypt|argon2]
+'''
+import argparse, time
+
+from src.utils import security
+
+# Custo minimo e maximo testados por esquema (bcrypt: log2 das iteracoes, argon2: time_cost)
+ROUNDS_RANGE = { "bcrypt": (10, 16), "argon2": (1, 10) }
+
+def measure_hash_ms(scheme: str, rounds: int, memory_cost: int, parallelism: int, samples: int = 3) -> float:
+  context = security.build_crypt_context(scheme, rounds, memory_cost, parallelism)
+  timings = []
+  for _ in range(samples):
+    start = time.perf_counter()
+    context.hash("calibracao")
+    timings.append((time.perf_counter() - start) * 1000)
+  return min(timings)
+
+def calibrate(scheme: str, target_ms: float, memory_cost: int, parallelism: int):
+  min_rounds, max_rounds = ROUNDS_RANGE[scheme]
+  chosen = min_rounds
+  timings = []
+
+  for rounds in range(min_rounds, max_rounds + 1):
+    elapsed = measure_hash_ms(scheme, rounds, memory_cost, parallelism)
+    timings.append((rounds, elapsed))
+    if elapsed > target_ms:
+      break
+    chosen = rounds
+
+  return chosen, timings
+
+if __name__ == '__main__': # pragma: no cover
+  parser = argparse.ArgumentParser(description="Calibra PASSWORD_HASH_ROUNDS para um tempo alvo por hash")
+  parser.add_argument("--target-ms", type=float, default=250)
+  parser.add_argument("--scheme", choices=list(ROUNDS_RANGE), default=security.PASSWORD_HASH_SCHEME)
+  parser.add_argument("--memory-cost", type=int, default=security.ARGON2_MEMORY_COST)
+  parser.add_argument("--parallelism", type=int, default=security.ARGON2_PARALLELISM)
+  args = parser.parse_args()
+
+  rounds, timings = calibrate(args.scheme, args.target_ms, args.memory_cost, args.parallelism)
+  for tested_rounds, elapsed in timings:
+    print(f"{args.scheme} custo {tested_rounds}: {elapsed:.1f} ms")
+
+  print(f"PASSWORD_HASH_SCHEME={args.scheme}")
+  print(f"PASSWORD_HASH_ROUNDS={rounds}")
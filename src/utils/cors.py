@@ -0,0 +1,120 @@
+'''
+Middleware CORS em ASGI puro (sem BaseHTTPMiddleware, que cria uma task e um stream extra por requisicao).
+
+Os headers sao montados uma unica vez em bytes no __init__ e apenas anexados a resposta.
+Respostas de preflight (OPTIONS) sao memorizadas por (origin, metodo, headers pedidos).
+Com allow_credentials a origem permitida e devolvida explicitamente (com Vary: Origin),
+ja que navegadores nao aceitam "*" em requisicoes com credenciais.
+'''
+from typing import Sequence
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.utils import cache
+
+ALL_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+SAFELISTED_HEADERS = {"accept", "accept-language", "content-language", "content-type"}
+
+class CORSMiddleware:
+  def __init__(self, app: ASGIApp, allow_origins: Sequence[str] = ("*",), allow_methods: Sequence[str] = ("*",),
+               allow_headers: Sequence[str] = ("*",), allow_credentials: bool = True,
+               expose_headers: Sequence[str] = ("*",), max_age: int = 600):
+    self.app = app
+    self.allow_all_origins = "*" in allow_origins
+    self.allow_origins = { origin.encode("latin-1") for origin in allow_origins }
+    self.allow_methods = ALL_METHODS if "*" in allow_methods else tuple(method.upper() for method in allow_methods)
+    self.allow_all_headers = "*" in allow_headers
+    self.allow_headers = SAFELISTED_HEADERS | { header.strip().lower() for header in allow_headers }
+    self.explicit_origin = allow_credentials or not self.allow_all_origins
+
+    self.simple_headers = []
+    if allow_credentials:
+      self.simple_headers.append((b"access-control-allow-credentials", b"true"))
+    if expose_headers:
+      self.simple_headers.append((b"access-control-expose-headers", ", ".join(expose_headers).encode("latin-1")))
+    if not self.explicit_origin:
+      self.simple_headers.append((b"access-control-allow-origin", b"*"))
+
+    self.preflight_headers = [
+      (b"access-control-allow-methods", ", ".join(self.allow_methods).encode("latin-1")),
+      (b"access-control-max-age", str(max_age).encode("latin-1")),
+    ]
+    if allow_credentials:
+      self.preflight_headers.append((b"access-control-allow-credentials", b"true"))
+    if not self.allow_all_headers:
+      self.preflight_headers.append((b"access-control-allow-headers", ", ".join(sorted(self.allow_headers)).encode("latin-1")))
+
+    self.preflight_cache = cache.TTLCache(maxsize=1024, ttl=max_age)
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    origin = request_method = request_headers = None
+    for name, value in scope["headers"]:
+      if name == b"origin":
+        origin = value
+      elif name == b"access-control-request-method":
+        request_method = value
+      elif name == b"access-control-request-headers":
+        request_headers = value
+
+    if origin is None:
+      await self.app(scope, receive, send)
+      return
+
+    if scope["method"] == "OPTIONS" and request_method is not None:
+      await self.preflight_response(origin, request_method, request_headers, send)
+      return
+
+    if not self.is_allowed_origin(origin):
+      await self.app(scope, receive, send)
+      return
+
+    response_headers = self.simple_headers
+    if self.explicit_origin:
+      response_headers = response_headers + [(b"access-control-allow-origin", origin), (b"vary", b"Origin")]
+
+    async def send_with_cors(message: Message):
+      if message["type"] == "http.response.start":
+        message["headers"] = [*message.get("headers", []), *response_headers]
+      await send(message)
+
+    await self.app(scope, receive, send_with_cors)
+
+  def is_allowed_origin(self, origin: bytes) -> bool:
+    return self.allow_all_origins or origin in self.allow_origins
+
+  async def preflight_response(self, origin: bytes, request_method: bytes, request_headers: bytes | None, send: Send):
+    key = (origin, request_method, request_headers)
+    response = self.preflight_cache.get(key)
+    if response is None:
+      response = self._build_preflight_response(origin, request_method, request_headers)
+      self.preflight_cache.set(key, response)
+
+    status, headers, body = response
+    await send({ "type": "http.response.start", "status": status, "headers": headers })
+    await send({ "type": "http.response.body", "body": body })
+
+  def _build_preflight_response(self, origin: bytes, request_method: bytes, request_headers: bytes | None):
+    headers = list(self.preflight_headers)
+    failures = []
+
+    if self.is_allowed_origin(origin):
+      headers += [(b"access-control-allow-origin", origin), (b"vary", b"Origin")] if self.explicit_origin else [(b"access-control-allow-origin", b"*")]
+    else:
+      failures.append("origin")
+
+    if request_method.decode("latin-1").upper() not in self.allow_methods:
+      failures.append("method")
+
+    # Com todos os headers liberados, os headers pedidos sao devolvidos como permitidos
+    if request_headers is not None:
+      if self.allow_all_headers:
+        headers.append((b"access-control-allow-headers", request_headers))
+      elif any(header.strip() not in self.allow_headers for header in request_headers.decode("latin-1").lower().split(",")):
+        failures.append("headers")
+
+    body = ("Disallowed CORS " + ", ".join(failures) if failures else "OK").encode()
+    headers += [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(body)).encode())]
+    return (400 if failures else 200), headers, body
@@ -0,0 +1,72 @@
+import threading, time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+'''
+Pools de conexao que medem o tempo de espera no checkout (inclui a abertura de conexoes novas)
+e quantos checkouts estouraram o DB_POOL_TIMEOUT (erro "QueuePool limit ... reached").
+'''
+class CheckoutWaitStats:
+  def __init__(self):
+    self.count = 0
+    self.total_seconds = 0.0
+    self.max_seconds = 0.0
+    self.timeouts = 0
+    self._lock = threading.Lock()
+
+  def observe(self, seconds: float, timed_out: bool = False):
+    with self._lock:
+      self.count += 1
+      self.total_seconds += seconds
+      self.max_seconds = max(self.max_seconds, seconds)
+      if timed_out:
+        self.timeouts += 1
+
+  def snapshot(self) -> dict:
+    with self._lock:
+      return {
+        "count": self.count,
+        "total_seconds": round(self.total_seconds, 6),
+        "avg_seconds": round(self.total_seconds / self.count, 6) if self.count else 0.0,
+        "max_seconds": round(self.max_seconds, 6),
+        "timeouts": self.timeouts,
+      }
+
+class _MeasuredCheckoutMixin:
+  def __init__(self, *args, **kwargs):
+    self.checkout_wait = CheckoutWaitStats()
+    super().__init__(*args, **kwargs)
+
+  def _do_get(self):
+    start = time.perf_counter()
+    try:
+      connection = super()._do_get()
+    except PoolTimeoutError:
+      self.checkout_wait.observe(time.perf_counter() - start, timed_out=True)
+      raise
+    self.checkout_wait.observe(time.perf_counter() - start)
+    return connection
+
+class MeasuredQueuePool(_MeasuredCheckoutMixin, QueuePool):
+  pass
+
+class MeasuredAsyncAdaptedQueuePool(_MeasuredCheckoutMixin, AsyncAdaptedQueuePool):
+  pass
+
+# Estado atual do pool: conexoes em uso, ociosas, em overflow e o tempo de espera no checkout
+def pool_status(pool: Pool) -> dict:
+  status = { "pool": type(pool).__name__ }
+
+  if isinstance(pool, QueuePool):
+    status.update({
+      "size": pool.size(),
+      "checked_out": pool.checkedout(),
+      "checked_in": pool.checkedin(),
+      # QueuePool.overflow() fica negativo enquanto o pool base ainda nao esta cheio
+      "overflow": max(pool.overflow(), 0),
+    })
+
+  if isinstance(pool, _MeasuredCheckoutMixin):
+    status["checkout_wait"] = pool.checkout_wait.snapshot()
+
+  return status
@@ -1,6 +1,14 @@
-import os
+import os, importlib.util
 from src.constants import errorMessages
 
+# Variaveis opcionais que, quando informadas, precisam ter o tipo esperado
+optional_int_env_var = ["DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_RECYCLE", "PASSWORD_HASH_WORKERS", "PASSWORD_HASH_QUEUE_LIMIT", "PASSWORD_HASH_ROUNDS", "ARGON2_MEMORY_COST", "ARGON2_PARALLELISM", "TOKEN_CACHE_SIZE", "JWKS_MAX_AGE", "CORS_MAX_AGE", "EMAIL_OUTBOX_WORKERS", "EMAIL_OUTBOX_BATCH_SIZE", "EMAIL_OUTBOX_MAX_ATTEMPTS", "EMAIL_OUTBOX_RETENTION_SECONDS", "SMTP_POOL_SIZE", "SMTP_MAX_MESSAGES_PER_CONNECTION", "RATE_LIMIT_MAX_KEYS", "USER_CACHE_SIZE", "BULK_IMPORT_BATCH_SIZE", "BULK_IMPORT_MAX_ROWS", "BULK_IMPORT_HASH_WORKERS", "USER_EXPORT_BATCH_SIZE", "BULK_OPERATION_MAX_USERS", "SQL_QUERY_BUDGET", "SQL_N_PLUS_ONE_THRESHOLD"]
+optional_float_env_var = ["DB_POOL_TIMEOUT", "EMAIL_OUTBOX_POLL_INTERVAL", "EMAIL_OUTBOX_BACKOFF_BASE", "EMAIL_OUTBOX_BACKOFF_MAX", "EMAIL_OUTBOX_LEASE_SECONDS", "EMAIL_OUTBOX_PURGE_INTERVAL", "SMTP_IDLE_TIMEOUT", "USER_CACHE_TTL", "SQL_SLOW_QUERY_MS"]
+rate_limit_env_var = ["RATE_LIMIT_LOGIN_IP", "RATE_LIMIT_LOGIN_EMAIL", "RATE_LIMIT_ACTIVATE_ACCOUNT_IP", "RATE_LIMIT_ACTIVATE_ACCOUNT_EMAIL", "RATE_LIMIT_RESET_PASSWORD_VERIFY_IP", "RATE_LIMIT_RESET_PASSWORD_VERIFY_EMAIL", "RATE_LIMIT_RESET_PASSWORD_CHANGE_IP", "RATE_LIMIT_RESET_PASSWORD_CHANGE_EMAIL"]
+# Tamanhos de pool/lote, que com 0 travam ou desligam o recurso (ex: ThreadPoolExecutor(max_workers=0))
+positive_int_env_var = ["DB_POOL_SIZE", "PASSWORD_HASH_WORKERS", "BULK_IMPORT_HASH_WORKERS", "BULK_IMPORT_BATCH_SIZE", "EMAIL_OUTBOX_BATCH_SIZE", "USER_EXPORT_BATCH_SIZE"]
+optional_bool_env_var = ["DB_POOL_PRE_PING", "RATE_LIMIT_ENABLED", "RATE_LIMIT_TRUST_PROXY", "METRICS_ENABLED", "SQL_DEBUG_HEADERS"]
+
 def validate_dotenv():
   required_env_var = ["SECRET", "ALGORITHM", "MAIL_USERNAME", "MAIL_PASSWORD", "MAIL_FROM", "MAIL_PORT", "MAIL_SERVER"]
   missing_env_var = [var for var in required_env_var if var not in os.environ]
@@ -8,3 +16,48 @@ def validate_dotenv():
   if missing_env_var:
     error_message = "{} (missing: {})".format(errorMessages.MISSING_ENV_VALUES, ', '.join(missing_env_var))
     raise EnvironmentError(error_message)
+
+  invalid_env_var = [var for var in optional_int_env_var if not _is_valid(var, int)]
+  invalid_env_var += [var for var in optional_float_env_var if not _is_valid(var, float)]
+  invalid_env_var += [var for var in optional_bool_env_var if os.getenv(var) and os.getenv(var).lower() not in ["true", "false", "1", "0"]]
+
+  invalid_env_var += [var for var in positive_int_env_var if os.getenv(var) and var not in invalid_env_var and int(os.environ[var]) < 1]
+
+  # argon2 depende do pacote opcional argon2-cffi
+  hash_scheme = os.getenv("PASSWORD_HASH_SCHEME")
+  if hash_scheme and (hash_scheme not in ["bcrypt", "argon2"] or (hash_scheme == "argon2" and importlib.util.find_spec("argon2") is None)):
+    invalid_env_var.append("PASSWORD_HASH_SCHEME")
+
+  # Assinatura assimetrica (RS256/ES256) precisa do diretorio com as chaves (ver utils/jwt_keys)
+  if os.getenv("ALGORITHM", "").startswith(("RS", "ES")) and not os.path.isdir(os.getenv("JWT_KEYS_DIR") or ""):
+    invalid_env_var.append("JWT_KEYS_DIR")
+
+  # Limites no formato "<tentativas>/<segundos>" ou "0" (ver utils/rate_limit)
+  invalid_env_var += [var for var in rate_limit_env_var if os.getenv(var) and not _is_valid_rate(os.environ[var])]
+
+  # O backend redis depende do pacote opcional redis
+  for var in ["RATE_LIMIT_BACKEND", "USER_CACHE_BACKEND"]:
+    backend = os.getenv(var)
+    if backend and (backend not in ["memory", "redis"] or (backend == "redis" and importlib.util.find_spec("redis") is None)):
+      invalid_env_var.append(var)
+
+  if invalid_env_var:
+    error_message = "{} (invalid: {})".format(errorMessages.INVALID_ENV_VALUES, ', '.join(invalid_env_var))
+    raise EnvironmentError(error_message)
+
+# Variavel vazia ou ausente e valida (usa o padrao)
+def _is_valid(var: str, cast) -> bool:
+  value = os.getenv(var)
+  if not value:
+    return True
+  try:
+    cast(value)
+    return True
+  except ValueError:
+    return False
+
+def _is_valid_rate(value: str) -> bool:
+  parts = value.strip().split("/")
+  if parts == ["0"]:
+    return True
+  return len(parts) == 2 and all(part.strip().isdigit() and int(part) > 0 for part in parts)
@@ -0,0 +1,139 @@
+'''
+Workers de entrega do outbox de emails (ver model/emailOutboxModel).
+
+As rotas apenas gravam a mensagem no outbox junto com a alteracao do usuario e chamam notify();
+os workers (tasks asyncio iniciadas no startup da aplicacao) reservam as mensagens vencidas,
+enviam em lote pelo pool SMTP do send_mail e marcam como enviadas. Falhas sao retentadas com backoff exponencial
+(EMAIL_OUTBOX_BACKOFF_BASE * 2^(tentativa-1), limitado a EMAIL_OUTBOX_BACKOFF_MAX) e, apos
+EMAIL_OUTBOX_MAX_ATTEMPTS tentativas, a mensagem vai para dead-letter (status DEAD).
+Mensagens entregues perdem o payload (codigos) no mark_sent. As SENT e DEAD mais antigas que
+EMAIL_OUTBOX_RETENTION_SECONDS sao removidas pelos workers a cada EMAIL_OUTBOX_PURGE_INTERVAL segundos.
+'''
+import asyncio, logging, os, time
+
+from src.database import SessionLocal
+from src.repository import emailOutboxRepository
+from src.utils import enumeration, send_mail
+
+logger = logging.getLogger(__name__)
+
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS") or 2)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE") or 20)
+EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv("EMAIL_OUTBOX_POLL_INTERVAL") or 5)
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS") or 8)
+EMAIL_OUTBOX_BACKOFF_BASE = float(os.getenv("EMAIL_OUTBOX_BACKOFF_BASE") or 10)
+EMAIL_OUTBOX_BACKOFF_MAX = float(os.getenv("EMAIL_OUTBOX_BACKOFF_MAX") or 3600)
+# Tempo que uma mensagem reservada fica invisivel para os outros workers
+EMAIL_OUTBOX_LEASE_SECONDS = float(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS") or 120)
+# Retencao das mensagens SENT/DEAD (padrao 7 dias); "0" desliga a limpeza
+EMAIL_OUTBOX_RETENTION_SECONDS = int(os.getenv("EMAIL_OUTBOX_RETENTION_SECONDS") or 604800)
+EMAIL_OUTBOX_PURGE_INTERVAL = float(os.getenv("EMAIL_OUTBOX_PURGE_INTERVAL") or 3600)
+
+_wakeup: asyncio.Event | None = None
+_workers: list[asyncio.Task] = []
+_last_purge = 0.0
+
+def retry_delay(attempts: int) -> float:
+  return min(EMAIL_OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), EMAIL_OUTBOX_BACKOFF_MAX)
+
+def build_message(message: dict):
+  payload = message["payload"]
+  if message["kind"] == enumeration.EmailKind.VERIFICATION_CODE.value:
+    return send_mail.verification_code_message(message["email"], payload["code"], payload.get("is_unb", False), payload.get("locale"))
+  if message["kind"] == enumeration.EmailKind.RESET_PASSWORD_CODE.value:
+    return send_mail.reset_password_code_message(message["email"], payload["code"], payload.get("locale"))
+  raise ValueError(f"Tipo de email desconhecido: {message['kind']}")
+
+# Monta e envia o lote inteiro pelas conexoes do pool SMTP. Retorna o erro de cada mensagem (ou None)
+async def deliver(messages: list) -> list:
+  errors = [None] * len(messages)
+  built = []
+  for index, message in enumerate(messages):
+    try:
+      built.append((index, build_message(message)))
+    except Exception as error:
+      errors[index] = error
+
+  results = await send_mail.send_batch([schema for _, schema in built])
+  for (index, _), error in zip(built, results):
+    errors[index] = error
+  return errors
+
+def _run_in_session(fn, *args):
+  db = SessionLocal()
+  try:
+    return fn(db, *args)
+  finally:
+    db.close()
+
+# Entrega um lote de mensagens vencidas. Retorna quantas mensagens foram reservadas
+async def process_batch(batch_size: int = EMAIL_OUTBOX_BATCH_SIZE) -> int:
+  # As operacoes no banco usam a sessao sincrona, entao rodam no threadpool
+  messages = await asyncio.to_thread(_run_in_session, emailOutboxRepository.claim_due_messages, batch_size, EMAIL_OUTBOX_LEASE_SECONDS)
+
+  errors = await deliver(messages) if messages else []
+
+  for message, error in zip(messages, errors):
+    if error is not None:
+      dead = message["attempts"] >= EMAIL_OUTBOX_MAX_ATTEMPTS
+      retry_in = None if dead else retry_delay(message["attempts"])
+      logger.warning("Falha ao enviar email %s (tentativa %s%s): %s", message["id"], message["attempts"], ", dead-letter" if dead else "", error)
+      await asyncio.to_thread(_run_in_session, emailOutboxRepository.mark_failed, message["id"], repr(error), retry_in)
+    else:
+      await asyncio.to_thread(_run_in_session, emailOutboxRepository.mark_sent, message["id"])
+
+  return len(messages)
+
+# Remove as mensagens SENT/DEAD fora da retencao. Com varios workers, so um faz a limpeza por intervalo
+async def purge_expired(force: bool = False) -> int:
+  global _last_purge
+  if not EMAIL_OUTBOX_RETENTION_SECONDS or (not force and time.monotonic() - _last_purge < EMAIL_OUTBOX_PURGE_INTERVAL):
+    return 0
+  _last_purge = time.monotonic()
+  return await asyncio.to_thread(_run_in_session, emailOutboxRepository.purge_messages, EMAIL_OUTBOX_RETENTION_SECONDS)
+
+async def _worker():
+  while True:
+    try:
+      await purge_expired()
+      claimed = await process_batch()
+    except asyncio.CancelledError:
+      raise
+    except Exception:
+      logger.exception("Erro no worker do outbox de emails")
+      claimed = 0
+
+    # Lote cheio: provavelmente ha mais mensagens, continua sem esperar
+    if claimed >= EMAIL_OUTBOX_BATCH_SIZE:
+      continue
+
+    try:
+      await asyncio.wait_for(_wakeup.wait(), timeout=EMAIL_OUTBOX_POLL_INTERVAL)
+    except asyncio.TimeoutError:
+      pass
+    _wakeup.clear()
+
+# Acorda os workers logo apos o commit de uma mensagem nova, sem esperar o proximo poll
+def notify():
+  if _wakeup is not None:
+    _wakeup.set()
+
+def start():
+  global _wakeup
+  _wakeup = asyncio.Event()
+  for _ in range(EMAIL_OUTBOX_WORKERS):
+    _workers.append(asyncio.create_task(_worker()))
+
+async def stop():
+  for worker in _workers:
+    worker.cancel()
+  await asyncio.gather(*_workers, return_exceptions=True)
+  _workers.clear()
+  await send_mail.smtp_pool.close()
+
+def status() -> dict:
+  return {
+    "workers": len(_workers),
+    "messages": _run_in_session(emailOutboxRepository.count_by_status),
+    "smtp_pool": send_mail.smtp_pool.status(),
+  }
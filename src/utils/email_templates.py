@@ -0,0 +1,85 @@
+'''
+Templates Jinja2 dos emails (src/templates/email).
+
+Cada email tem, por idioma, os arquivos <nome>.<locale>.subject, <nome>.<locale>.html e
+<nome>.<locale>.txt (parte texto puro alternativa). Todos sao carregados e compilados uma unica vez
+na importacao do modulo (startup); o Jinja2 compila o texto estatico dos templates em constantes,
+entao o envio apenas executa o template ja compilado. Valores fixos da aplicacao (ex: DEPLOY_URL)
+sao lidos uma vez e ficam nos globals do ambiente.
+Locales sem variante caem para EMAIL_DEFAULT_LOCALE. As rotas escolhem o locale pelo header
+Accept-Language (negotiate) e o gravam no payload da mensagem do outbox, lido no envio.
+
+Benchmark de renderizacao: python -m benchmarks.email_render
+'''
+import os
+from dataclasses import dataclass
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "..", "templates", "email")
+EMAIL_DEFAULT_LOCALE = os.getenv("EMAIL_DEFAULT_LOCALE") or "pt_BR"
+
+@dataclass(frozen=True)
+class RenderedEmail:
+  subject: str
+  html: str
+  text: str
+
+class EmailTemplates:
+  def __init__(self, directory: str, default_locale: str, globals: dict):
+    self.default_locale = default_locale
+    self.environment = Environment(
+      loader=FileSystemLoader(directory),
+      autoescape=select_autoescape(["html"]),
+      undefined=StrictUndefined,
+      auto_reload=False,
+    )
+    self.environment.globals.update(globals)
+
+    # (nome, locale, parte) -> template compilado
+    self._templates = {}
+    for file_name in self.environment.list_templates():
+      name, locale, part = file_name.split(".")
+      self._templates[(name, locale, part)] = self.environment.get_template(file_name)
+
+    self.locales = sorted({ locale for _, locale, _ in self._templates })
+
+  def _get(self, name: str, locale: str, part: str):
+    template = self._templates.get((name, locale, part)) or self._templates.get((name, self.default_locale, part))
+    if template is None:
+      raise KeyError(f"Template de email inexistente: {name}.{locale}.{part}")
+    return template
+
+  # Locale com templates que melhor atende o Accept-Language (ex: "en-US,en;q=0.9,pt;q=0.8"): primeiro
+  # a tag exata (en_US), depois so o idioma (en -> en, pt -> pt_BR). None se nenhum idioma do header tem variante
+  def negotiate(self, accept_language: str | None) -> str | None:
+    languages = []
+    for position, item in enumerate((accept_language or "").split(",")):
+      tag, _, params = item.strip().partition(";")
+      quality = 1.0
+      if params.strip().startswith("q="):
+        try:
+          quality = float(params.strip()[2:])
+        except ValueError:
+          continue
+      if tag and tag != "*" and quality > 0:
+        languages.append((-quality, position, tag.replace("-", "_").lower()))
+
+    by_tag = { locale.lower(): locale for locale in self.locales }
+    for _, _, tag in sorted(languages):
+      if tag in by_tag:
+        return by_tag[tag]
+      language = tag.split("_")[0]
+      match = by_tag.get(language) or next((locale for locale in self.locales if locale.lower().split("_")[0] == language), None)
+      if match:
+        return match
+    return None
+
+  def render(self, name: str, locale: str | None = None, **context) -> RenderedEmail:
+    locale = locale or self.default_locale
+    return RenderedEmail(
+      subject=self._get(name, locale, "subject").render(**context).strip(),
+      html=self._get(name, locale, "html").render(**context),
+      text=self._get(name, locale, "txt").render(**context),
+    )
+
+templates = EmailTemplates(TEMPLATES_DIR, EMAIL_DEFAULT_LOCALE, { "deploy_url": os.getenv("DEPLOY_URL") or "" })
@@ -16,3 +16,22 @@ class UserRole(Enum):
   ADMIN = "ADMIN"
   USER = "USER"
   COADMIN = "COADMIN"
+
+class CountStrategy(Enum):
+  EXACT = "exact"
+  ESTIMATED = "estimated"
+  CACHED = "cached"
+  NONE = "none"
+
+  @classmethod
+  def has_value(cls, value):
+    return value in cls._value2member_map_
+
+class EmailKind(Enum):
+  VERIFICATION_CODE = "VERIFICATION_CODE"
+  RESET_PASSWORD_CODE = "RESET_PASSWORD_CODE"
+
+class EmailStatus(Enum):
+  PENDING = "PENDING"
+  SENT = "SENT"
+  DEAD = "DEAD"
@@ -0,0 +1,89 @@
+'''
+Chaveiro (key ring) para assinatura assimetrica dos JWTs (RS256 / ES256).
+
+Cada chave e um arquivo <kid>.pem em JWT_KEYS_DIR. Arquivos com chave privada podem assinar;
+arquivos so com chave publica servem apenas para verificar (chaves aposentadas na rotacao).
+A chave ativa (JWT_ACTIVE_KID, ou a ultima chave privada em ordem alfabetica) assina os tokens
+novos com o header "kid"; todas as chaves sao publicadas no JWKS para que outros servicos
+verifiquem os tokens localmente.
+
+Rotacao: gerar uma chave nova, apontar JWT_ACTIVE_KID para ela e manter a anterior no diretorio
+(pode ser trocada pela versao publica) ate os tokens assinados por ela expirarem.
+
+Uso: python -m src.utils.jwt_keys generate <kid> [--algorithm RS256|ES256]
+'''
+import argparse, os
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk
+
+ASYMMETRIC_ALGORITHMS = ["RS256", "RS384", "RS512", "ES256", "ES384", "ES512"]
+
+class KeyRing:
+  def __init__(self, algorithm: str, keys_dir: str, active_kid: str | None = None):
+    self.algorithm = algorithm
+    self._private_keys = {}
+    self._public_keys = {}
+
+    for file_name in sorted(os.listdir(keys_dir)):
+      kid, extension = os.path.splitext(file_name)
+      if extension != ".pem":
+        continue
+
+      with open(os.path.join(keys_dir, file_name), "rb") as key_file:
+        pem = key_file.read()
+
+      if b"PRIVATE KEY" in pem:
+        private_key = serialization.load_pem_private_key(pem, password=None)
+        self._private_keys[kid] = pem.decode()
+        pem = private_key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+      self._public_keys[kid] = pem.decode()
+
+    # Objetos de chave ja construidos, para nao refazer o parse do PEM a cada token
+    self._signing_keys = { kid: jwk.construct(pem, algorithm) for kid, pem in self._private_keys.items() }
+    self._verification_keys = { kid: jwk.construct(pem, algorithm) for kid, pem in self._public_keys.items() }
+
+    self.active_kid = active_kid or (max(self._private_keys) if self._private_keys else None)
+    if self.active_kid not in self._private_keys:
+      raise EnvironmentError(f"Chave privada de assinatura '{self.active_kid}' nao encontrada em {keys_dir}")
+
+  def signing_key(self) -> tuple[str, jwk.Key]:
+    return self.active_kid, self._signing_keys[self.active_kid]
+
+  def verification_key(self, kid: str | None) -> jwk.Key | None:
+    return self._verification_keys.get(kid)
+
+  # JWKS (RFC 7517) com as chaves publicas de todas as chaves do chaveiro
+  def jwks(self) -> dict:
+    keys = []
+    for kid, key in self._verification_keys.items():
+      keys.append({ **key.to_dict(), "kid": kid, "use": "sig", "alg": self.algorithm })
+    return { "keys": keys }
+
+def generate_private_key_pem(algorithm: str) -> bytes:
+  if algorithm.startswith("ES"):
+    curve = { "ES256": ec.SECP256R1(), "ES384": ec.SECP384R1(), "ES512": ec.SECP521R1() }[algorithm]
+    private_key = ec.generate_private_key(curve)
+  else:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+  return private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+
+if __name__ == '__main__': # pragma: no cover
+  parser = argparse.ArgumentParser(description="Gera uma chave de assinatura de JWT em JWT_KEYS_DIR")
+  parser.add_argument("command", choices=["generate"])
+  parser.add_argument("kid")
+  parser.add_argument("--algorithm", choices=ASYMMETRIC_ALGORITHMS, default=os.getenv("ALGORITHM") if os.getenv("ALGORITHM") in ASYMMETRIC_ALGORITHMS else "RS256")
+  parser.add_argument("--keys-dir", default=os.getenv("JWT_KEYS_DIR") or "keys")
+  args = parser.parse_args()
+
+  os.makedirs(args.keys_dir, exist_ok=True)
+  path = os.path.join(args.keys_dir, f"{args.kid}.pem")
+  if os.path.exists(path):
+    raise SystemExit(f"{path} ja existe")
+
+  with open(path, "wb") as key_file:
+    key_file.write(generate_private_key_pem(args.algorithm))
+  os.chmod(path, 0o600)
+  print(f"Chave {args.kid} ({args.algorithm}) criada em {path}")
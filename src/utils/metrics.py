@@ -0,0 +1,214 @@
+'''
+Metricas da aplicacao no formato texto do Prometheus, expostas em /metrics.
+
+Implementacao propria (sem prometheus_client): contadores, gauges e histogramas com labels guardados
+em dicts por tupla de labels, com um lock por metrica (o bcrypt e o banco rodam em threads).
+O histograma guarda a contagem por bucket sem acumular; a soma cumulativa e feita so no render,
+entao observe e um bisect e tres somas.
+
+MetricsMiddleware (ASGI puro, como o cors.CORSMiddleware) mede cada requisicao pela rota do
+FastAPI (o template, ex: /api/users/{user_id}, nao o path, para nao criar uma serie por id).
+Requisicoes que nao casam com nenhuma rota ficam em route="unmatched".
+O estado dos pools (banco, hash, SMTP), caches, outbox e rate limit e lido no momento do render
+pelos coletores registrados com register_collector (ver main.py).
+METRICS_ENABLED=false nao instala o middleware nem registra o tempo das consultas.
+'''
+import os, re, threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+METRICS_ENABLED = (os.getenv("METRICS_ENABLED") or "true").lower() in ["true", "1"]
+
+# O Starlette completa com "; charset=utf-8"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Buckets padrao do Prometheus (segundos) e buckets menores para consultas ao banco
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def _escape(value) -> str:
+  return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+  if value == float("inf"):
+    return "+Inf"
+  return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+  type = ""
+
+  def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+    self.name = name
+    self.documentation = documentation
+    self.labelnames = tuple(labelnames)
+    self._values = {}
+    self._lock = threading.Lock()
+
+  def _labels(self, labelvalues: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labelvalues)]
+    if extra:
+      pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+  def _samples(self):
+    with self._lock:
+      values = dict(self._values)
+    for labelvalues, value in sorted(values.items()):
+      yield self.name, self._labels(labelvalues), value
+
+  def render(self) -> str:
+    lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+    lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self._samples())
+    return "\n".join(lines)
+
+  def clear(self):
+    with self._lock:
+      self._values.clear()
+
+class Counter(_Metric):
+  type = "counter"
+
+  def inc(self, *labelvalues, amount: float = 1):
+    with self._lock:
+      self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+  # Para totais contados fora do registry (ex: hits de um cache), copiados por um coletor no render
+  def set(self, *labelvalues, value: float):
+    with self._lock:
+      self._values[labelvalues] = value
+
+  def value(self, *labelvalues) -> float:
+    return self._values.get(labelvalues, 0)
+
+class Gauge(Counter):
+  type = "gauge"
+
+  def dec(self, *labelvalues, amount: float = 1):
+    self.inc(*labelvalues, amount=-amount)
+
+class Histogram(_Metric):
+  type = "histogram"
+
+  def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+    super().__init__(name, documentation, labelnames)
+    self.buckets = tuple(sorted(buckets))
+
+  # Cada serie e [contagem por bucket (o ultimo e o +Inf), soma, total]
+  def observe(self, value: float, *labelvalues):
+    index = bisect_left(self.buckets, value)
+    with self._lock:
+      series = self._values.get(labelvalues)
+      if series is None:
+        series = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+      series[0][index] += 1
+      series[1] += value
+      series[2] += 1
+
+  @contextmanager
+  def time(self, *labelvalues):
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.observe(time.perf_counter() - start, *labelvalues)
+
+  def count(self, *labelvalues) -> int:
+    series = self._values.get(labelvalues)
+    return series[2] if series else 0
+
+  def _samples(self):
+    with self._lock:
+      values = { labelvalues: (list(series[0]), series[1], series[2]) for labelvalues, series in self._values.items() }
+    for labelvalues, (counts, total, count) in sorted(values.items()):
+      cumulative = 0
+      for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+        cumulative += bucket_count
+        yield f"{self.name}_bucket", self._labels(labelvalues, f'le="{_format_value(bound)}"'), cumulative
+      yield f"{self.name}_sum", self._labels(labelvalues), total
+      yield f"{self.name}_count", self._labels(labelvalues), count
+
+registry = []
+collectors = []
+
+def register(metric: _Metric) -> _Metric:
+  registry.append(metric)
+  return metric
+
+# Funcao chamada a cada render para atualizar as metricas com o estado atual de pools e caches
+def register_collector(collect):
+  collectors.append(collect)
+  return collect
+
+http_requests_in_flight = register(Gauge("http_requests_in_flight", "Requisicoes HTTP em andamento", ("method",)))
+http_requests_total = register(Counter("http_requests_total", "Requisicoes HTTP por rota e status", ("method", "route", "status")))
+http_request_duration_seconds = register(Histogram("http_request_duration_seconds", "Latencia das requisicoes HTTP por rota", ("method", "route")))
+password_hash_duration_seconds = register(Histogram("password_hash_duration_seconds", "Tempo de hash/verificacao de senha (bcrypt/argon2)", ("operation",)))
+jwt_verify_duration_seconds = register(Histogram("jwt_verify_duration_seconds", "Tempo de verificacao de JWT em verify_token", ("result",), DB_BUCKETS))
+smtp_messages_total = register(Counter("smtp_messages_total", "Emails entregues ao servidor SMTP", ("result",)))
+db_query_duration_seconds = register(Histogram("db_query_duration_seconds", "Tempo das consultas SQL por tipo de comando", ("operation",), DB_BUCKETS))
+
+# Atualizadas pelos coletores no render
+db_pool_connections = register(Gauge("db_pool_connections", "Conexoes do pool do banco por estado (size, checked_out, checked_in, overflow)", ("engine", "state")))
+db_pool_checkouts_total = register(Counter("db_pool_checkouts_total", "Checkouts de conexao do pool do banco", ("engine",)))
+db_pool_checkout_wait_seconds_total = register(Counter("db_pool_checkout_wait_seconds_total", "Tempo total de espera no checkout do pool do banco", ("engine",)))
+db_pool_checkout_timeouts_total = register(Counter("db_pool_checkout_timeouts_total", "Checkouts que estouraram o DB_POOL_TIMEOUT", ("engine",)))
+worker_pool_workers = register(Gauge("worker_pool_workers", "Threads de cada pool de trabalho (hash de senhas)", ("pool",)))
+worker_pool_tasks = register(Gauge("worker_pool_tasks", "Tarefas do pool de trabalho por estado (in_progress, queued)", ("pool", "state")))
+worker_pool_rejected_total = register(Counter("worker_pool_rejected_total", "Tarefas recusadas com o pool saturado (503)", ("pool",)))
+cache_entries = register(Gauge("cache_entries", "Entradas nos caches em memoria", ("cache",)))
+cache_lookups_total = register(Counter("cache_lookups_total", "Buscas nos caches por resultado (hit, miss)", ("cache", "result")))
+email_outbox_workers = register(Gauge("email_outbox_workers", "Workers ativos do outbox de emails"))
+email_outbox_messages = register(Gauge("email_outbox_messages", "Mensagens no outbox por status (PENDING, SENT, DEAD)", ("status",)))
+smtp_pool_connections = register(Gauge("smtp_pool_connections", "Conexoes do pool SMTP por estado (in_use, idle)", ("state",)))
+smtp_pool_opened_total = register(Counter("smtp_pool_opened_total", "Conexoes SMTP abertas pelo pool"))
+rate_limit_rejected_total = register(Counter("rate_limit_rejected_total", "Tentativas recusadas pelo rate limit (429) por rota", ("route",)))
+
+def render() -> str:
+  for collect in collectors:
+    collect()
+  return "\n".join(metric.render() for metric in registry) + "\n"
+
+def clear():
+  for metric in registry:
+    metric.clear()
+
+'''
+Middleware ASGI que registra latencia, status e requisicoes em andamento. A rota so e conhecida
+depois do roteamento: o Router do Starlette grava a rota casada no proprio scope, que e o mesmo
+dict visto aqui, entao ela e lida apos a resposta.
+'''
+class MetricsMiddleware:
+  def __init__(self, app: ASGIApp):
+    self.app = app
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    method = scope["method"]
+    status = 500
+    start = time.perf_counter()
+
+    async def send_wrapper(message: Message):
+      nonlocal status
+      if message["type"] == "http.response.start":
+        status = message["status"]
+      await send(message)
+
+    http_requests_in_flight.inc(method)
+    try:
+      await self.app(scope, receive, send_wrapper)
+    finally:
+      http_requests_in_flight.dec(method)
+      route = getattr(scope.get("route"), "path", None) or "unmatched"
+      http_request_duration_seconds.observe(time.perf_counter() - start, method, route)
+      http_requests_total.inc(method, route, str(status))
+
+_operation_pattern = re.compile(r"\s*(\w+)")
+
+# Tipo do comando SQL (SELECT, INSERT, ...) usado como label de db_query_duration_seconds (ver utils/query_log)
+def query_operation(statement: str) -> str:
+  match = _operation_pattern.match(statement)
+  return match.group(1).upper() if match else "OTHER"
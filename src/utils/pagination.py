@@ -0,0 +1,31 @@
+import base64, binascii, json
+from typing import Tuple
+
+from src.constants import errorMessages
+
+'''
+Cursores opacos da paginacao por keyset da listagem de usuarios.
+O cursor codifica a chave de ordenacao (name, id) do ultimo/primeiro usuario da pagina
+em JSON + base64 url-safe, sem padding. Nas buscas ranqueadas (name_or_email com pg_trgm) a
+ordenacao e (rank, name, id), entao o rank tambem vai no cursor.
+'''
+def encode_cursor(name: str, user_id: int, rank: float | None = None) -> str:
+  key = [name, user_id] if rank is None else [name, user_id, rank]
+  raw = json.dumps(key, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+  return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+# Retorna (name, id, rank), com rank None em cursores de listagens sem ranqueamento
+def decode_cursor(cursor: str) -> Tuple[str, int, float | None]:
+  try:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    name, user_id, *rank = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+  except (binascii.Error, UnicodeError, ValueError, TypeError):
+    raise ValueError(errorMessages.INVALID_CURSOR)
+
+  if not isinstance(name, str) or not isinstance(user_id, int) or isinstance(user_id, bool):
+    raise ValueError(errorMessages.INVALID_CURSOR)
+
+  if len(rank) > 1 or (rank and (not isinstance(rank[0], (int, float)) or isinstance(rank[0], bool))):
+    raise ValueError(errorMessages.INVALID_CURSOR)
+
+  return name, user_id, float(rank[0]) if rank else None
@@ -0,0 +1,130 @@
+'''
+Tempo e contagem das consultas SQL, log de consultas lentas e deteccao de N+1 por requisicao.
+
+instrument_engine registra os eventos before/after_cursor_execute da engine (em database.py, para a
+engine sincrona e para a sync_engine da assincrona). Cada consulta e cronometrada uma unica vez e
+alimenta o histograma db_query_duration_seconds de utils/metrics.
+
+QueryStatsMiddleware abre um QueryStats por requisicao num ContextVar, visto pelos eventos tanto nas
+rotas sincronas (threadpool copia o contexto) quanto nas assincronas. Ao final da requisicao:
+- SQL_DEBUG_HEADERS=true adiciona X-DB-Query-Count e X-DB-Time-Ms a resposta;
+- acima de SQL_QUERY_BUDGET consultas a requisicao e logada e contada em db_query_budget_exceeded_total;
+- o mesmo SQL repetido SQL_N_PLUS_ONE_THRESHOLD vezes ou mais e logado como possivel N+1.
+Consultas acima de SQL_SLOW_QUERY_MS sao logadas com o formato dos parametros (tipos, nunca os valores,
+ja que incluem hashes de senha e codigos de verificacao).
+'''
+import logging, os, time
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+SQL_DEBUG_HEADERS = (os.getenv("SQL_DEBUG_HEADERS") or "false").lower() in ["true", "1"]
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS") or 200)
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET") or 10)
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD") or 5)
+
+db_query_budget_exceeded_total = metrics.register(metrics.Counter("db_query_budget_exceeded_total", "Requisicoes acima de SQL_QUERY_BUDGET consultas", ("method", "route")))
+db_n_plus_one_total = metrics.register(metrics.Counter("db_n_plus_one_total", "Requisicoes com o mesmo SQL repetido SQL_N_PLUS_ONE_THRESHOLD vezes ou mais", ("method", "route")))
+
+class QueryStats:
+  def __init__(self):
+    self.count = 0
+    self.seconds = 0.0
+    # Quantas vezes cada SQL (texto com placeholders) foi executado
+    self.statements = {}
+
+  def add(self, statement: str, seconds: float):
+    self.count += 1
+    self.seconds += seconds
+    self.statements[statement] = self.statements.get(statement, 0) + 1
+
+  def repeated(self, threshold: int) -> list:
+    return [(statement, count) for statement, count in self.statements.items() if count >= threshold]
+
+current_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+# Formato dos parametros para o log: {"email": "str", "id": "int"}; no executemany, a quantidade de linhas e o formato da primeira
+def parameter_shape(parameters, executemany: bool = False):
+  if executemany and isinstance(parameters, (list, tuple)):
+    return { "rows": len(parameters), "row": parameter_shape(parameters[0]) if parameters else None }
+  if isinstance(parameters, dict):
+    return { key: type(value).__name__ for key, value in parameters.items() }
+  if isinstance(parameters, (list, tuple)):
+    return [type(value).__name__ for value in parameters]
+  return type(parameters).__name__
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  starts = conn.info.get("query_start")
+  if not starts:
+    return
+  seconds = time.perf_counter() - starts.pop()
+
+  stats = current_stats.get()
+  if stats is not None:
+    stats.add(statement, seconds)
+  if metrics.METRICS_ENABLED:
+    metrics.db_query_duration_seconds.observe(seconds, metrics.query_operation(statement))
+  if seconds * 1000 >= SQL_SLOW_QUERY_MS:
+    logger.warning("Consulta lenta (%.1f ms): %s | parametros: %s", seconds * 1000, " ".join(statement.split()), parameter_shape(parameters, executemany))
+
+# Consultas que falharam nao passam pelo after_cursor_execute
+def _handle_error(exception_context):
+  starts = exception_context.connection.info.get("query_start") if exception_context.connection is not None else None
+  if starts:
+    starts.pop()
+
+# Para a AsyncEngine, passar async_engine.sync_engine
+def instrument_engine(engine: Engine):
+  if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+    return
+  event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+  event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+  event.listen(engine, "handle_error", _handle_error)
+
+class QueryStatsMiddleware:
+  def __init__(self, app: ASGIApp):
+    self.app = app
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    stats = QueryStats()
+    reset_token = current_stats.set(stats)
+
+    async def send_wrapper(message: Message):
+      if message["type"] == "http.response.start" and SQL_DEBUG_HEADERS:
+        headers = MutableHeaders(scope=message)
+        headers.append("X-DB-Query-Count", str(stats.count))
+        headers.append("X-DB-Time-Ms", f"{stats.seconds * 1000:.2f}")
+      await send(message)
+
+    try:
+      await self.app(scope, receive, send_wrapper)
+    finally:
+      current_stats.reset(reset_token)
+      self._check(scope, stats)
+
+  def _check(self, scope: Scope, stats: QueryStats):
+    method = scope["method"]
+    route = getattr(scope.get("route"), "path", None) or "unmatched"
+
+    if stats.count > SQL_QUERY_BUDGET:
+      db_query_budget_exceeded_total.inc(method, route)
+      logger.warning("%s %s executou %s consultas (limite SQL_QUERY_BUDGET=%s, %.1f ms no banco)", method, route, stats.count, SQL_QUERY_BUDGET, stats.seconds * 1000)
+
+    repeated = stats.repeated(SQL_N_PLUS_ONE_THRESHOLD)
+    if repeated:
+      db_n_plus_one_total.inc(method, route)
+      for statement, count in repeated:
+        logger.warning("Possivel N+1 em %s %s: mesmo SQL executado %s vezes: %s", method, route, count, " ".join(statement.split()))
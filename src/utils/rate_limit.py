@@ -0,0 +1,195 @@
+'''
+Limite de tentativas nas rotas de login e de verificacao de codigo.
+
+Cada rota tem limites por IP e por email no formato "<tentativas>/<segundos>" (ex: RATE_LIMIT_LOGIN_EMAIL=10/300;
+"0" desliga o limite). A contagem usa janela deslizante aproximada: o contador da janela fixa atual
+mais o da anterior ponderado pela parte dela que ainda cai dentro da janela deslizante.
+Toda tentativa conta (inclusive as rejeitadas), e a checagem roda como dependencia da rota,
+antes da sessao do banco e de qualquer hash de senha.
+
+Os contadores ficam em memoria por padrao (por processo). Com varios workers/instancias use
+RATE_LIMIT_BACKEND=redis e RATE_LIMIT_REDIS_URL (depende do pacote opcional redis).
+Se o backend falhar a requisicao e liberada, para o limitador nao derrubar o login.
+'''
+import os, math, time, logging, threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import HTTPException, Request
+
+from src.constants import errorMessages
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = (os.getenv("RATE_LIMIT_ENABLED") or "true").lower() in ["true", "1"]
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND") or "memory"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL") or "redis://localhost:6379/0"
+# Atras de um proxy reverso o IP do cliente vem no X-Forwarded-For
+RATE_LIMIT_TRUST_PROXY = (os.getenv("RATE_LIMIT_TRUST_PROXY") or "false").lower() in ["true", "1"]
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS") or 100000)
+
+@dataclass(frozen=True)
+class Rate:
+  limit: int
+  window: int
+
+def parse_rate(value: str) -> Rate | None:
+  if value.strip() == "0":
+    return None
+  limit, window = value.split("/")
+  rate = Rate(int(limit), int(window))
+  if rate.limit < 1 or rate.window < 1:
+    raise ValueError(value)
+  return rate
+
+# Rota -> variavel de ambiente e limites padrao (por IP, por email)
+ROUTE_DEFAULTS = {
+  "login": ("RATE_LIMIT_LOGIN", "30/60", "10/300"),
+  "activate_account": ("RATE_LIMIT_ACTIVATE_ACCOUNT", "30/60", "10/600"),
+  "reset_password_verify": ("RATE_LIMIT_RESET_PASSWORD_VERIFY", "30/60", "10/600"),
+  # A troca de senha faz o hash antes de conferir o codigo
+  "reset_password_change": ("RATE_LIMIT_RESET_PASSWORD_CHANGE", "30/60", "10/600"),
+}
+
+def load_route_limits() -> dict:
+  return {
+    route: { "ip": parse_rate(os.getenv(f"{var}_IP") or ip_default), "email": parse_rate(os.getenv(f"{var}_EMAIL") or email_default) }
+    for route, (var, ip_default, email_default) in ROUTE_DEFAULTS.items()
+  }
+
+'''
+Contadores em memoria: por chave guarda [indice da janela atual, contagem da janela anterior, contagem da atual].
+LRU limitado a max_keys chaves para um ataque com muitos IPs/emails nao crescer a memoria sem limite.
+'''
+class MemoryBackend:
+  name = "memory"
+
+  def __init__(self, max_keys: int = 100000):
+    self.max_keys = max_keys
+    self._counters: "OrderedDict[str, list]" = OrderedDict()
+    self._lock = threading.Lock()
+
+  async def increment(self, key: str, window: int, ttl: int) -> tuple[int, int]:
+    with self._lock:
+      counter = self._counters.get(key)
+      if counter is None or counter[0] < window - 1:
+        counter = [window, 0, 0]
+      elif counter[0] == window - 1:
+        counter = [window, counter[2], 0]
+      counter[2] += 1
+      self._counters[key] = counter
+      self._counters.move_to_end(key)
+      while len(self._counters) > self.max_keys:
+        self._counters.popitem(last=False)
+      return counter[1], counter[2]
+
+  def clear(self):
+    with self._lock:
+      self._counters.clear()
+
+'''
+Contadores compartilhados no Redis: uma chave por janela fixa (INCR + EXPIRE), lidas junto com a anterior.
+'''
+class RedisBackend:
+  name = "redis"
+
+  def __init__(self, url: str, prefix: str = "rate-limit:"):
+    import redis.asyncio
+    self.prefix = prefix
+    self.client = redis.asyncio.from_url(url)
+
+  async def increment(self, key: str, window: int, ttl: int) -> tuple[int, int]:
+    current_key = f"{self.prefix}{key}:{window}"
+    async with self.client.pipeline(transaction=True) as pipe:
+      pipe.incr(current_key)
+      pipe.expire(current_key, ttl)
+      pipe.get(f"{self.prefix}{key}:{window - 1}")
+      current, _, previous = await pipe.execute()
+    return int(previous or 0), int(current)
+
+  def clear(self):
+    pass
+
+class RateLimiter:
+  def __init__(self, backend, limits: dict, enabled: bool = True):
+    self.backend = backend
+    self.limits = limits
+    self.enabled = enabled
+    self.rejected = { route: 0 for route in limits }
+
+  '''
+  Conta a tentativa em key e retorna 0 se ela cabe no limite, ou em quantos segundos
+  a janela deslizante volta a aceitar tentativas.
+  '''
+  async def hit(self, key: str, rate: Rate, now: float | None = None) -> int:
+    now = time.time() if now is None else now
+    window = int(now // rate.window)
+    elapsed = (now % rate.window) / rate.window
+    previous, current = await self.backend.increment(key, window, rate.window * 2)
+
+    if previous * (1 - elapsed) + current <= rate.limit:
+      return 0
+
+    if current > rate.limit:
+      # So a janela atual ja estoura: espera ela virar a anterior e perder peso suficiente
+      wait = (1 - elapsed) + (1 - rate.limit / current)
+    else:
+      wait = (1 - (rate.limit - current) / previous) - elapsed
+    return max(math.ceil(wait * rate.window), 1)
+
+  async def check(self, route: str, ip: str | None, email: str | None):
+    if not self.enabled:
+      return
+
+    retry_after = 0
+    for scope, value in [("ip", ip), ("email", email)]:
+      rate = self.limits[route][scope]
+      if rate is None or not value:
+        continue
+      try:
+        retry_after = max(retry_after, await self.hit(f"{route}:{scope}:{value}", rate))
+      except Exception:
+        logger.exception("Erro no backend do rate limit, requisicao liberada")
+
+    if retry_after:
+      self.rejected[route] += 1
+      raise HTTPException(status_code=429, detail=errorMessages.TOO_MANY_ATTEMPTS, headers={ "Retry-After": str(retry_after) })
+
+  def reset(self):
+    self.backend.clear()
+    self.rejected = { route: 0 for route in self.limits }
+
+  def status(self) -> dict:
+    limits = { route: { scope: f"{rate.limit}/{rate.window}" if rate else None for scope, rate in scopes.items() } for route, scopes in self.limits.items() }
+    return { "enabled": self.enabled, "backend": self.backend.name, "limits": limits, "rejected": dict(self.rejected) }
+
+def build_backend(name: str):
+  if name == "redis":
+    return RedisBackend(RATE_LIMIT_REDIS_URL)
+  return MemoryBackend(RATE_LIMIT_MAX_KEYS)
+
+limiter = RateLimiter(build_backend(RATE_LIMIT_BACKEND), load_route_limits(), RATE_LIMIT_ENABLED)
+
+def client_ip(request: Request) -> str | None:
+  if RATE_LIMIT_TRUST_PROXY:
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+      return forwarded.split(",")[0].strip()
+  return request.client.host if request.client else None
+
+# O corpo ja foi lido pelo FastAPI antes das dependencias, entao request.json() nao le o stream de novo
+async def request_email(request: Request) -> str | None:
+  try:
+    body = await request.json()
+  except Exception:
+    return None
+  email = body.get("email") if isinstance(body, dict) else None
+  return email.strip().lower() if isinstance(email, str) else None
+
+'''
+Dependencia da rota: dependencies=[Depends(rate_limit.limit("login"))].
+Dependencias do decorator rodam antes das dos parametros (ex: get_db), entao a rejeicao nao toca no banco.
+'''
+def limit(route: str):
+  async def check_rate_limit(request: Request):
+    await limiter.check(route, client_ip(request), await request_email(request))
+  return check_rate_limit
@@ -1,25 +1,101 @@
-import os, secrets
+import os, secrets, hashlib, time
 from fastapi import Depends, HTTPException
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.orm import Session
 from src.constants import errorMessages 
+from src.database import get_db
+from src.repository import userRepository
+from src.utils import cache, jwt_keys, metrics, worker_pool
 
 SECRET_KEY = os.getenv("SECRET")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", default=30)
 REFRESH_TOKEN_EXPIRE_DAYS = os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", default=7)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS") or 4)
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT") or 32)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE") or 4096)
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID") or None
+JWKS_MAX_AGE = int(os.getenv("JWKS_MAX_AGE") or 300)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Politica de hash de senhas. PASSWORD_HASH_ROUNDS e o custo do bcrypt (log2) ou o time_cost do argon2.
+# argon2 depende do pacote opcional argon2-cffi. Use "python -m src.utils.calibrate_hash" para escolher o custo
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME") or "bcrypt"
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS") or 0) or None
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST") or 65536)
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM") or 2)
+
+DEFAULT_BCRYPT_ROUNDS = 12
+DEFAULT_ARGON2_TIME_COST = 3
+
+'''
+Monta o CryptContext da politica de hash. O esquema escolhido gera os hashes novos e os demais
+continuam verificando hashes antigos, mas ficam deprecated. Hashes de outro esquema ou com custo
+diferente do configurado sao reportados por needs_update (ver password_needs_update).
+'''
+def build_crypt_context(scheme: str = "bcrypt", rounds: int | None = None, memory_cost: int = 65536, parallelism: int = 2) -> CryptContext:
+  schemes = ["argon2", "bcrypt"] if scheme == "argon2" else ["bcrypt"]
+  settings = {}
+
+  if scheme == "argon2":
+    time_cost = rounds or DEFAULT_ARGON2_TIME_COST
+    settings.update({
+      "argon2__time_cost": time_cost,
+      "argon2__memory_cost": memory_cost,
+      "argon2__parallelism": parallelism,
+    })
+  else:
+    # min/max iguais ao custo configurado fazem needs_update pedir rehash tanto ao subir quanto ao baixar o custo
+    bcrypt_rounds = rounds or DEFAULT_BCRYPT_ROUNDS
+    settings.update({
+      "bcrypt__default_rounds": bcrypt_rounds,
+      "bcrypt__min_rounds": bcrypt_rounds,
+      "bcrypt__max_rounds": bcrypt_rounds,
+    })
+
+  return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+pwd_context = build_crypt_context(PASSWORD_HASH_SCHEME, PASSWORD_HASH_ROUNDS, ARGON2_MEMORY_COST, ARGON2_PARALLELISM)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Com ALGORITHM assimetrico (RS256/ES256) os tokens sao assinados pelo chaveiro em JWT_KEYS_DIR e
+# verificaveis por outros servicos via JWKS. Com HS256 continua a assinatura HMAC com SECRET
+key_ring = jwt_keys.KeyRing(ALGORITHM, JWT_KEYS_DIR, JWT_ACTIVE_KID) if ALGORITHM in jwt_keys.ASYMMETRIC_ALGORITHMS else None
+
+# Payloads de tokens ja verificados, chaveados pelo sha256 do token e mantidos ate o exp do proprio token
+token_cache = cache.TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=0)
+
+# Hash/verificacao de senha (bcrypt, ~200ms de CPU) rodam fora do event loop nas rotas async
+password_hash_pool = worker_pool.BoundedExecutor(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT, name="password-hash")
+
 def verify_password(plain_password, hashed_password) -> bool:
-  return pwd_context.verify(plain_password, hashed_password)
+  with metrics.password_hash_duration_seconds.time("verify"):
+    return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password) -> str:
-  return pwd_context.hash(password)
+  with metrics.password_hash_duration_seconds.time("hash"):
+    return pwd_context.hash(password)
+
+# Indica se o hash foi gerado com outro esquema ou custo e deve ser refeito no proximo login
+def password_needs_update(hashed_password) -> bool:
+  return bool(hashed_password) and pwd_context.needs_update(hashed_password)
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+  return await _run_password_hash(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+  return await _run_password_hash(get_password_hash, password)
+
+# Com o pool saturado responde 503 em vez de acumular requisicoes esperando pelo bcrypt
+async def _run_password_hash(fn, *args):
+  try:
+    return await password_hash_pool.run(fn, *args)
+  except worker_pool.PoolSaturatedError:
+    raise HTTPException(status_code=503, detail=errorMessages.SERVICE_BUSY)
 
 def validate_password(password: str) -> bool:
   return (len(password) == 6 and not any(not ch.isdigit() for ch in password))
@@ -31,16 +107,66 @@ def create_access_token(data: dict):
   expire = datetime.now(timezone.utc) + access_token_expires
   
   to_encode.update({ "exp": expire, **data })
-  encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+  encoded_jwt = _encode_token(to_encode)
   return encoded_jwt
 
 def verify_token(token: str = Depends(oauth2_scheme)):
+  start = time.perf_counter()
+  key = hashlib.sha256(token.encode()).digest()
+  payload = token_cache.get(key)
+  if payload is not None:
+    metrics.jwt_verify_duration_seconds.observe(time.perf_counter() - start, "cached")
+    return dict(payload)
+
   try:
-    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    payload = _decode_token(token)
+    # Tokens sem exp nao sao memorizados
+    if isinstance(payload.get("exp"), (int, float)):
+      token_cache.set(key, dict(payload), ttl=payload["exp"] - time.time())
+    metrics.jwt_verify_duration_seconds.observe(time.perf_counter() - start, "valid")
     return payload
   except JWTError:
+    metrics.jwt_verify_duration_seconds.observe(time.perf_counter() - start, "invalid")
     raise HTTPException(status_code=401, detail=errorMessages.INVALID_TOKEN)
 
+'''
+Dependencia de autorizacao por role: confia na claim "role" do token assinado em vez de buscar o
+usuario no banco. A claim "ver" precisa ser igual ao token_version atual do usuario, que e
+incrementado a cada troca de role, entao tokens emitidos antes da troca deixam de valer aqui.
+O token_version vem de userRepository.get_user, normalmente atendido pelo userCache sem consulta.
+Tokens sem "ver" (emitidos antes dessa claim) valem como versao 0.
+'''
+def require_roles(*roles: str):
+  def check_roles(token: dict = Depends(verify_token), db: Session = Depends(get_db)) -> dict:
+    if token.get("role") not in roles:
+      raise HTTPException(status_code=401, detail=errorMessages.NO_PERMISSION)
+
+    if token.get("ver", 0) != userRepository.get_token_version(db, token.get("id")):
+      raise HTTPException(status_code=401, detail=errorMessages.INVALID_TOKEN)
+    return token
+  return check_roles
+
+def _encode_token(to_encode: dict) -> str:
+  if key_ring is None:
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+  kid, key = key_ring.signing_key()
+  return jwt.encode(to_encode, key, algorithm=ALGORITHM, headers={ "kid": kid })
+
+# A chave de verificacao vem do kid do header; kid desconhecido (ou ausente) e token invalido
+def _decode_token(token: str) -> dict:
+  if key_ring is None:
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+  key = key_ring.verification_key(jwt.get_unverified_header(token).get("kid"))
+  if key is None:
+    raise JWTError("kid desconhecido")
+  return jwt.decode(token, key, algorithms=[ALGORITHM])
+
+# Chaves publicas de verificacao (vazio quando os tokens sao assinados com HMAC)
+def get_jwks() -> dict:
+  return key_ring.jwks() if key_ring else { "keys": [] }
+
 def generate_six_digit_number_code():
   return secrets.randbelow(900000) + 100000
 
@@ -52,5 +178,5 @@ def create_refresh_token(data:dict):
     expire = datetime.now(timezone.utc) + access_token_expires
 
   to_encode.update({"exp": expire})
-  encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+  encoded_jwt = _encode_token(to_encode)
   return encoded_jwt
@@ -1,10 +1,22 @@
-import os
+import os, asyncio, time
+from contextlib import asynccontextmanager
+import aiosmtplib
 from fastapi import BackgroundTasks
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
+from fastapi_mail.schemas import MultipartSubtypeEnum
+from fastapi_mail.fastmail import email_dispatched
+from fastapi_mail.msg import MailMsg
 from pydantic import BaseModel, EmailStr
 from starlette.responses import JSONResponse
 from typing import List
 
+from src.utils import email_templates, metrics
+
+# Pool de conexoes SMTP: conexoes simultaneas, mensagens por conexao antes de reconectar e segundos ociosa ate ser fechada
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE") or 4)
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION") or 100)
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT") or 60)
+
 conf = ConnectionConfig(
   MAIL_USERNAME = os.getenv("MAIL_USERNAME"),
   MAIL_PASSWORD = os.getenv("MAIL_PASSWORD"),
@@ -18,37 +30,211 @@ conf = ConnectionConfig(
   VALIDATE_CERTS = True
 )
 
-fm = FastMail(conf)
+class _PooledConnection:
+  def __init__(self, smtp: aiosmtplib.SMTP):
+    self.smtp = smtp
+    self.messages_sent = 0
+    self.last_used = time.monotonic()
+
+'''
+Pool de conexoes SMTP persistentes (connect + STARTTLS + AUTH uma vez, varias mensagens por conexao).
+- max_connections limita as sessoes SMTP simultaneas (as demais esperam uma conexao livre)
+- uma conexao e trocada apos max_messages_per_connection mensagens (limite comum dos servidores)
+- conexoes ociosas ha mais de idle_timeout segundos sao fechadas (reap_idle); ao reutilizar uma
+  conexao ociosa e feito um NOOP para descartar as que o servidor ja derrubou
+'''
+class SMTPConnectionPool:
+  def __init__(self, config: ConnectionConfig, max_connections: int = 4, max_messages_per_connection: int = 100, idle_timeout: float = 60):
+    self.config = config
+    self.max_connections = max_connections
+    self.max_messages_per_connection = max_messages_per_connection
+    self.idle_timeout = idle_timeout
+    self.opened = 0
+    self._idle: list[_PooledConnection] = []
+    self._in_use = 0
+    self._loop = None
+    self._semaphore = None
+
+  # As conexoes pertencem ao event loop que as abriu (ex: cada teste roda em um loop novo)
+  def _bind_loop(self):
+    loop = asyncio.get_running_loop()
+    if loop is not self._loop:
+      self._loop = loop
+      self._semaphore = asyncio.Semaphore(self.max_connections)
+      self._idle = []
+      self._in_use = 0
+
+  async def _open(self) -> _PooledConnection:
+    smtp = aiosmtplib.SMTP(
+      hostname=self.config.MAIL_SERVER,
+      port=self.config.MAIL_PORT,
+      timeout=self.config.TIMEOUT,
+      use_tls=self.config.MAIL_SSL_TLS,
+      start_tls=self.config.MAIL_STARTTLS,
+      validate_certs=self.config.VALIDATE_CERTS,
+    )
+    await smtp.connect()
+    if self.config.USE_CREDENTIALS:
+      await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD)
+    self.opened += 1
+    return _PooledConnection(smtp)
+
+  async def _close(self, connection: _PooledConnection):
+    try:
+      await connection.smtp.quit()
+    except Exception:
+      connection.smtp.close()
+
+  async def _is_alive(self, connection: _PooledConnection) -> bool:
+    if not connection.smtp.is_connected:
+      return False
+    try:
+      await connection.smtp.noop()
+      return True
+    except aiosmtplib.SMTPException:
+      return False
+
+  async def reap_idle(self):
+    now = time.monotonic()
+    expired = [connection for connection in self._idle if now - connection.last_used > self.idle_timeout]
+    self._idle = [connection for connection in self._idle if connection not in expired]
+    for connection in expired:
+      await self._close(connection)
+
+  async def _acquire(self) -> _PooledConnection:
+    await self.reap_idle()
+    while self._idle:
+      connection = self._idle.pop()
+      if await self._is_alive(connection):
+        return connection
+      connection.smtp.close()
+    return await self._open()
+
+  async def _release(self, connection: _PooledConnection):
+    connection.last_used = time.monotonic()
+    if connection.messages_sent >= self.max_messages_per_connection:
+      await self._close(connection)
+    else:
+      self._idle.append(connection)
+
+  # Conexao exclusiva do pool. Em caso de erro a conexao e descartada em vez de devolvida
+  @asynccontextmanager
+  async def connection(self):
+    self._bind_loop()
+    async with self._semaphore:
+      connection = await self._acquire()
+      self._in_use += 1
+      try:
+        yield connection
+      except Exception:
+        connection.smtp.close()
+        raise
+      else:
+        await self._release(connection)
+      finally:
+        self._in_use -= 1
+
+  async def send(self, messages: list) -> list:
+    results = []
+    pending = list(messages)
+
+    while pending:
+      connected = False
+      try:
+        async with self.connection() as connection:
+          connected = True
+          while pending and connection.messages_sent < self.max_messages_per_connection:
+            try:
+              await connection.smtp.send_message(pending[0])
+              results.append(None)
+            except (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPResponseException) as error:
+              # Erro da mensagem (ex: destinatario recusado): a conexao continua valida
+              results.append(error)
+            connection.messages_sent += 1
+            pending.pop(0)
+      except Exception as error:
+        if not connected:
+          # Nao foi possivel conectar: todas as mensagens restantes falham com o mesmo erro
+          results.extend([error] * len(pending))
+          break
+        # Conexao caiu no meio do lote: a mensagem atual falha e as seguintes usam uma conexao nova
+        results.append(error)
+        pending.pop(0)
+
+    return results
+
+  async def close(self):
+    idle, self._idle = self._idle, []
+    for connection in idle:
+      await self._close(connection)
 
-async def send_verification_code(email: str, code: int, is_unb: bool =False) -> JSONResponse:
-  html = f"<p>Seja bem-vindo ao UnB-TV! Para confirmar a criação da sua conta, utilize o código <strong>{code}</strong></p>"
-  
-  DEPLOY_URL = os.getenv("DEPLOY_URL")
-  if is_unb:
-      html += f"<p>Como usuário da UnB, você pode configurar uma senha de administrador acessando o seguinte link após ativar sua conta: <a href='{DEPLOY_URL}/adminActivate?email={email}'>Configurar Senha de Administrador</a></p>"
+  def status(self) -> dict:
+    return { "max_connections": self.max_connections, "in_use": self._in_use, "idle": len(self._idle), "opened": self.opened }
 
-  message = MessageSchema(
-    subject="Confirme a criação da sua conta",
+'''
+FastMail que envia pelas conexoes do SMTPConnectionPool em vez de abrir uma sessao SMTP por mensagem.
+'''
+class PooledFastMail(FastMail):
+  def __init__(self, config: ConnectionConfig, pool: SMTPConnectionPool):
+    super().__init__(config)
+    self.pool = pool
+
+  async def _build(self, message: MessageSchema):
+    sender = f"{self.config.MAIL_FROM_NAME} <{self.config.MAIL_FROM}>" if self.config.MAIL_FROM_NAME is not None else self.config.MAIL_FROM
+    return await MailMsg(message)._message(sender)
+
+  async def send_message(self, message: MessageSchema, template_name=None) -> None:
+    error = (await self.send_messages([message]))[0]
+    if error is not None:
+      raise error
+
+  # Envia varias mensagens reaproveitando conexoes. Retorna, por mensagem, None (enviada) ou a excecao
+  async def send_messages(self, messages: List[MessageSchema]) -> list:
+    built = [await self._build(message) for message in messages]
+
+    if self.config.SUPPRESS_SEND:
+      results = [None] * len(built)
+    else:
+      results = await self.pool.send(built)
+
+    for msg, error in zip(built, results):
+      metrics.smtp_messages_total.inc("sent" if error is None else "failed")
+      if error is None:
+        email_dispatched.send(msg)
+    return results
+
+smtp_pool = SMTPConnectionPool(conf, SMTP_POOL_SIZE, SMTP_MAX_MESSAGES_PER_CONNECTION, SMTP_IDLE_TIMEOUT)
+
+fm = PooledFastMail(conf, smtp_pool)
+
+def _templated_message(email: str, template: str, locale: str | None = None, **context) -> MessageSchema:
+  rendered = email_templates.templates.render(template, locale, email=email, **context)
+  return MessageSchema(
+    subject=rendered.subject,
     recipients=[email],
-    body=html,
-    subtype=MessageType.html
+    body=rendered.html,
+    alternative_body=rendered.text,
+    subtype=MessageType.html,
+    multipart_subtype=MultipartSubtypeEnum.alternative
   )
-  
+
+def verification_code_message(email: str, code: int, is_unb: bool = False, locale: str | None = None) -> MessageSchema:
+  return _templated_message(email, "verification_code", locale, code=code, is_unb=is_unb)
+
+def reset_password_code_message(email: str, code: int, locale: str | None = None) -> MessageSchema:
+  return _templated_message(email, "reset_password_code", locale, code=code)
+
+async def send_verification_code(email: str, code: int, is_unb: bool =False, locale: str | None = None) -> JSONResponse:
+  message = verification_code_message(email, code, is_unb, locale)
   await fm.send_message(message)
   return JSONResponse(status_code=200, content={ "status": "success" })
 
-async def send_reset_password_code(email: str, code: int) -> JSONResponse:  
-  html = f"""
-    <p>Foi feita uma solicitação de troca de senha. Caso você tenha feito essa solicitação, utilize o código <strong>{code}</strong para trocar a sua senha.</p>
-    <p>Caso você não tenha feito essa solicitação, por favor ignore este email</p>
-  """
-
-  message = MessageSchema(
-    subject="Confirme a troca da sua senha",
-    recipients=[email],
-    body=html,
-    subtype=MessageType.html
-  )
-  
+async def send_reset_password_code(email: str, code: int, locale: str | None = None) -> JSONResponse:
+  message = reset_password_code_message(email, code, locale)
   await fm.send_message(message)
   return JSONResponse(status_code=200, content={ "status": "success" })
+
+# Envio em lote (ex: emails de verificacao/reset acumulados no outbox) sobre as mesmas conexoes SMTP.
+# Retorna, na ordem das mensagens, None para as enviadas ou a excecao da falha
+async def send_batch(messages: List[MessageSchema]) -> list:
+  return await fm.send_messages(messages)
@@ -0,0 +1,50 @@
+'''
+Exportacao em streaming da lista de usuarios (GET /users/export) em CSV ou NDJSON.
+
+Os usuarios vem de userRepository.iter_users (cursor no servidor com yield_per) e sao enviados
+em blocos de USER_EXPORT_BATCH_SIZE linhas, sem montar o arquivo inteiro em memoria.
+O gerador abre a propria sessao, que fica aberta enquanto a resposta e enviada.
+No CSV, textos que comecam com =, +, -, @ (ou tab/CR) recebem um ' na frente para a planilha
+nao executar o valor como formula (CSV injection). O NDJSON sai sem alteracao.
+'''
+import csv, io, json, os
+from itertools import islice
+
+from src.database import SessionLocal
+from src.domain import userSchema
+from src.repository import userRepository
+
+USER_EXPORT_BATCH_SIZE = int(os.getenv("USER_EXPORT_BATCH_SIZE") or 1000)
+
+MEDIA_TYPES = {
+  "csv": "text/csv; charset=utf-8",
+  "ndjson": "application/x-ndjson",
+}
+
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def escape_formula(value):
+  if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+    return "'" + value
+  return value
+
+def _csv_lines(rows: list) -> str:
+  output = io.StringIO()
+  csv.writer(output, lineterminator="\n").writerows([escape_formula(value) for value in row] for row in rows)
+  return output.getvalue()
+
+def _ndjson_lines(rows: list) -> str:
+  return "".join(json.dumps(dict(zip(userRepository.EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows)
+
+def export_users(users_filter: userSchema.UserListFilter, export_format: str):
+  format_lines = _csv_lines if export_format == "csv" else _ndjson_lines
+  db = SessionLocal()
+  try:
+    if export_format == "csv":
+      yield _csv_lines([userRepository.EXPORT_COLUMNS])
+
+    rows = userRepository.iter_users(db, users_filter, USER_EXPORT_BATCH_SIZE)
+    while batch := list(islice(rows, USER_EXPORT_BATCH_SIZE)):
+      yield format_lines(batch)
+  finally:
+    db.close()
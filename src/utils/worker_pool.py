@@ -0,0 +1,45 @@
+import asyncio, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+class PoolSaturatedError(Exception):
+  pass
+
+'''
+Pool de threads com fila limitada para tarefas de CPU chamadas por rotas async (ex: bcrypt),
+para que elas nao bloqueiem o event loop.
+Quando ja existem workers + queue_limit tarefas pendentes, run lanca PoolSaturatedError
+em vez de enfileirar indefinidamente.
+'''
+class BoundedExecutor:
+  def __init__(self, workers: int, queue_limit: int, name: str):
+    self.name = name
+    self.workers = workers
+    self.queue_limit = queue_limit
+    self.rejected = 0
+    self._pending = 0
+    self._lock = threading.Lock()
+    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+
+  async def run(self, fn: Callable, *args) -> Any:
+    with self._lock:
+      if self._pending >= self.workers + self.queue_limit:
+        self.rejected += 1
+        raise PoolSaturatedError()
+      self._pending += 1
+
+    try:
+      return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+    finally:
+      with self._lock:
+        self._pending -= 1
+
+  def status(self) -> dict:
+    with self._lock:
+      return {
+        "workers": self.workers,
+        "queue_limit": self.queue_limit,
+        "in_progress": min(self._pending, self.workers),
+        "queue_depth": max(self._pending - self.workers, 0),
+        "rejected": self.rejected,
+      }
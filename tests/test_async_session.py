@@ -0,0 +1,96 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.main import app
+from src.constants import errorMessages
+from src.database import POSTGRES_URI, SessionLocal, get_async_db, get_async_uri, get_db
+from src.repository import userRepository
+from src.utils import rate_limit
+
+client = TestClient(app)
+
+user = {"name": "Async Session", "email": "async-session@email.com", "connection": "ESTUDANTE", "password": "123456"}
+
+'''
+As rotas de auth usam get_db_for, que so devolve a sessao assincrona com ASYNC_DB_ROUTES definido.
+Aqui as dependencias get_db/get_async_db sao trocadas por uma AsyncSession (aiosqlite nos testes),
+entao os caminhos AsyncSession -> run_sync do userRepositoryAsync rodam mesmo sem ASYNC_DB_ROUTES.
+NullPool: o TestClient usa um event loop por requisicao e conexoes assincronas nao podem trocar de loop.
+'''
+@pytest.fixture
+def async_session():
+    async_engine = create_async_engine(get_async_uri(POSTGRES_URI), poolclass=NullPool)
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def get_test_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = get_test_async_db
+    app.dependency_overrides[get_async_db] = get_test_async_db
+    rate_limit.limiter.reset()
+    try:
+        yield
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(get_async_db, None)
+        rate_limit.limiter.reset()
+
+        db = SessionLocal()
+        try:
+            db_user = userRepository.get_user_by_email(db, user["email"])
+            if db_user:
+                userRepository.delete_user(db, db_user)
+        finally:
+            db.close()
+
+def get_codes() -> tuple:
+    db = SessionLocal()
+    try:
+        db_user = userRepository.get_user_by_email(db, user["email"])
+        return db_user.activation_code, db_user.password_reset_code
+    finally:
+        db.close()
+
+class TestAsyncSession:
+    def test_async_session_auth_flow(self, async_session):
+        response = client.post("/api/auth/register", json=user)
+        assert response.status_code == 201
+
+        # Conta inativa: login recusado
+        response = client.post("/api/auth/login", json={"email": user["email"], "password": user["password"]})
+        assert response.status_code == 401
+        assert response.json()["detail"] == errorMessages.ACCOUNT_IS_NOT_ACTIVE
+
+        activation_code, _ = get_codes()
+        response = client.patch("/api/auth/activate-account", json={"email": user["email"], "code": activation_code + 1 if activation_code < 999999 else 100000})
+        assert response.status_code == 404
+        assert response.json()["detail"] == errorMessages.INVALID_CODE
+        response = client.patch("/api/auth/activate-account", json={"email": user["email"], "code": activation_code})
+        assert response.status_code == 200
+
+        response = client.post("/api/auth/login", json={"email": user["email"], "password": user["password"]})
+        assert response.status_code == 200
+        assert response.json()["access_token"]
+
+        response = client.post("/api/auth/reset-password/request", json={"email": user["email"]})
+        assert response.status_code == 200
+        _, reset_code = get_codes()
+        assert reset_code
+
+        response = client.patch("/api/auth/reset-password/change", json={"email": user["email"], "password": "654321", "code": reset_code})
+        assert response.status_code == 200
+        assert response.json()["email"] == user["email"]
+        assert get_codes()[1] is None
+
+        # Codigo consumido: nova troca e recusada
+        response = client.patch("/api/auth/reset-password/change", json={"email": user["email"], "password": "111111", "code": reset_code})
+        assert response.status_code == 401
+
+        response = client.post("/api/auth/login", json={"email": user["email"], "password": "123456"})
+        assert response.status_code == 404
+        assert response.json()["detail"] == errorMessages.PASSWORD_NO_MATCH
+        response = client.post("/api/auth/login", json={"email": user["email"], "password": "654321"})
+        assert response.status_code == 200
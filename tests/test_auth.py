@@ -4,9 +4,10 @@ import os
 # Adiciona o caminho do diretório 'src' ao sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 
-import pytest, os
+import pytest, os, asyncio, threading, json
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, text
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 from sqlalchemy.pool import StaticPool
@@ -18,9 +19,9 @@ from fastapi import HTTPException
 from src.main import app
 from src.constants import errorMessages
 from src.model import userModel
-from src.utils import security, dotenv, send_mail, enumeration
-from src.database import get_db, engine, Base
-from src.repository import userRepository
+from src.utils import security, dotenv, send_mail, enumeration, worker_pool, jwt_keys, email_outbox, rate_limit
+from src.database import get_db, engine, async_engine, Base, SessionLocal
+from src.repository import userCache, userRepository, userRepositoryAsync, emailOutboxRepository
 
 valid_user_active_admin = {"name": "Forsen", "email": "valid@email.com", "connection": "PROFESSOR", "password": "123456"}
 valid_user_active_user = {"name": "Guy Beahm", "email": "valid2@email.com", "connection": "ESTUDANTE", "password": "123456"}
@@ -36,6 +37,21 @@ total_registed_users = 5
 
 client = TestClient(app)
 
+# Registra os SQLs executados dentro do bloco (engine sincrono e, com ASYNC_DB_ROUTES, o assincrono)
+@contextmanager
+def count_queries():
+    queries = []
+    engines = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+    for target in engines:
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+
 class TestAuth:
     __admin_access_token__ = None
     __admin_refresh_token__ = None
@@ -112,6 +128,13 @@ class TestAuth:
             query = "UPDATE users SET role = 'ADMIN' WHERE id = 1;"
             connection.execute(text(query))
             connection.commit()
+        # Escrita fora do userRepository: descarta os usuarios em cache
+        userCache.clear()
+
+        # A role vai como claim no token, entao o admin precisa de um token emitido apos a troca
+        response = client.post("/api/auth/login", json={"email": valid_user_active_admin['email'], "password": valid_user_active_admin['password']})
+        assert response.status_code == 200
+        TestAuth.__admin_access_token__ = response.json()['access_token']
 
         yield
 
@@ -173,6 +196,23 @@ class TestAuth:
         assert response.status_code == 401
         assert data['detail'] == errorMessages.ACCOUNT_IS_NOT_ACTIVE
 
+    def test_auth_login_rehash_outdated_password(self, setup):
+        # Hash com custo diferente da politica atual e refeito no login
+        outdated_hash = security.build_crypt_context("bcrypt", 4).hash(valid_user_active_user['password'])
+        with engine.connect() as connection:
+            connection.execute(text("UPDATE users SET password = :password WHERE email = :email"), {"password": outdated_hash, "email": valid_user_active_user['email']})
+            connection.commit()
+        userCache.clear()
+
+        response = client.post("/api/auth/login", json={"email": valid_user_active_user['email'], "password": valid_user_active_user['password']})
+        assert response.status_code == 200
+
+        with engine.connect() as connection:
+            password = connection.execute(text("SELECT password FROM users WHERE email = :email"), {"email": valid_user_active_user['email']}).scalar()
+        assert password != outdated_hash
+        assert not security.password_needs_update(password)
+        assert security.verify_password(valid_user_active_user['password'], password)
+
     def test_auth_login_social(self, setup):
         response = client.post('/api/auth/login/social', json=valid_social_user)
         data = response.json()
@@ -233,4 +273,421 @@ class TestAuth:
         response = client.post("/api/auth/admin-setup", json={"email": valid_user_active_user['email']})
         data = response.json()
         assert response.status_code == 400
-        assert data['detail'] == "Account is not @unb"
\ No newline at end of file
+        assert data['detail'] == "Account is not @unb"
+
+    # DOTENV
+    def test_dotenv_invalid_pool_settings(self, monkeypatch):
+        monkeypatch.setenv("DB_POOL_SIZE", "0")
+        monkeypatch.setenv("DB_POOL_TIMEOUT", "abc")
+        monkeypatch.setenv("DB_POOL_PRE_PING", "talvez")
+
+        with pytest.raises(EnvironmentError) as error:
+            dotenv.validate_dotenv()
+
+        assert errorMessages.INVALID_ENV_VALUES in str(error.value)
+        for var in ["DB_POOL_SIZE", "DB_POOL_TIMEOUT", "DB_POOL_PRE_PING"]:
+            assert var in str(error.value)
+
+    def test_dotenv_zero_pool_and_batch_sizes(self, monkeypatch):
+        variables = ["PASSWORD_HASH_WORKERS", "BULK_IMPORT_HASH_WORKERS", "BULK_IMPORT_BATCH_SIZE", "EMAIL_OUTBOX_BATCH_SIZE", "USER_EXPORT_BATCH_SIZE"]
+        for var in variables:
+            monkeypatch.setenv(var, "0")
+
+        with pytest.raises(EnvironmentError) as error:
+            dotenv.validate_dotenv()
+
+        for var in variables:
+            assert var in str(error.value)
+
+    # METRICAS DO POOL
+    def test_db_pool_metrics(self, setup):
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert 'db_pool_connections{engine="sync",state="checked_out"}' in response.text
+
+    # POOL DE HASH DE SENHAS
+    @pytest.mark.asyncio
+    async def test_password_hash_pool_saturated(self, monkeypatch):
+        pool = worker_pool.BoundedExecutor(workers=1, queue_limit=0, name="test-password-hash")
+        monkeypatch.setattr(security, "password_hash_pool", pool)
+        release = threading.Event()
+
+        running = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        assert pool.status()["in_progress"] == 1
+
+        with pytest.raises(HTTPException) as error:
+            await security.get_password_hash_async("123456")
+        assert error.value.status_code == 503
+        assert error.value.detail == errorMessages.SERVICE_BUSY
+        assert pool.status()["rejected"] == 1
+
+        release.set()
+        await running
+        assert await security.verify_password_async("123456", await security.get_password_hash_async("123456"))
+
+    # CACHE DE TOKENS
+    def test_verify_token_cache(self, setup, mocker):
+        token = security.create_access_token(data={ "id": 99, "email": "cache@email.com", "role": "USER" })
+        decode = mocker.spy(security.jwt, "decode")
+
+        assert security.verify_token(token)['email'] == "cache@email.com"
+        hits = security.token_cache.hits
+        payload = security.verify_token(token)
+
+        assert payload['id'] == 99
+        assert security.token_cache.hits == hits + 1
+        assert decode.call_count == 1
+
+        # Token invalido nao e memorizado
+        with pytest.raises(HTTPException):
+            security.verify_token(token + "x")
+        with pytest.raises(HTTPException):
+            security.verify_token(token + "x")
+
+    # ASSINATURA ASSIMETRICA / JWKS
+    def test_jwks_hmac(self, setup):
+        response = client.get("/.well-known/jwks.json")
+        assert response.status_code == 200
+        assert response.json() == { "keys": [] }
+        assert response.headers['cache-control'] == f"public, max-age={security.JWKS_MAX_AGE}"
+
+    def test_asymmetric_token_key_rotation(self, setup, tmp_path, monkeypatch):
+        (tmp_path / "key-1.pem").write_bytes(jwt_keys.generate_private_key_pem("RS256"))
+        monkeypatch.setattr(security, "ALGORITHM", "RS256")
+        monkeypatch.setattr(security, "key_ring", jwt_keys.KeyRing("RS256", str(tmp_path)))
+        old_token = security.create_access_token(data={ "id": 1 })
+
+        # Rotaciona: a chave nova assina, a antiga continua verificando e publicada no JWKS
+        (tmp_path / "key-2.pem").write_bytes(jwt_keys.generate_private_key_pem("RS256"))
+        monkeypatch.setattr(security, "key_ring", jwt_keys.KeyRing("RS256", str(tmp_path), "key-2"))
+        new_token = security.create_access_token(data={ "id": 2 })
+
+        assert security.jwt.get_unverified_header(new_token)['kid'] == "key-2"
+        assert security.verify_token(old_token)['id'] == 1
+        assert security.verify_token(new_token)['id'] == 2
+        assert sorted(key['kid'] for key in client.get("/.well-known/jwks.json").json()['keys']) == ["key-1", "key-2"]
+
+        # Sem a chave antiga no chaveiro os tokens dela deixam de ser aceitos
+        (tmp_path / "key-1.pem").unlink()
+        monkeypatch.setattr(security, "key_ring", jwt_keys.KeyRing("RS256", str(tmp_path)))
+        security.token_cache.clear()
+        with pytest.raises(HTTPException):
+            security.verify_token(old_token)
+
+    # OUTBOX DE EMAILS
+    @pytest.mark.asyncio
+    async def test_email_outbox_delivery(self, setup, mocker, monkeypatch):
+        # Os cadastros do setup gravaram os emails de verificacao no outbox, sem enviar na requisicao
+        send_batch = mocker.patch('src.utils.send_mail.send_batch', new_callable=mocker.AsyncMock, side_effect=lambda messages: [None] * len(messages))
+        assert await email_outbox.process_batch(100) >= 4
+        assert send_batch.call_count == 1
+        assert valid_user_active_admin['email'] in [message.recipients[0] for message in send_batch.call_args.args[0]]
+        assert email_outbox.status()['messages'].get('PENDING', 0) == 0
+
+        # Mensagens entregues nao guardam mais o codigo
+        with engine.connect() as connection:
+            payloads = connection.execute(text("SELECT payload FROM email_outbox WHERE status = 'SENT'")).scalars().all()
+        assert payloads and all(json.loads(payload) == {} for payload in payloads)
+
+        # Falhas sao retentadas com backoff e, esgotadas as tentativas, vao para dead-letter
+        monkeypatch.setattr(email_outbox, "EMAIL_OUTBOX_MAX_ATTEMPTS", 2)
+        mocker.patch('src.utils.send_mail.send_batch', new_callable=mocker.AsyncMock, side_effect=lambda messages: [ConnectionError("smtp fora do ar")] * len(messages))
+        db = SessionLocal()
+        message = emailOutboxRepository.add_message(db, enumeration.EmailKind.RESET_PASSWORD_CODE, "dead@email.com", { "code": 111111 })
+        db.commit()
+        message_id = message.id
+        db.close()
+
+        assert await email_outbox.process_batch() == 1
+        assert await email_outbox.process_batch() == 0
+
+        with engine.connect() as connection:
+            connection.execute(text("UPDATE email_outbox SET next_attempt_at = '2000-01-01' WHERE id = :id"), {"id": message_id})
+            connection.commit()
+
+        assert await email_outbox.process_batch() == 1
+        with engine.connect() as connection:
+            status, attempts = connection.execute(text("SELECT status, attempts FROM email_outbox WHERE id = :id"), {"id": message_id}).one()
+        assert status == 'DEAD'
+        assert attempts == 2
+
+        # Limpeza por retencao: SENT/DEAD antigas saem, pendentes ficam
+        db = SessionLocal()
+        pending = emailOutboxRepository.add_message(db, enumeration.EmailKind.RESET_PASSWORD_CODE, "pending@email.com", { "code": 222222 })
+        db.commit()
+        pending_id = pending.id
+        db.close()
+        with engine.connect() as connection:
+            connection.execute(text("UPDATE email_outbox SET created_at = '2000-01-01'"))
+            connection.commit()
+
+        assert await email_outbox.purge_expired(force=True) >= 2
+        with engine.connect() as connection:
+            remaining = connection.execute(text("SELECT id, status FROM email_outbox")).all()
+            connection.execute(text("DELETE FROM email_outbox WHERE id = :id"), {"id": pending_id})
+            connection.commit()
+        assert remaining == [(pending_id, 'PENDING')]
+
+    @pytest.mark.asyncio
+    async def test_email_outbox_locale(self, setup, mocker):
+        # O idioma do Accept-Language vai no payload do outbox e escolhe o template no envio
+        email = "locale@email.com"
+        send_batch = mocker.patch('src.utils.send_mail.send_batch', new_callable=mocker.AsyncMock, side_effect=lambda messages: [None] * len(messages))
+        response = client.post("/api/auth/register", json={"name": "Locale", "email": email, "connection": "ESTUDANTE", "password": "123456"}, headers={"Accept-Language": "en-US,en;q=0.9,pt-BR;q=0.8"})
+        assert response.status_code == 201
+        try:
+            assert await email_outbox.process_batch(100) >= 1
+            message = next(message for message in send_batch.call_args.args[0] if message.recipients[0] == email)
+            assert message.subject == "Confirm your UnB-TV account"
+        finally:
+            db = SessionLocal()
+            try:
+                userRepository.delete_user(db, userRepository.get_user_by_email(db, email))
+            finally:
+                db.close()
+
+    # RATE LIMIT
+    def test_login_rate_limit(self, setup, mocker, monkeypatch):
+        monkeypatch.setitem(rate_limit.limiter.limits, "login", { "ip": rate_limit.Rate(100, 60), "email": rate_limit.Rate(3, 60) })
+        get_user = mocker.spy(userRepositoryAsync, 'get_user_credentials')
+        try:
+            for _ in range(3):
+                response = client.post("/api/auth/login", json={"email": "ratelimit@email.com", "password": "123456"})
+                assert response.status_code == 404
+
+            # A tentativa excedente e rejeitada antes de consultar o banco
+            response = client.post("/api/auth/login", json={"email": "RateLimit@email.com", "password": "123456"})
+            assert response.status_code == 429
+            assert response.json()['detail'] == errorMessages.TOO_MANY_ATTEMPTS
+            assert int(response.headers['retry-after']) >= 1
+            assert get_user.call_count == 3
+
+            # Outro email continua liberado
+            response = client.post("/api/auth/login", json={"email": "other-ratelimit@email.com", "password": "123456"})
+            assert response.status_code == 404
+
+            response = client.get("/metrics")
+            assert 'rate_limit_rejected_total{route="login"} 1' in response.text.splitlines()
+        finally:
+            rate_limit.limiter.reset()
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_sliding_window(self):
+        limiter = rate_limit.RateLimiter(rate_limit.MemoryBackend(), {})
+        rate = rate_limit.Rate(4, 60)
+
+        # 4 tentativas no fim da janela 0
+        for _ in range(4):
+            assert await limiter.hit("key", rate, now=50) == 0
+        assert await limiter.hit("key", rate, now=55) > 0
+
+        # No inicio da janela 1 a anterior ainda pesa quase inteira; na metade ja cabem novas tentativas
+        assert await limiter.hit("key", rate, now=61) > 0
+        assert await limiter.hit("key", rate, now=100) == 0
+
+        # Duas janelas depois os contadores antigos nao contam mais
+        assert await limiter.hit("key", rate, now=200) == 0
+
+    def test_dotenv_invalid_rate_limit(self, monkeypatch):
+        monkeypatch.setenv("RATE_LIMIT_LOGIN_EMAIL", "10 por minuto")
+        monkeypatch.setenv("RATE_LIMIT_BACKEND", "memcached")
+
+        with pytest.raises(EnvironmentError) as error:
+            dotenv.validate_dotenv()
+
+        assert "RATE_LIMIT_LOGIN_EMAIL" in str(error.value)
+        assert "RATE_LIMIT_BACKEND" in str(error.value)
+
+    # CACHE DE USUARIOS
+    def test_user_cache(self, setup):
+        userCache.clear()
+        db = SessionLocal()
+        try:
+            user = userRepository.get_user_by_email(db, valid_user_active_user['email'])
+            db.expunge_all()
+
+            # Segunda busca (por email e por id) vem do cache, sem consulta
+            with count_queries() as queries:
+                cached = userRepository.get_user_by_email(db, valid_user_active_user['email'])
+                assert userRepository.get_user(db, user.id) is cached
+            assert queries == []
+            assert cached.name == valid_user_active_user['name']
+            assert userCache.status()['hits'] == 2
+
+            # Escritas sobre o usuario vindo do cache funcionam e invalidam a entrada
+            userRepository.update_user_role(db, cached, "COADMIN")
+            db.expunge_all()
+            assert userRepository.get_user(db, user.id).role == "COADMIN"
+            userRepository.update_user_role(db, userRepository.get_user(db, user.id), "USER")
+        finally:
+            db.close()
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert 'cache_lookups_total{cache="user",result="hit"}' in response.text
+
+    def test_user_cache_credentials(self, setup):
+        # Senha e codigos nao ficam no cache: login e verificacao do reset leem o valor atual do banco
+        email = valid_user_active_user['email']
+        userCache.clear()
+        db = SessionLocal()
+        try:
+            user = userRepository.get_user_by_email(db, email)
+            snapshot = userCache.user_cache.get(f"user:id:{user.id}")
+            assert snapshot['email'] == email
+            assert not set(userCache.CREDENTIAL_COLUMNS) & set(snapshot)
+
+            with engine.connect() as connection:
+                old_password = connection.execute(text("SELECT password FROM users WHERE id = :id"), {"id": user.id}).scalar()
+                # Alteracao feita por outro worker: o cache deste processo nao e invalidado
+                connection.execute(text("UPDATE users SET password = :password, password_reset_code = 555555 WHERE id = :id"), {"password": security.get_password_hash("999999"), "id": user.id})
+                connection.commit()
+            try:
+                response = client.post("/api/auth/login", json={"email": email, "password": valid_user_active_user['password']})
+                assert response.status_code == 404
+                response = client.post("/api/auth/login", json={"email": email, "password": "999999"})
+                assert response.status_code == 200
+                response = client.post("/api/auth/reset-password/verify", json={"email": email, "code": 555555})
+                assert response.status_code == 200
+            finally:
+                with engine.connect() as connection:
+                    connection.execute(text("UPDATE users SET password = :password, password_reset_code = NULL WHERE id = :id"), {"password": old_password, "id": user.id})
+                    connection.commit()
+        finally:
+            db.close()
+            userCache.clear()
+            rate_limit.limiter.reset()
+
+    # ROLE NO TOKEN
+    def test_require_roles_claims(self, setup):
+        headers = {'Authorization': f'Bearer {TestAuth.__admin_access_token__}'}
+        payload = security.verify_token(TestAuth.__admin_access_token__)
+        assert payload['role'] == 'ADMIN'
+
+        # Com o admin no cache a rota de admin faz apenas a consulta do usuario alvo
+        client.patch("/api/users/role/999", headers=headers)
+        with count_queries() as queries:
+            response = client.patch("/api/users/role/999", headers=headers)
+        assert response.status_code == 404
+        assert len(queries) == 1
+
+        # Token sem a role ADMIN e rejeitado sem consultar o banco
+        with count_queries() as queries:
+            response = client.patch("/api/users/role/999", headers={'Authorization': f'Bearer {TestAuth.__user_access_token__}'})
+        assert response.status_code == 401
+        assert response.json()['detail'] == errorMessages.NO_PERMISSION
+        assert queries == []
+
+        # Trocar a role incrementa token_version e revoga os tokens emitidos antes
+        db = SessionLocal()
+        try:
+            admin = userRepository.get_user(db, payload['id'])
+            userRepository.update_user_role(db, admin, "ADMIN")
+            assert admin.token_version == payload.get('ver', 0) + 1
+        finally:
+            db.close()
+
+        response = client.patch("/api/users/role/999", headers=headers)
+        assert response.status_code == 401
+        assert response.json()['detail'] == errorMessages.INVALID_TOKEN
+
+        response = client.post("/api/auth/login", json={"email": valid_user_active_admin['email'], "password": valid_user_active_admin['password']})
+        TestAuth.__admin_access_token__ = response.json()['access_token']
+        response = client.patch("/api/users/role/999", headers={'Authorization': f'Bearer {TestAuth.__admin_access_token__}'})
+        assert response.status_code == 404
+
+    # ROUND TRIPS DAS ESCRITAS
+    def test_write_endpoints_query_count(self, setup):
+        # Cada escrita e um unico comando (sem SELECT de refresh apos o commit). O cache de usuarios e
+        # limpo antes de cada requisicao para a busca inicial sempre ir ao banco
+        email = "roundtrip@unb.br"
+        admin_headers = {'Authorization': f'Bearer {TestAuth.__admin_access_token__}'}
+
+        def measure(method, url, **kwargs):
+            userCache.clear()
+            with count_queries() as queries:
+                response = client.request(method, url, **kwargs)
+            assert response.status_code in [200, 201], response.text
+            # Nenhum SELECT depois da primeira escrita
+            first_write = next(index for index, query in enumerate(queries) if not query.lstrip().upper().startswith("SELECT"))
+            assert all(not query.lstrip().upper().startswith("SELECT") for query in queries[first_write:]), queries
+            return response, len(queries)
+
+        # busca por email + INSERT do usuario + INSERT do email no outbox
+        _, queries = measure("POST", "/api/auth/register", json={"name": "Round Trip", "email": email, "connection": "ESTUDANTE", "password": "123456"})
+        assert queries == 3
+        # UPDATE condicional (confere o codigo e ativa) sem leitura previa
+        _, queries = measure("PATCH", "/api/auth/activate-account", json={"email": email, "code": 123456})
+        assert queries == 1
+        _, queries = measure("POST", "/api/auth/reset-password/request", json={"email": email})
+        assert queries == 3
+        # leitura do reset code (antes do hash) + UPDATE condicional
+        _, queries = measure("PATCH", "/api/auth/reset-password/change", json={"email": email, "password": "654321", "code": 123456})
+        assert queries == 2
+        _, queries = measure("POST", "/api/auth/admin-setup", json={"email": email})
+        assert queries == 2
+
+        response, queries = measure("POST", "/api/auth/login/social", json={"name": "Round Trip Social", "email": "roundtrip-social@email.com"})
+        assert queries == 2
+        user_id = response.json()['user_id']
+
+        _, queries = measure("PATCH", f"/api/users/{user_id}", json={"name": "Round Trip Social 2"}, headers=admin_headers)
+        assert queries == 2
+        # token_version do admin + usuario alvo + UPDATE ... RETURNING
+        _, queries = measure("PATCH", f"/api/users/role/{user_id}", headers=admin_headers)
+        assert queries == 3
+        _, queries = measure("DELETE", f"/api/users/{user_id}", headers=admin_headers)
+        assert queries == 2
+
+        # Remove o usuario criado para nao alterar os totais usados em test_user
+        db = SessionLocal()
+        try:
+            userRepository.delete_user(db, userRepository.get_user_by_email(db, email))
+        finally:
+            db.close()
+
+    # ATIVACAO E TROCA DE SENHA ATOMICAS
+    def test_auth_reset_password_change(self, setup):
+        email = valid_user_active_user['email']
+        response = client.patch("/api/auth/reset-password/change", json={"email": email, "password": "654321", "code": 123456})
+        assert response.status_code == 401
+        assert response.json()['detail'] == errorMessages.INVALID_REQUEST
+
+        response = client.post("/api/auth/reset-password/request", json={"email": email})
+        assert response.status_code == 200
+
+        response = client.patch("/api/auth/reset-password/change", json={"email": email, "password": "654321", "code": 111111})
+        assert response.status_code == 400
+        assert response.json()['detail'] == errorMessages.INVALID_RESET_PASSWORD_CODE
+
+        response = client.patch("/api/auth/reset-password/change", json={"email": "nobody@email.com", "password": "654321", "code": 123456})
+        assert response.status_code == 404
+
+        # Senha vazia e recusada antes de qualquer hash
+        response = client.patch("/api/auth/reset-password/change", json={"email": email, "password": "", "code": 123456})
+        assert response.status_code == 400
+        assert response.json()['detail'] == errorMessages.INVALID_PASSWORD
+
+        response = client.patch("/api/auth/reset-password/change", json={"email": email, "password": valid_user_active_user['password'], "code": 123456})
+        assert response.status_code == 200
+        assert response.json()['email'] == email
+
+        # O codigo e consumido pelo mesmo UPDATE que troca a senha
+        response = client.patch("/api/auth/reset-password/change", json={"email": email, "password": "654321", "code": 123456})
+        assert response.status_code == 401
+        response = client.post("/api/auth/login", json={"email": email, "password": valid_user_active_user['password']})
+        assert response.status_code == 200
+
+    def test_activate_account_with_code_single_use(self, setup):
+        db = SessionLocal()
+        try:
+            user = userRepository.create_user(db, name="Atomic", connection="ESTUDANTE", email="atomic@email.com", password=None, activation_code=222222)
+            assert not userRepository.activate_account_with_code(db, "atomic@email.com", 333333)
+            assert userRepository.activate_account_with_code(db, "atomic@email.com", 222222)
+            # Segunda requisicao com o mesmo codigo (ex: concorrente) nao ativa de novo
+            assert not userRepository.activate_account_with_code(db, "atomic@email.com", 222222)
+            assert userRepository.get_user(db, user.id).is_active
+            userRepository.delete_user(db, user)
+        finally:
+            db.close()
@@ -0,0 +1,54 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.utils import cors
+
+client = TestClient(app)
+
+def build_client(**options) -> TestClient:
+    cors_app = FastAPI()
+
+    @cors_app.get("/")
+    def read_root():
+        return {}
+
+    cors_app.add_middleware(cors.CORSMiddleware, **options)
+    return TestClient(cors_app)
+
+class TestCORS:
+    def test_cors_simple_request(self):
+        response = client.get("/", headers={"Origin": "http://localhost:4200"})
+        assert response.status_code == 200
+        assert response.headers['access-control-allow-origin'] == "http://localhost:4200"
+        assert response.headers['access-control-allow-credentials'] == "true"
+        assert response.headers['access-control-expose-headers'] == "*"
+        assert response.headers['vary'] == "Origin"
+
+    def test_cors_without_origin(self):
+        response = client.get("/")
+        assert 'access-control-allow-origin' not in response.headers
+
+    def test_cors_preflight(self):
+        headers = {"Origin": "http://localhost:4200", "Access-Control-Request-Method": "PATCH", "Access-Control-Request-Headers": "authorization, content-type"}
+        for _ in range(2):
+            response = client.options("/api/users/1", headers=headers)
+            assert response.status_code == 200
+            assert response.headers['access-control-allow-origin'] == "http://localhost:4200"
+            assert response.headers['access-control-allow-headers'] == "authorization, content-type"
+            assert "PATCH" in response.headers['access-control-allow-methods']
+
+    def test_cors_disallowed_origin(self):
+        cors_client = build_client(allow_origins=["http://localhost:4200"], allow_headers=["Authorization"])
+
+        response = cors_client.get("/", headers={"Origin": "http://evil.com"})
+        assert response.status_code == 200
+        assert 'access-control-allow-origin' not in response.headers
+
+        response = cors_client.options("/", headers={"Origin": "http://evil.com", "Access-Control-Request-Method": "GET"})
+        assert response.status_code == 400
+        assert response.text == "Disallowed CORS origin"
+
+        response = cors_client.options("/", headers={"Origin": "http://localhost:4200", "Access-Control-Request-Method": "GET", "Access-Control-Request-Headers": "x-custom"})
+        assert response.status_code == 400
+        assert response.text == "Disallowed CORS headers"
@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.utils import metrics, security
+
+client = TestClient(app)
+
+class TestMetrics:
+    def test_metrics_histogram(self):
+        histogram = metrics.Histogram("test_duration_seconds", "Teste", ("route",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, "/a")
+        histogram.observe(0.1, "/a")
+        histogram.observe(5, "/a")
+
+        lines = histogram.render().splitlines()
+        assert lines[:2] == ["# HELP test_duration_seconds Teste", "# TYPE test_duration_seconds histogram"]
+        assert lines[2:] == [
+            'test_duration_seconds_bucket{route="/a",le="0.1"} 2',
+            'test_duration_seconds_bucket{route="/a",le="1"} 2',
+            'test_duration_seconds_bucket{route="/a",le="+Inf"} 3',
+            'test_duration_seconds_sum{route="/a"} 5.15',
+            'test_duration_seconds_count{route="/a"} 3',
+        ]
+
+    def test_metrics_label_escaping(self):
+        counter = metrics.Counter("test_total", "Teste", ("value",))
+        counter.inc('a"b\\c\n')
+        assert counter.render().splitlines()[-1] == 'test_total{value="a\\"b\\\\c\\n"} 1'
+
+    def test_metrics_http_requests(self):
+        before = metrics.http_requests_total.value("GET", "/api/users/{user_id}", "401")
+        client.get("/api/users/1")
+        client.get("/api/users/2")
+        assert metrics.http_requests_total.value("GET", "/api/users/{user_id}", "401") == before + 2
+        assert metrics.http_request_duration_seconds.count("GET", "/api/users/{user_id}") >= 2
+        assert metrics.http_requests_in_flight.value("GET") == 0
+
+        client.get("/nao-existe")
+        assert metrics.http_requests_total.value("GET", "unmatched", "404") >= 1
+
+    def test_metrics_endpoint(self):
+        client.get("/")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'text/plain; version=0.0.4; charset=utf-8'
+        assert '# TYPE http_request_duration_seconds histogram' in response.text
+        assert 'http_requests_total{method="GET",route="/",status="200"}' in response.text
+        assert 'db_query_duration_seconds_count{operation="SELECT"}' in response.text
+
+    def test_metrics_runtime_collectors(self):
+        response = client.get("/metrics")
+        lines = response.text.splitlines()
+        assert 'worker_pool_workers{pool="password-hash"} ' + str(security.password_hash_pool.workers) in lines
+        assert 'worker_pool_tasks{pool="password-hash",state="queued"} 0' in lines
+        assert 'cache_lookups_total{cache="token",result="hit"} ' + str(security.token_cache.hits) in lines
+        assert '# TYPE email_outbox_messages gauge' in lines
+        assert any(line.startswith('smtp_pool_connections{state="idle"}') for line in lines)
+        assert any(line.startswith('db_pool_connections{engine="sync",') for line in lines)
+
+    def test_metrics_json_endpoints_removed(self):
+        for path in ["db-pool", "password-hash", "token-cache", "email-outbox", "user-cache", "rate-limit"]:
+            assert client.get(f"/metrics/{path}").status_code == 404
@@ -0,0 +1,47 @@
+import logging
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.utils import query_log
+
+client = TestClient(app)
+
+class TestQueryLog:
+    def test_query_log_debug_headers(self, monkeypatch):
+        monkeypatch.setattr(query_log, "SQL_DEBUG_HEADERS", True)
+        response = client.post("/api/auth/login", json={"email": "nao-existe@email.com", "password": "123456"})
+        assert int(response.headers['x-db-query-count']) >= 1
+        assert float(response.headers['x-db-time-ms']) >= 0
+
+        response = client.get("/")
+        assert response.headers['x-db-query-count'] == "0"
+
+        monkeypatch.setattr(query_log, "SQL_DEBUG_HEADERS", False)
+        assert 'x-db-query-count' not in client.get("/").headers
+
+    def test_query_log_budget_and_n_plus_one(self, monkeypatch, caplog):
+        monkeypatch.setattr(query_log, "SQL_QUERY_BUDGET", 0)
+        monkeypatch.setattr(query_log, "SQL_N_PLUS_ONE_THRESHOLD", 1)
+        before = query_log.db_query_budget_exceeded_total.value("POST", "/api/auth/login")
+
+        with caplog.at_level(logging.WARNING, logger=query_log.__name__):
+            client.post("/api/auth/login", json={"email": "nao-existe@email.com", "password": "123456"})
+
+        assert query_log.db_query_budget_exceeded_total.value("POST", "/api/auth/login") == before + 1
+        assert any("SQL_QUERY_BUDGET=0" in record.getMessage() for record in caplog.records)
+        assert any("Possivel N+1 em POST /api/auth/login" in record.getMessage() for record in caplog.records)
+
+    def test_query_log_slow_query(self, monkeypatch, caplog):
+        monkeypatch.setattr(query_log, "SQL_SLOW_QUERY_MS", 0)
+        with caplog.at_level(logging.WARNING, logger=query_log.__name__):
+            client.post("/api/auth/login", json={"email": "segredo@email.com", "password": "123456"})
+
+        messages = [record.getMessage() for record in caplog.records if "Consulta lenta" in record.getMessage()]
+        assert messages
+        assert "'str'" in messages[0]
+        assert all("segredo@email.com" not in message for message in messages)
+
+    def test_query_log_parameter_shape(self):
+        assert query_log.parameter_shape({"email": "a@b.com", "id": 1}) == {"email": "str", "id": "int"}
+        assert query_log.parameter_shape(("a", 1)) == ["str", "int"]
+        assert query_log.parameter_shape([{"id": 1}, {"id": 2}], executemany=True) == {"rows": 2, "row": {"id": "int"}}
@@ -1,7 +1,8 @@
-import pytest
+import pytest, socket
 from unittest.mock import patch, AsyncMock
 from fastapi.testclient import TestClient
-from src.utils.send_mail import send_verification_code
+from src.utils.email_templates import templates
+from src.utils.send_mail import send_verification_code, verification_code_message, reset_password_code_message, PooledFastMail, SMTPConnectionPool
 
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
 
@@ -12,8 +13,8 @@ client = TestClient(app)
 class TestSendVerificationCode:
     @pytest.mark.asyncio
     @patch('src.utils.send_mail.fm.send_message', new_callable=AsyncMock)
-    @patch('os.getenv', return_value='http://testurl.com')
-    async def test_send_verification_code_success(self, mock_getenv, mock_send_message):
+    @patch.dict(templates.environment.globals, {"deploy_url": "http://testurl.com"})
+    async def test_send_verification_code_success(self, mock_send_message):
         email = "testuser@email.com"
         code = 123456
         is_unb = False
@@ -24,19 +25,19 @@ class TestSendVerificationCode:
         assert response.body.decode() == '{"status":"success"}'
 
         expected_html = f"<p>Seja bem-vindo ao UnB-TV! Para confirmar a criação da sua conta, utilize o código <strong>{code}</strong></p>"
-        mock_send_message.assert_called_once_with(
-            MessageSchema(
-                subject="Confirme a criação da sua conta",
-                recipients=[email],
-                body=expected_html,
-                subtype=MessageType.html
-            )
-        )
+        mock_send_message.assert_called_once()
+        message = mock_send_message.call_args.args[0]
+        assert message.subject == "Confirme a criação da sua conta"
+        assert message.recipients == [email]
+        assert message.body == expected_html
+        assert message.subtype == MessageType.html
+        assert str(code) in message.alternative_body
+        assert "adminActivate" not in message.alternative_body
 
     @pytest.mark.asyncio
     @patch('src.utils.send_mail.fm.send_message', new_callable=AsyncMock)
-    @patch('os.getenv', return_value='http://testurl.com')
-    async def test_send_verification_code_is_unb(self, mock_getenv, mock_send_message):
+    @patch.dict(templates.environment.globals, {"deploy_url": "http://testurl.com"})
+    async def test_send_verification_code_is_unb(self, mock_send_message):
         email = "testuser@unb.edu.br"
         code = 123456
         is_unb = True
@@ -51,11 +52,102 @@ class TestSendVerificationCode:
                          f"<p>Como usuário da UnB, você pode configurar uma senha de administrador acessando o "
                          f"seguinte link após ativar sua conta: <a href='http://testurl.com/adminActivate?email={email}'>"
                          f"Configurar Senha de Administrador</a></p>")
-        mock_send_message.assert_called_once_with(
-            MessageSchema(
-                subject="Confirme a criação da sua conta",
-                recipients=[email],
-                body=expected_html,
-                subtype=MessageType.html
-            )
-        )
\ No newline at end of file
+        message = mock_send_message.call_args.args[0]
+        assert message.subject == "Confirme a criação da sua conta"
+        assert message.body == expected_html
+        assert f"http://testurl.com/adminActivate?email={email}" in message.alternative_body
+
+    def test_verification_code_message_locale(self):
+        message = verification_code_message("testuser@email.com", 123456, locale="en")
+        assert message.subject == "Confirm your UnB-TV account"
+        assert "123456" in message.body and "123456" in message.alternative_body
+
+        # Locale sem templates usa o idioma padrao
+        fallback = verification_code_message("testuser@email.com", 123456, locale="xx")
+        assert fallback.subject == "Confirme a criação da sua conta"
+
+    def test_negotiate_locale(self):
+        assert templates.negotiate("en-US,en;q=0.9") == "en"
+        assert templates.negotiate("pt-BR") == "pt_BR"
+        assert templates.negotiate("pt") == "pt_BR"
+        assert templates.negotiate("fr, en;q=0.5, pt-BR;q=0.8") == "pt_BR"
+        assert templates.negotiate("en;q=0, fr") is None
+        assert templates.negotiate("*") is None
+        assert templates.negotiate(None) is None
+
+    def test_reset_password_code_message(self):
+        message = reset_password_code_message("testuser@email.com", 654321)
+        assert "654321" in message.body
+        assert "654321" in message.alternative_body
+
+class SMTPStandIn:
+    def __init__(self):
+        self.messages = []
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+@pytest.fixture
+def smtp_server():
+    from aiosmtpd.controller import Controller
+
+    # Porta livre escolhida pelo sistema operacional
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    handler = SMTPStandIn()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+def build_pool(port, **options):
+    config = ConnectionConfig(MAIL_USERNAME="unbtv", MAIL_PASSWORD="senha", MAIL_FROM="unbtv@email.com", MAIL_PORT=port, MAIL_SERVER="127.0.0.1",
+                              MAIL_STARTTLS=False, MAIL_SSL_TLS=False, USE_CREDENTIALS=False, VALIDATE_CERTS=False)
+    return PooledFastMail(config, SMTPConnectionPool(config, **options))
+
+class TestSMTPConnectionPool:
+    @pytest.mark.asyncio
+    async def test_send_batch_reuses_connections(self, smtp_server):
+        handler, port = smtp_server
+        mailer = build_pool(port, max_connections=2, max_messages_per_connection=2)
+
+        messages = [verification_code_message(f"user{i}@email.com", 123456) for i in range(5)]
+        results = await mailer.send_messages(messages)
+
+        assert results == [None] * 5
+        assert [envelope.rcpt_tos for envelope in handler.messages] == [[f"user{i}@email.com"] for i in range(5)]
+        # 5 mensagens com no maximo 2 por conexao: 3 sessoes SMTP em vez de 5
+        assert mailer.pool.opened == 3
+
+        # A conexao ainda ociosa e reaproveitada no proximo envio
+        await mailer.send_message(reset_password_code_message("user0@email.com", 654321))
+        assert mailer.pool.opened == 3
+        assert mailer.pool.status()['idle'] == 0
+        await mailer.pool.close()
+
+    @pytest.mark.asyncio
+    async def test_idle_connections_are_reaped(self, smtp_server):
+        handler, port = smtp_server
+        mailer = build_pool(port, idle_timeout=0)
+
+        await mailer.send_message(verification_code_message("user@email.com", 123456))
+        assert mailer.pool.status()['idle'] == 1
+
+        await mailer.pool.reap_idle()
+        assert mailer.pool.status()['idle'] == 0
+
+    @pytest.mark.asyncio
+    async def test_unreachable_server_fails_every_message(self):
+        mailer = build_pool(1)
+        results = await mailer.send_messages([verification_code_message("user@email.com", 123456)] * 3)
+        assert len(results) == 3
+        assert all(isinstance(error, Exception) for error in results)
@@ -1,16 +1,20 @@
 import sys
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 
 # Adiciona o caminho do diretório 'src' ao sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 
-import pytest
+import pytest, csv, io, json
 from fastapi.testclient import TestClient
 
 from src.main import app
 from src.constants import errorMessages
-from src.database import get_db, engine, Base
+from src.controller import userController
+from src.database import get_db, engine, Base, SessionLocal
+from src.model import emailOutboxModel
+from src.repository import userRepository, userSearch
+from src.utils import bulk_import, security, user_export, worker_pool
 from tests import test_auth
 
 valid_user_active_admin = test_auth.valid_user_active_admin
@@ -93,7 +97,123 @@ class TestUser:
     assert response.status_code == 200
     assert len(data) == 1
     assert response.headers['x-total-count'] == '1'
-        
+
+  # Get Users - Cursor (keyset)
+  def test_user_get_users_cursor_pagination(self, setup):
+    headers={'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
+    expected = [u['id'] for u in client.get("/api/users/", headers=headers).json()]
+
+    response = client.get("/api/users/?limit=2", headers=headers)
+    assert response.status_code == 200
+    assert 'x-prev-cursor' not in response.headers
+    pages = [response]
+
+    while 'x-next-cursor' in pages[-1].headers:
+      response = client.get(f"/api/users/?limit=2&after={pages[-1].headers['x-next-cursor']}", headers=headers)
+      assert response.status_code == 200
+      assert response.headers['x-total-count'] == str(total_registed_users)
+      pages.append(response)
+
+    assert [u['id'] for page in pages for u in page.json()] == expected
+
+    # Volta da ultima pagina para a anterior
+    response = client.get(f"/api/users/?limit=2&before={pages[-1].headers['x-prev-cursor']}", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == pages[-2].json()
+
+  def test_user_get_users_invalid_cursor(self, setup):
+    headers={'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
+    response = client.get("/api/users/?after=invalido", headers=headers)
+    data = response.json()
+
+    assert response.status_code == 400
+    assert data['detail'] == errorMessages.INVALID_CURSOR
+
+  # Get Users - Busca por nome ou email
+  def test_user_get_users_search(self, setup):
+    headers={'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
+
+    # Termos a partir do tamanho minimo buscam por substring
+    response = client.get("/api/users/?name_or_email=orse", headers=headers)
+    assert response.status_code == 200
+    assert [u['email'] for u in response.json()] == [valid_user_active_admin['email']]
+
+    # Termos curtos buscam apenas por prefixo
+    response = client.get("/api/users/?name_or_email=rs", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == []
+
+    # Curingas do LIKE são tratados como texto
+    response = client.get("/api/users/?name_or_email=%25%25%25", headers=headers)
+    assert response.status_code == 200
+    assert response.headers['x-total-count'] == '0'
+
+  # Get Users - Busca ranqueada com cursor
+  # Busca ranqueada (pg_trgm) paginada pelos cursores: mesma ordem da listagem completa por (rank, name, id)
+  def test_user_get_users_ranked_search_cursor(self, setup, monkeypatch):
+    headers={'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
+
+    # Funcoes do pg_trgm emuladas no SQLite. O rank depende so do tamanho do email, entao ha empates
+    def register_functions(dbapi_connection, connection_record):
+      dbapi_connection.create_function("similarity", 2, lambda value, term: len(term) / len(value) if term in value.lower() else 0.0)
+      dbapi_connection.create_function("greatest", 2, max)
+
+    event.listen(engine, "connect", register_functions)
+    engine.dispose()
+    monkeypatch.setattr(userSearch, "has_trigram_support", lambda db: True)
+    try:
+      expected = client.get("/api/users/?name_or_email=valid", headers=headers).json()
+      assert len(expected) >= 3
+      ranks = [len("valid") / len(user['email']) for user in expected]
+      assert ranks == sorted(ranks, reverse=True)
+
+      pages = [client.get("/api/users/?name_or_email=valid&limit=1", headers=headers)]
+      while 'x-next-cursor' in pages[-1].headers:
+        pages.append(client.get(f"/api/users/?name_or_email=valid&limit=1&after={pages[-1].headers['x-next-cursor']}", headers=headers))
+      assert [user for page in pages for user in page.json()] == expected
+
+      response = client.get(f"/api/users/?name_or_email=valid&limit=1&before={pages[-1].headers['x-prev-cursor']}", headers=headers)
+      assert response.json() == pages[-2].json()
+
+      # Cursor de listagem sem ranqueamento nao vale para a busca ranqueada
+      cursor = client.get("/api/users/?limit=1", headers=headers).headers['x-next-cursor']
+      response = client.get(f"/api/users/?name_or_email=valid&limit=1&after={cursor}", headers=headers)
+      assert response.status_code == 400
+      assert response.json()['detail'] == errorMessages.INVALID_CURSOR
+    finally:
+      event.remove(engine, "connect", register_functions)
+      engine.dispose()
+
+  # Get Users - Estrategias de contagem
+  def test_user_get_users_count_strategies(self, setup):
+    headers={'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
+
+    response = client.get("/api/users/", headers=headers)
+    assert response.headers['x-total-count-type'] == 'exact'
+
+    response = client.get("/api/users/?count=none", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == total_registed_users
+    assert 'x-total-count' not in response.headers
+    assert response.headers['x-total-count-type'] == 'none'
+
+    response = client.get("/api/users/?count=cached&connection=PROFESSOR", headers=headers)
+    assert response.headers['x-total-count'] == '1'
+    assert response.headers['x-total-count-type'] == 'cached'
+
+    # SQLite não possui estatisticas do planner, então a estimativa cai para a contagem exata
+    response = client.get("/api/users/?count=estimated", headers=headers)
+    assert response.headers['x-total-count'] == str(total_registed_users)
+    assert response.headers['x-total-count-type'] in ['estimated', 'exact']
+
+  def test_user_get_users_invalid_count_strategy(self, setup):
+    headers={'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
+    response = client.get("/api/users/?count=invalido", headers=headers)
+    data = response.json()
+
+    assert response.status_code == 400
+    assert data['detail'] == errorMessages.INVALID_COUNT_STRATEGY
+
   # Read User
   def test_user_read_user_not_found(self, setup):
     headers={'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
@@ -223,4 +343,209 @@ class TestUser:
     assert data['connection'] == valid_user_to_be_deleted['connection']
     assert data['email'] == valid_user_to_be_deleted['email']
     assert data['role'] == 'USER'
-    assert data['is_active'] == False
\ No newline at end of file
+    assert data['is_active'] == False
+  # Importacao em lote
+  def test_user_import_csv(self, setup):
+    headers = {'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}', 'Content-Type': 'text/csv'}
+    body = (
+      "name,connection,email,password\n"
+      "Import One,ESTUDANTE,import1@unb.br,123456\n"
+      "Import Two,PROFESSOR,import2@email.com,654321\n"
+      "\n"
+      "Invalid Connection,INVALID,import3@email.com,123456\n"
+      "Invalid Password,ESTUDANTE,import4@email.com,12ab\n"
+      f"Existing,ESTUDANTE,{valid_user_active_admin['email']},123456\n"
+      "Repeated,ESTUDANTE,import1@unb.br,123456\n"
+      "Missing,Columns\n"
+    )
+    response = client.post("/api/users/import", content=body.encode(), headers=headers)
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data['created'] == 2
+    assert data['failed'] == 5
+    errors = { row['row']: row['error'] for row in data['rows'] }
+    assert errors[2] is None and errors[3] is None
+    assert errors[5] == errorMessages.INVALID_CONNECTION
+    assert errors[6] == errorMessages.INVALID_PASSWORD
+    assert errors[7] == errorMessages.EMAIL_ALREADY_REGISTERED
+    assert errors[8] == errorMessages.DUPLICATED_IMPORT_EMAIL
+    assert errors[9] == errorMessages.INVALID_IMPORT_ROW
+
+    # Usuarios criados inativos, com o email de ativacao no outbox
+    db = SessionLocal()
+    try:
+      imported = [userRepository.get_user_by_email(db, email) for email in ["import1@unb.br", "import2@email.com"]]
+      assert all(not user.is_active and user.activation_code for user in imported)
+      assert security.verify_password("123456", imported[0].password)
+      outbox = db.query(emailOutboxModel.EmailOutbox).filter(emailOutboxModel.EmailOutbox.email == "import1@unb.br").one()
+      assert outbox.payload == { "code": imported[0].activation_code, "is_unb": True }
+
+      # Remove os importados para nao alterar os totais dos outros testes
+      for user in imported:
+        userRepository.delete_user(db, user)
+    finally:
+      db.close()
+
+  def test_user_import_ndjson(self, setup):
+    headers = {'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}', 'Content-Type': 'application/x-ndjson'}
+    body = '{"name": "Import Json", "connection": "SERVIDOR", "email": "import-json@email.com", "password": "123456"}\n{"name": "Sem email"}\nnot json\n'
+    response = client.post("/api/users/import", content=body.encode(), headers=headers)
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data['created'] == 1
+    assert [row['status'] for row in data['rows']] == ['created', 'error', 'error']
+
+    db = SessionLocal()
+    try:
+      userRepository.delete_user(db, userRepository.get_user_by_email(db, "import-json@email.com"))
+    finally:
+      db.close()
+
+  # Email cadastrado entre a consulta dos existentes e o INSERT: so a linha conflitante falha
+  def test_user_import_conflict_at_insert(self, setup, monkeypatch):
+    headers = {'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}', 'Content-Type': 'text/csv'}
+    monkeypatch.setattr(userRepository, "get_existing_emails", lambda db, emails: set())
+    body = f"name,connection,email,password\nConflict,ESTUDANTE,{valid_user_active_admin['email']},123456\nImport Ok,ESTUDANTE,import-ok@email.com,123456\n"
+    response = client.post("/api/users/import", content=body.encode(), headers=headers)
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data['created'] == 1
+    assert [(row['status'], row['error']) for row in data['rows']] == [('error', errorMessages.EMAIL_ALREADY_REGISTERED), ('created', None)]
+
+    db = SessionLocal()
+    try:
+      userRepository.delete_user(db, userRepository.get_user_by_email(db, "import-ok@email.com"))
+    finally:
+      db.close()
+
+  # Pool de hash ocupado por outra importacao: as linhas recusadas falham e as demais sao importadas
+  def test_user_import_hash_pool_saturated(self, setup, monkeypatch):
+    headers = {'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}', 'Content-Type': 'text/csv'}
+    monkeypatch.setattr(bulk_import, "hash_pool", worker_pool.BoundedExecutor(1, 0, name="test-bulk-import-hash"))
+    body = "name,connection,email,password\nImport A,ESTUDANTE,import-a@email.com,123456\nImport B,ESTUDANTE,import-b@email.com,123456\n"
+    response = client.post("/api/users/import", content=body.encode(), headers=headers)
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data['created'] == 1
+    assert [(row['status'], row['error']) for row in data['rows']] == [('created', None), ('error', errorMessages.SERVICE_BUSY)]
+
+    db = SessionLocal()
+    try:
+      userRepository.delete_user(db, userRepository.get_user_by_email(db, "import-a@email.com"))
+    finally:
+      db.close()
+
+  def test_user_import_not_allowed(self, setup):
+    response = client.post("/api/users/import", content=b"{}", headers={'Authorization': f'Bearer {test_auth.TestAuth.__user_access_token__}', 'Content-Type': 'application/x-ndjson'})
+    assert response.status_code == 401
+
+    response = client.post("/api/users/import", content=b"{}", headers={'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}', 'Content-Type': 'application/json'})
+    assert response.status_code == 415
+
+  # Exportacao
+  def test_user_export(self, setup, monkeypatch):
+    headers = {'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
+    # Blocos pequenos para a resposta sair em varios pedacos
+    monkeypatch.setattr(user_export, "USER_EXPORT_BATCH_SIZE", 2)
+
+    total = int(client.get("/api/users/", headers=headers).headers['x-total-count'])
+
+    response = client.get("/api/users/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/csv')
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ['id', 'name', 'email', 'connection', 'role', 'is_active']
+    assert len(rows) == total + 1
+    names = [row[1] for row in rows[1:]]
+    assert names == sorted(names)
+
+    response = client.get(f"/api/users/export?format=ndjson&connection={valid_user_active_admin['connection']}", headers=headers)
+    assert response.status_code == 200
+    users = [json.loads(line) for line in response.text.splitlines()]
+    assert [user['email'] for user in users] == [valid_user_active_admin['email']]
+
+    response = client.get("/api/users/export?format=xml", headers=headers)
+    assert response.status_code == 400
+    assert response.json()['detail'] == errorMessages.INVALID_EXPORT_FORMAT
+
+    response = client.get("/api/users/export", headers={'Authorization': f'Bearer {test_auth.TestAuth.__user_access_token__}'})
+    assert response.status_code == 401
+
+  def test_user_export_csv_formula_injection(self, setup):
+    headers = {'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
+    name = '=HYPERLINK("http://evil.com","x")'
+    db = SessionLocal()
+    try:
+      user = userRepository.create_user(db, name=name, connection="ESTUDANTE", email="@formula@email.com", password=None, activation_code=None)
+      user_id = user.id
+
+      response = client.get("/api/users/export", headers=headers)
+      row = next(row for row in csv.reader(io.StringIO(response.text)) if row[0] == str(user_id))
+      assert row[1] == "'" + name
+      assert row[2] == "'@formula@email.com"
+      assert [user_export.escape_formula(value) for value in ["+1", "-1", "a=b", 10]] == ["'+1", "'-1", "a=b", 10]
+
+      # NDJSON nao e aberto como planilha: valores sem alteracao
+      response = client.get("/api/users/export?format=ndjson", headers=headers)
+      exported = next(json.loads(line) for line in response.text.splitlines() if json.loads(line)['id'] == user_id)
+      assert exported['name'] == name
+    finally:
+      userRepository.delete_user(db, userRepository.get_user(db, user_id))
+      db.close()
+
+  # Operacoes em lote
+  def test_user_bulk_operations(self, setup):
+    headers = {'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
+    db = SessionLocal()
+    try:
+      userRepository.create_users_bulk(db, [
+        { "name": "Bulk A", "connection": "ESTUDANTE", "email": "bulk-a@unb.br", "password": None, "activation_code": 111 },
+        { "name": "Bulk B", "connection": "ESTUDANTE", "email": "bulk-b@email.com", "password": None, "activation_code": 222 },
+      ])
+      ids = [userRepository.get_user_by_email(db, email).id for email in ["bulk-a@unb.br", "bulk-b@email.com"]]
+    finally:
+      db.close()
+
+    # Role ADMIN exige email da UnB; id inexistente retorna not_found
+    response = client.patch("/api/users/bulk/role", json={"ids": ids + [9999], "role": "ADMIN"}, headers=headers)
+    data = response.json()
+    assert response.status_code == 200
+    assert data['affected'] == 1
+    assert [result['status'] for result in data['results']] == ['updated', 'error', 'not_found']
+    assert data['results'][1]['error'] == errorMessages.ROLE_REQUIRES_UNB_EMAIL
+    assert client.get(f"/api/users/{ids[0]}", headers=headers).json()['role'] == 'ADMIN'
+
+    # Selecao por filtro
+    response = client.patch("/api/users/bulk/activate", json={"filter": {"name": "Bulk B"}}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()['results'] == [{"id": ids[1], "status": "activated"}]
+    assert client.get(f"/api/users/{ids[1]}", headers=headers).json()['is_active'] is True
+
+    response = client.post("/api/users/bulk/delete", json={"ids": ids}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()['affected'] == 2
+    assert client.get(f"/api/users/{ids[0]}", headers=headers).status_code == 404
+
+  def test_user_bulk_invalid_selection(self, setup, monkeypatch):
+    headers = {'Authorization': f'Bearer {test_auth.TestAuth.__admin_access_token__}'}
+
+    for body in [{}, {"filter": {}}, {"ids": [1], "filter": {"name": "NameZ"}}]:
+      response = client.post("/api/users/bulk/delete", json=body, headers=headers)
+      assert response.status_code == 400
+      assert response.json()['detail'] == errorMessages.INVALID_BULK_SELECTION
+
+    response = client.patch("/api/users/bulk/role", json={"ids": [1], "role": "INVALIDO"}, headers=headers)
+    assert response.status_code == 400
+    assert response.json()['detail'] == errorMessages.INVALID_ROLE
+
+    monkeypatch.setattr(userController, "BULK_OPERATION_MAX_USERS", 1)
+    response = client.patch("/api/users/bulk/activate", json={"filter": {"connection": "ESTUDANTE"}}, headers=headers)
+    assert response.status_code == 400
+    assert response.json()['detail'] == errorMessages.BULK_SELECTION_TOO_LARGE
+
+    response = client.post("/api/users/bulk/delete", json={"ids": [1]}, headers={'Authorization': f'Bearer {test_auth.TestAuth.__user_access_token__}'})
+    assert response.status_code == 401